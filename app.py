@@ -1,15 +1,22 @@
 import streamlit as st
-import os, json
-from utils.rag_search import get_relevant_context
-from models.llm import generate_answer
-from utils.web_search import google_search
-from utils.pdf_parser import extract_text_from_pdf
-from models.embeddings import build_faiss_index
-from config.config import ENABLE_WEB_SEARCH
+import os, json, uuid
+from utils.startup import start_warmup
+from utils.tracing import trace
+from config.config import ENABLE_WEB_SEARCH, STARTUP_WARMUP
 
 # PAGE CONFIG
 st.set_page_config(page_title="Healthcare Assistant", page_icon="💊", layout="centered")
 
+# STARTUP
+# The retrieval/LLM stack (FAISS, pdfplumber, the embedding model) is imported
+# where it is first used, so the first page renders without it. The warm-up
+# thread loads it in the background, once per server process for all sessions.
+@st.cache_resource(show_spinner=False)
+def warm_start():
+    return start_warmup() if STARTUP_WARMUP else None
+
+warm_start()
+
 # HEADER
 st.markdown("<h1 style='text-align:center; color:white;'>Healthcare Assistant</h1>", unsafe_allow_html=True)
 st.markdown("<p style='text-align:center; color:#94a3b8;'>Powered by RAG + Verified Medical Knowledge Base</p>", unsafe_allow_html=True)
@@ -22,11 +29,23 @@ if "response_mode" not in st.session_state:
 if "uploaded_docs" not in st.session_state:
     st.session_state.uploaded_docs = []
 if "uploaded_texts" not in st.session_state:
-    st.session_state.uploaded_texts = []
+    st.session_state.uploaded_texts = []       # (filename, text) of every uploaded document
 if "show_uploader" not in st.session_state:
     st.session_state.show_uploader = False
 if "source_used" not in st.session_state:
     st.session_state.source_used = None
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "processed_files" not in st.session_state:
+    st.session_state.processed_files = set()
+
+# The session index drops chats idle for SESSION_IDLE_TTL; re-add this chat's uploads when that happened
+if st.session_state.uploaded_texts:
+    from utils.session_index import get_session, add_to_session
+    if get_session(st.session_state.session_id) is None:
+        with st.spinner("Re-indexing your uploaded documents..."):
+            for filename, text in st.session_state.uploaded_texts:
+                add_to_session(st.session_state.session_id, filename, text)
 
 # CHAT HISTORY
 st.markdown("<div style='max-height:68vh; overflow-y:auto; padding-bottom:6rem;'>", unsafe_allow_html=True)
@@ -78,11 +97,18 @@ if st.session_state.show_uploader:
     )
 
     if uploaded_files:
+        from utils.pdf_parser import extract_text_from_pdf
+        from utils.ingest import ingest_file
+        from utils.session_index import add_to_session
+
         save_dir = "data/raw_pdfs"
         os.makedirs(save_dir, exist_ok=True)
-        st.session_state.uploaded_texts.clear()
 
         for uploaded_file in uploaded_files:
+            # Streamlit reruns this block on every interaction; process each file once
+            file_key = (uploaded_file.name, uploaded_file.size)
+            if file_key in st.session_state.processed_files:
+                continue
             try:
                 path = os.path.join(save_dir, uploaded_file.name)
                 with open(path, "wb") as f:
@@ -95,10 +121,16 @@ if st.session_state.show_uploader:
 
                 text = extract_text_from_pdf(path)
                 if text.strip():
-                    st.session_state.uploaded_texts.append(text)
-                    st.info(f"Extracted text from {uploaded_file.name}")
+                    st.session_state.uploaded_texts.append((uploaded_file.name, text))
+                    added = add_to_session(st.session_state.session_id, uploaded_file.name, text)
+                    st.info(f"Extracted text from {uploaded_file.name} ({added} chunks indexed for this chat)")
+                    if path.lower().endswith(".pdf"):
+                        added = ingest_file(path, text=text)
+                        if added:
+                            st.info(f"Added {added} chunks from {uploaded_file.name} to the knowledge base")
                 else:
                     st.warning(f"No readable text found in {uploaded_file.name}")
+                st.session_state.processed_files.add(file_key)
 
             except Exception as e:
                 st.error(f"Error processing {uploaded_file.name}: {e}")
@@ -106,26 +138,34 @@ if st.session_state.show_uploader:
         if st.session_state.uploaded_texts:
             st.success("All documents processed successfully.")
             if st.button("Generate Insights"):
+                from utils.rag_search import get_relevant_context
+                from utils.context_builder import context_budget
+                from utils.web_search import google_search
+                from models.llm import generate_answer
                 try:
-                    combined_text = "\n\n".join(st.session_state.uploaded_texts)
+                    insights_query = "Summarize insights across all uploaded health documents."
                     with st.spinner("Analyzing uploaded documents..."):
-                        context, sources = get_relevant_context(
-                            "combined medical report analysis",
+                        context, sources, chunk_ids = get_relevant_context(
+                            insights_query,
                             k=8,
-                            report_text=combined_text
+                            session_id=st.session_state.session_id,
+                            return_ids=True,
+                            token_budget=context_budget("Detailed")
                         )
                         if len(context.strip()) < 200 and ENABLE_WEB_SEARCH:
                             context = google_search("general medical report insights")
                             sources = ["Google Search"]
+                            chunk_ids = []
                             st.session_state.source_used = "Web Search"
                         else:
                             st.session_state.source_used = "RAG"
 
                         insights = generate_answer(
-                            query="Summarize insights across all uploaded health documents.",
+                            query=insights_query,
                             context=context,
                             response_mode="Detailed",
-                            sources=sources
+                            sources=sources,
+                            chunk_ids=chunk_ids
                         )
                         st.markdown(
                             f"<div style='background-color:#1f2937; border-radius:14px; padding:1rem; margin:1rem 0;'>{insights}</div>",
@@ -143,39 +183,41 @@ if st.session_state.uploaded_docs:
 
 # CHAT LOGIC (RAG + Web Search)
 if user_query:
+    from utils.orchestrator import prepare_context
+    from models.llm import generate_answer_stream
+
     st.session_state.messages.append({"role": "user", "content": user_query})
-    report_context = "\n\n".join(st.session_state.uploaded_texts) if st.session_state.uploaded_texts else None
 
     try:
-        with st.spinner("Retrieving relevant information..."):
-            context, sources = get_relevant_context(user_query, k=6, report_text=report_context)
-            st.session_state.source_used = "RAG"
-
-        if len(context.split()) < 250 and ENABLE_WEB_SEARCH:
-            with st.spinner("Fetching additional web data..."):
-                web_context = google_search(user_query)
-                if web_context.strip():
-                    context += "\n\n" + web_context
-                    sources = list(set(sources + ["Google Search"]))
-                    st.session_state.source_used = "Web Search"
-
-        if not context.strip():
-            response = "No relevant information found. Please rephrase your question."
-        else:
-            with st.spinner("Generating response..."):
-                response = generate_answer(
+        # Per-stage timings of the turn feed /metrics histograms (printed with TRACE_LOG=true)
+        with trace("turn"):
+            with st.spinner("Retrieving relevant information..."):
+                # Web search runs alongside retrieval and is only kept if RAG context is weak
+                prepared = prepare_context(user_query, k=6, session_id=st.session_state.session_id,
+                                           response_mode=st.session_state.response_mode)
+                context, sources, chunk_ids = prepared["context"], prepared["sources"], prepared["chunk_ids"]
+                st.session_state.source_used = prepared["source_used"] or "RAG"
+
+            if not context.strip():
+                response = "No relevant information found. Please rephrase your question."
+            else:
+                st.markdown(f"**You:** {user_query}")
+                response = st.write_stream(generate_answer_stream(
                     user_query,
                     context,
                     response_mode=st.session_state.response_mode,
-                    sources=sources
-                )
-
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": response,
-            "sources": sources if sources else ["General medical knowledge"]
-        })
-        st.caption(f"🧠 Source: {st.session_state.source_used} | References: {', '.join(sources)}")
+                    sources=sources,
+                    chunk_ids=chunk_ids,
+                    web_fallback=not prepared["web_used"],
+                    web_in_context=prepared["web_used"]
+                ))
+
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": response,
+                "sources": sources if sources else ["General medical knowledge"]
+            })
+            st.caption(f"🧠 Source: {st.session_state.source_used} | References: {', '.join(sources)}")
 
     except Exception as e:
         st.error(f"Unexpected error occurred: {e}")
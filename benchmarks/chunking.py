@@ -0,0 +1,92 @@
+import re
+import json
+import time
+import argparse
+import numpy as np
+from utils.chunking import chunk_text, iter_documents, iter_chunked
+from config.config import PDF_TEXTS_PATH, CHUNK_SIZE
+
+CHUNKERS = ("langchain", "native")
+
+# Compares the native chunker with LangChain's RecursiveCharacterTextSplitter
+# on the extracted corpus (data/pdf_texts.jsonl by default):
+#   speed    documents and MB per second (best of --repeat), plus the native
+#            chunker through the process pool
+#   quality  chunk count and size spread, share of chunks that end at a
+#            sentence end, that start or end mid-word, that have a real
+#            section instead of "General", and chunks over CHUNK_SIZE
+#
+#   python -m benchmarks.chunking --repeat 5
+
+
+def _quality(docs: list, chunks_per_doc: list) -> dict:
+    sizes, ends, cut_words, sectioned, oversized = [], 0, 0, 0, 0
+    for doc, chunks in zip(docs, chunks_per_doc):
+        text = doc["text"]
+        for c in chunks:
+            body = c["text"]
+            sizes.append(len(body))
+            ends += bool(re.search(r"[.!?\]]$", body))
+            sectioned += c["section"] != "General"
+            oversized += len(body) > CHUNK_SIZE
+            # Mid-word cut: a letter on both sides of the chunk boundary in the source
+            start = c.get("start", text.find(body))
+            end = start + len(body)
+            if start > 0 and text[start - 1].isalnum() and body[:1].isalnum():
+                cut_words += 1
+            elif start >= 0 and end < len(text) and text[end].isalnum() and body[-1:].isalnum():
+                cut_words += 1
+    n = len(sizes)
+    sizes = np.array(sizes)
+    return {
+        "chunks": n,
+        "size_mean": round(float(sizes.mean()), 1),
+        "size_p5": int(np.percentile(sizes, 5)),
+        "size_p95": int(np.percentile(sizes, 95)),
+        "sentence_end_rate": round(ends / n, 4),
+        "mid_word_cut_rate": round(cut_words / n, 4),
+        "sectioned_rate": round(sectioned / n, 4),
+        "oversized": oversized
+    }
+
+
+def run(docs: list, repeat: int = 3, workers: int = 0) -> dict:
+    mb = sum(len(d["text"].encode("utf-8")) for d in docs) / 1e6
+    report = {}
+    for chunker in CHUNKERS:
+        best, chunks = float("inf"), None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            chunks = [chunk_text(d["text"], d["filename"], chunker) for d in docs]
+            best = min(best, time.perf_counter() - start)
+        report[chunker] = {
+            "seconds": round(best, 4),
+            "docs_per_second": round(len(docs) / best, 1),
+            "mb_per_second": round(mb / best, 2),
+            **_quality(docs, chunks)
+        }
+
+    start = time.perf_counter()
+    for _ in iter_chunked(docs, workers):
+        pass
+    pooled = time.perf_counter() - start
+    report["native_pool"] = {"seconds": round(pooled, 4), "mb_per_second": round(mb / pooled, 2)}
+    report["speedup"] = round(report["langchain"]["seconds"] / report["native"]["seconds"], 2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the native chunker with the LangChain splitter.")
+    parser.add_argument("--input", default=PDF_TEXTS_PATH, help="extracted-text JSONL")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scale", type=int, default=1, help="repeat the corpus N times for a larger run")
+    parser.add_argument("--workers", type=int, default=0, help="process pool size for native_pool (0 = CPUs)")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    docs = [d for d in iter_documents(args.input) if d.get("text", "").strip()] * args.scale
+    result = {"documents": len(docs), "chunk_size": CHUNK_SIZE, "results": run(docs, args.repeat, args.workers)}
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,118 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+import numpy as np
+import httpx
+
+# Closed-loop load test for server.py: `concurrency` clients send requests
+# back to back for `duration` seconds. Reports throughput, latency percentiles
+# (time to first byte for /answer/stream) and status codes, including the 503s
+# returned when the server sheds load.
+#
+#   python server.py                                   # terminal 1
+#   python -m benchmarks.load_test --endpoint /retrieve --concurrency 32
+#
+# For runs without Groq/Google, start utils.mock_servers and point the server
+# at it with GROQ_API_URL / GOOGLE_SEARCH_URL. Retrieval is not mocked; with
+# RETRIEVAL_MODE=sparse (and ANSWER_CACHE_ENABLED=false) the server runs on the
+# BM25 index alone and never loads sentence-transformers.
+
+DEFAULT_QUERIES = [
+    "What are the symptoms of hypertension?",
+    "How can type 2 diabetes be prevented?",
+    "What foods are high in iron?",
+    "What causes anemia?",
+    "How much physical activity do adults need each week?",
+    "What are the early signs of dehydration?",
+    "How is high cholesterol treated?",
+    "What vaccines are recommended for adults?"
+]
+
+
+def load_queries(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["query"] for line in f if line.strip()]
+
+
+async def _client(http, url, endpoint, queries, deadline, results, rng, payload_extra):
+    while time.perf_counter() < deadline:
+        body = dict(payload_extra, query=rng.choice(queries))
+        start = time.perf_counter()
+        try:
+            if endpoint.endswith("/stream"):
+                async with http.stream("POST", url + endpoint, json=body) as response:
+                    first = None
+                    async for _ in response.aiter_bytes():
+                        if first is None:
+                            first = time.perf_counter() - start
+                    status = response.status_code
+            else:
+                response = await http.post(url + endpoint, json=body)
+                status, first = response.status_code, None
+        except httpx.HTTPError as e:
+            status, first = type(e).__name__, None
+        results.append((status, time.perf_counter() - start, first))
+        if status == 503:
+            await asyncio.sleep(1)
+
+
+def _percentiles(values) -> dict:
+    if not values:
+        return {}
+    arr = np.asarray(values) * 1000
+    return {f"p{p}_ms": round(float(np.percentile(arr, p)), 2) for p in (50, 90, 95, 99)}
+
+
+async def run(url: str, endpoint: str, concurrency: int, duration: float, queries: list, web: bool,
+              seed: int = 0) -> dict:
+    results = []
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as http:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*[
+            _client(http, url, endpoint, queries, deadline, results, random.Random(rng.random()), {"web": web})
+            for _ in range(concurrency)
+        ])
+
+    ok = [r for r in results if r[0] == 200]
+    statuses = {}
+    for status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    report = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "requests": len(results),
+        "throughput_rps": round(len(ok) / duration, 2),
+        "statuses": statuses,
+        "latency": _percentiles([r[1] for r in ok])
+    }
+    if endpoint.endswith("/stream"):
+        report["time_to_first_byte"] = _percentiles([r[2] for r in ok if r[2] is not None])
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the headless QA server.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", default="/retrieve", choices=["/retrieve", "/answer", "/answer/stream"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--queries", help="JSONL with a 'query' field; defaults to a built-in set")
+    parser.add_argument("--web", action="store_true", help="allow web search fallback")
+    parser.add_argument("--out", help="write the reports as JSON")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else DEFAULT_QUERIES
+    reports = []
+    for concurrency in args.concurrency:
+        report = asyncio.run(run(args.url, args.endpoint, concurrency, args.duration, queries, args.web))
+        print(json.dumps(report))
+        reports.append(report)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
@@ -0,0 +1,131 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+import faiss
+from models.ann_index import create_index, needs_training, apply_search_params, describe_storage, is_compressed
+from utils.vector_store import VectorStore
+from benchmarks.suite import base_vectors, synthetic_block, _percentiles, BLOCK, TRAIN_SIZE
+from config.config import FAISS_INDEX_TYPE, RESCORE_CANDIDATES, TOP_K
+
+# Memory saved against recall lost for compressed vector storage. Each
+# variant is "<codec>" or "<reduction><dim>+<codec>" (codec fp32 | fp16 | int8,
+# reduction pca | matryoshka), e.g. int8, pca256+fp16, matryoshka384+fp32.
+# The corpus is the indexed chunks scaled up with synthetic vectors (see
+# benchmarks.suite); full-precision rows are written to a temporary raw file
+# and memory-mapped, as in serving. For every variant: index bytes per vector
+# and the share saved against an fp32 Flat index, then recall@k and latency
+# searching k directly and fetching --rescore candidates re-ranked in fp32.
+#
+#   python -m benchmarks.quantization --n 100000 --variants fp32 fp16 int8 pca256+fp32 pca128+int8
+
+DEFAULT_VARIANTS = ["fp32", "fp16", "int8", "pca384+fp32", "pca256+fp16", "pca128+int8", "matryoshka256+fp16"]
+_VARIANT = re.compile(r"(?:(pca|matryoshka)(\d+)\+)?(fp32|fp16|int8)")
+
+
+def parse_variant(variant: str) -> tuple:
+    """(codec, reduced dimension or 0, reduction) for a variant name."""
+    m = _VARIANT.fullmatch(variant)
+    if m is None:
+        raise ValueError(f"Bad variant '{variant}'; use e.g. int8, pca256+fp16 or matryoshka384+fp32")
+    return m.group(3), int(m.group(2) or 0), m.group(1) or "pca"
+
+
+def _search(index, queries, k: int, store: VectorStore = None, shortlist: int = 0):
+    """Single-query search (as the app does), optionally re-scoring a shortlist. Returns (ids, seconds)."""
+    found, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), max(k, shortlist))
+        ids = ids[0][ids[0] != -1]
+        if shortlist:
+            ids = ids[np.argsort(store.distances(q, ids), kind="stable")]
+        latencies.append(time.perf_counter() - start)
+        found.append(ids[:k])
+    return found, latencies
+
+
+def bench_variant(variant: str, index_type: str, corpus: np.ndarray, store: VectorStore, queries: np.ndarray,
+                  truth: np.ndarray, k: int, rescore: int) -> dict:
+    codec, reduce_dim, reduction = parse_variant(variant)
+    n, dim = corpus.shape
+    index = create_index(dim, n, index_type, codec, reduce_dim, reduction)
+    start = time.perf_counter()
+    if needs_training(index_type, codec, reduce_dim, reduction):
+        index.train(corpus[:TRAIN_SIZE])
+    for offset in range(0, n, BLOCK):
+        index.add(corpus[offset:offset + BLOCK])
+    build = time.perf_counter() - start
+    apply_search_params(index)
+
+    index_bytes = faiss.serialize_index(index).size
+    report = {
+        "storage": describe_storage(index_type, codec, reduce_dim, reduction),
+        "build_seconds": round(build, 3),
+        "index_mb": round(index_bytes / 1e6, 1),
+        "bytes_per_vector": round(index_bytes / n, 1),
+        "memory_saved": round(1 - index_bytes / (n * dim * 4), 4)
+    }
+    if not is_compressed(index_type, codec, reduce_dim):
+        rescore = 0
+    for label, shortlist in (("direct", 0), ("rescored", rescore)):
+        if label == "rescored" and not shortlist:
+            continue
+        found, latencies = _search(index, queries, k, store, shortlist)
+        hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+        recall = hits / (len(queries) * k)
+        report[label] = {"recall_at_k": round(recall, 4), "recall_lost": round(1 - recall, 4),
+                         "latency": _percentiles(latencies)}
+    if "rescored" in report:
+        report["rescored"]["candidates"] = rescore
+    return report
+
+
+def run(variants, index_type: str = FAISS_INDEX_TYPE, n: int = 50000, n_queries: int = 200, k: int = TOP_K,
+        rescore: int = RESCORE_CANDIDATES, noise: float = 0.3, seed: int = 0) -> dict:
+    base = base_vectors()
+    corpus = np.vstack([synthetic_block(base, offset, min(BLOCK, n - offset), noise, seed)
+                        for offset in range(0, n, BLOCK)]) if n else base
+    queries = synthetic_block(base, 0, n_queries, noise, seed, stream=1)
+    _, truth = faiss.knn(queries, corpus, k)
+
+    report = {"index_type": index_type, "n_vectors": len(corpus), "dim": corpus.shape[1], "n_queries": n_queries,
+              "k": k, "noise": noise, "seed": seed, "variants": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vectors.f32")
+        corpus.tofile(path)
+        store = VectorStore(path, corpus.shape[1])
+        for variant in variants:
+            result = report["variants"][variant] = bench_variant(variant, index_type, corpus, store, queries,
+                                                                 truth, k, rescore)
+            line = f"  {variant}: {result['bytes_per_vector']:.0f} B/vector ({result['memory_saved']:.1%} saved), " \
+                   f"recall@{k} {result['direct']['recall_at_k']:.3f}"
+            if "rescored" in result:
+                line += f", rescored {result['rescored']['recall_at_k']:.3f}"
+            print(line, file=sys.stderr)
+        store.close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory vs recall of quantized and dimension-reduced indexes.")
+    parser.add_argument("--variants", nargs="+", default=DEFAULT_VARIANTS)
+    parser.add_argument("--index-type", default=FAISS_INDEX_TYPE)
+    parser.add_argument("--n", type=int, default=50000, help="synthetic corpus size (0 = the indexed chunks only)")
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--rescore", type=int, default=RESCORE_CANDIDATES, help="shortlist re-scored in fp32 (0 = off)")
+    parser.add_argument("--noise", type=float, default=0.3, help="norm of the noise added to each base vector")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    report = run(args.variants, args.index_type, args.n, args.n_queries, args.k, args.rescore, args.noise, args.seed)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
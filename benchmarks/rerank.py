@@ -0,0 +1,83 @@
+import json
+import time
+import argparse
+import numpy as np
+from utils import rag_search
+from utils.orchestrator import prepare_context, context_is_weak
+from models.llm import generate_answer
+from models.reranker import rerank_stats
+from models.answer_cache import answer_cache
+from benchmarks.load_test import DEFAULT_QUERIES
+from config.config import TOP_K, RETRIEVAL_MODE, RERANK_CANDIDATES
+
+# Compares retrieval with and without the cross-encoder stage on a query set.
+# Reports the web-fallback rate (RAG context too weak to answer from) and
+# latency percentiles. With --answer the LLM call is included, so latency is
+# end to end, web fallbacks included.
+#
+#   python -m benchmarks.rerank --queries data/eval_queries.jsonl --answer
+#
+# Point GROQ_API_URL / GOOGLE_SEARCH_URL at utils.mock_servers to run
+# --answer without API keys (LLM latency is then the mock's).
+
+
+def load_queries(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["query"] for line in f if line.strip()]
+
+
+def run(queries: list, rerank: bool, k: int = TOP_K, mode: str = RETRIEVAL_MODE, answer: bool = False) -> dict:
+    rag_search.RERANK_ENABLED = rerank
+    rag_search.result_cache.clear()
+    rag_search.embedding_cache.clear()
+    answer_cache.clear()
+    latencies, retrieval, fallbacks = [], [], 0
+    for query in queries:
+        start = time.perf_counter()
+        prepared = prepare_context(query, k, mode=mode, web_enabled=answer)
+        retrieval.append(prepared["timings"]["retrieval"] * 1000)
+        weak = prepared["web_used"] or context_is_weak(prepared["context"])
+        fallbacks += weak
+        if answer and prepared["context"].strip():
+            generate_answer(query, prepared["context"], sources=prepared["sources"],
+                            chunk_ids=prepared["chunk_ids"], web_fallback=not prepared["web_used"],
+                            web_in_context=prepared["web_used"])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies, retrieval = np.array(latencies), np.array(retrieval)
+    return {
+        "fallback_rate": round(fallbacks / len(queries), 4),
+        "retrieval_ms_p50": round(float(np.percentile(retrieval, 50)), 3),
+        "retrieval_ms_p95": round(float(np.percentile(retrieval, 95)), 3),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+        "latency_ms_mean": round(float(latencies.mean()), 3)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure fallback rate and latency with and without reranking.")
+    parser.add_argument("--queries", help="JSONL with a query field; default is a small built-in set")
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--mode", default=RETRIEVAL_MODE, choices=["dense", "sparse", "hybrid"])
+    parser.add_argument("--answer", action="store_true", help="include web search and the LLM call")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else DEFAULT_QUERIES
+    # Warm up the embedding model, index and cross-encoder so loads aren't timed
+    rag_search.RERANK_ENABLED = True
+    rag_search.get_relevant_context(queries[0], args.k, mode=args.mode)
+
+    result = {
+        "k": args.k,
+        "candidates": RERANK_CANDIDATES,
+        "n_queries": len(queries),
+        "baseline": run(queries, False, args.k, args.mode, args.answer),
+        "rerank": run(queries, True, args.k, args.mode, args.answer),
+        "reranker": rerank_stats()
+    }
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
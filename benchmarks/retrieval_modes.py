@@ -0,0 +1,84 @@
+import re
+import json
+import time
+import random
+import argparse
+import numpy as np
+from utils.chunk_store import get_chunk_store
+from utils.rag_search import search_chunks
+from config.config import CHUNKS_PATH, TOP_K
+
+MODES = ("dense", "sparse", "hybrid")
+
+
+def sample_queries(n: int, seed: int = 0) -> list:
+    """
+    Build a labeled query set from the chunk store: one sentence (8–20 words)
+    from a random chunk, labeled with that chunk's row and filename.
+    Verbatim sentences favour keyword matching, so prefer --queries with
+    real questions when available.
+    """
+    store = get_chunk_store(CHUNKS_PATH)
+    rng = random.Random(seed)
+    rows = list(range(len(store)))
+    rng.shuffle(rows)
+
+    queries = []
+    for row in rows:
+        obj = store.get(row)
+        sentences = [s.strip() for s in re.split(r"(?<=[.?!])\s+|\n", obj.get("text", ""))]
+        candidates = [s for s in sentences if 8 <= len(s.split()) <= 20]
+        if candidates:
+            queries.append({"query": rng.choice(candidates), "row": row, "filename": obj.get("filename")})
+        if len(queries) == n:
+            break
+    return queries
+
+
+def load_queries(path: str) -> list:
+    """Read {"query", "filename"} records; a hit is any result from the expected file."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run(queries: list, k: int = TOP_K) -> dict:
+    store = get_chunk_store(CHUNKS_PATH)
+    report = {}
+    for mode in MODES:
+        latencies, row_hits, file_hits = [], 0, 0
+        for q in queries:
+            start = time.perf_counter()
+            rows, _ = search_chunks(q["query"], k, mode)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if "row" in q and q["row"] in rows:
+                row_hits += 1
+            if q.get("filename") in {store.get(r).get("filename") for r in rows}:
+                file_hits += 1
+        latencies = np.array(latencies)
+        report[mode] = {
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+            "hit_rate_chunk": round(row_hits / len(queries), 4) if "row" in queries[0] else None,
+            "hit_rate_file": round(file_hits / len(queries), 4)
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare dense, sparse and hybrid retrieval.")
+    parser.add_argument("--queries", help="JSONL of {query, filename}; default samples sentences from the corpus")
+    parser.add_argument("--n", type=int, default=200, help="number of sampled queries")
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else sample_queries(args.n)
+    # Warm up the embedding model and indexes so the first query isn't timed cold
+    for mode in MODES:
+        search_chunks(queries[0]["query"], args.k, mode)
+
+    result = {"k": args.k, "n_queries": len(queries), "modes": run(queries, args.k)}
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
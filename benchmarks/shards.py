@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import time
+import socket
+import secrets
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import faiss
+from models.ann_index import build_ann_index
+from utils.shards import LocalShard, RemoteShard, ShardedIndex, save_shard
+from benchmarks.suite import base_vectors, synthetic_block, _percentiles, BLOCK, TRAIN_SIZE
+from config.config import BASE_DIR, FAISS_INDEX_TYPE, TOP_K
+
+# Latency and throughput of the sharded index as the shard count grows. A
+# synthetic corpus (the indexed chunks scaled up, see benchmarks.suite) is
+# split round-robin into S shards of the configured index type; for each S:
+#   latency     single queries one after another (fan-out + merge per query)
+#   throughput  queries/s with --concurrency client threads issuing queries
+#   batch       queries/s for all queries in one search call
+#   recall@k    against exact search over the whole corpus
+# With --processes, every shard runs in its own `python -m utils.shards serve`
+# process and is called over RPC, as it would be spread across machines.
+#
+#   python -m benchmarks.shards --n 1000000 --shards 1 2 4 8 --concurrency 1 8 --processes
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_servers(paths, timeout: float = 60.0):
+    """One shard server process per path. Returns (processes, RemoteShards) once all accept connections."""
+    procs, shards = [], []
+    authkey = secrets.token_hex(32)
+    env = {**os.environ, "SHARD_AUTHKEY": authkey}
+    for path in paths:
+        port = _free_port()
+        procs.append(subprocess.Popen([sys.executable, "-m", "utils.shards", "serve", "--path", path,
+                                       "--port", str(port)], cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL))
+        shards.append(RemoteShard(f"127.0.0.1:{port}", authkey))
+    deadline = time.time() + timeout
+    for shard in shards:
+        while True:
+            try:
+                shard.ntotal
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+    return procs, shards
+
+
+def bench_shards(corpus: np.ndarray, n_shards: int, index_type: str, queries: np.ndarray, truth: np.ndarray,
+                 k: int, concurrency, processes: bool = False) -> dict:
+    rows = np.arange(len(corpus), dtype="int64")
+    start = time.perf_counter()
+    parts = []
+    for shard in range(n_shards):
+        mine = rows[shard::n_shards]
+        parts.append((mine, build_ann_index(corpus[mine], index_type, train_vectors=corpus[mine][:TRAIN_SIZE],
+                                            ids=mine)))
+    build = time.perf_counter() - start
+
+    procs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        if processes:
+            paths = [os.path.join(tmp, f"shard_{i:03d}") for i in range(n_shards)]
+            for path, (mine, index) in zip(paths, parts):
+                save_shard(path, index, mine)
+            procs, shards = _start_servers(paths)
+        else:
+            shards = [LocalShard(index, mine) for mine, index in parts]
+        sharded = ShardedIndex(shards)
+        try:
+            sharded.search(queries[:1], k)          # warm connections and pool threads
+            latencies, found = [], []
+            for q in queries:
+                q_start = time.perf_counter()
+                _, ids = sharded.search(q.reshape(1, -1), k)
+                latencies.append(time.perf_counter() - q_start)
+                found.append(ids[0])
+
+            throughput = {}
+            for clients in concurrency:
+                with ThreadPoolExecutor(max_workers=clients) as pool:
+                    c_start = time.perf_counter()
+                    list(pool.map(lambda q: sharded.search(q.reshape(1, -1), k), queries))
+                    throughput[str(clients)] = round(len(queries) / (time.perf_counter() - c_start), 1)
+
+            batch_start = time.perf_counter()
+            sharded.search(queries, k)
+            batch = time.perf_counter() - batch_start
+        finally:
+            sharded.close()
+            for proc in procs:
+                proc.terminate()
+                proc.wait()
+
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return {
+        "shards": n_shards,
+        "build_seconds": round(build, 3),
+        "latency": _percentiles(latencies),
+        "queries_per_second": throughput,
+        "batch_queries_per_second": round(len(queries) / batch, 1),
+        "recall_at_k": round(hits / (len(queries) * k), 4)
+    }
+
+
+def run(shard_counts, index_type: str = FAISS_INDEX_TYPE, n: int = 200000, n_queries: int = 200, k: int = TOP_K,
+        concurrency=(1, 8), processes: bool = False, noise: float = 0.3, seed: int = 0) -> dict:
+    base = base_vectors()
+    corpus = np.vstack([synthetic_block(base, offset, min(BLOCK, n - offset), noise, seed)
+                        for offset in range(0, n, BLOCK)])
+    queries = synthetic_block(base, 0, n_queries, noise, seed, stream=1)
+    _, truth = faiss.knn(queries, corpus, k)
+
+    report = {"index_type": index_type, "n_vectors": n, "n_queries": n_queries, "k": k,
+              "mode": "processes" if processes else "threads", "cpus": os.cpu_count(), "results": []}
+    for n_shards in shard_counts:
+        result = bench_shards(corpus, n_shards, index_type, queries, truth, k, concurrency, processes)
+        report["results"].append(result)
+        print(f"  {n_shards} shards: p50 {result['latency']['p50_ms']} ms, "
+              f"qps {result['queries_per_second']}, recall@{k} {result['recall_at_k']}", file=sys.stderr)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency and throughput of the sharded index by shard count.")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--index-type", default=FAISS_INDEX_TYPE)
+    parser.add_argument("--n", type=int, default=200000, help="synthetic corpus size")
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8], help="client threads for throughput")
+    parser.add_argument("--processes", action="store_true", help="serve each shard from its own process over RPC")
+    parser.add_argument("--noise", type=float, default=0.3, help="norm of the noise added to each base vector")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    report = run(args.shards, args.index_type, args.n, args.n_queries, args.k, args.concurrency, args.processes,
+                 args.noise, args.seed)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,100 @@
+import os
+import re
+import ast
+import sys
+import json
+import time
+import argparse
+import subprocess
+from config.config import BASE_DIR
+
+# Startup profile for app.py. Splits its imports into those that run before
+# the first page renders (module level) and those deferred into handlers,
+# then imports each set in a fresh interpreter under `python -X importtime`:
+#   first_render  what a new Streamlit server process pays before the page shows
+#   eager         everything app.py imports, i.e. the cost of importing it all up front
+# For each: wall time, summed import time, the slowest modules by cumulative
+# time and self time per top-level package. With --warmup, the steps of
+# utils.startup.warm_up() (model, index and chunk store loads) are timed too.
+#
+#   python -m benchmarks.startup --top 15 --warmup
+
+APP_PATH = os.path.join(BASE_DIR, "app.py")
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def app_imports(path: str = APP_PATH) -> tuple:
+    """(module-level imports, imports nested in handlers) of app.py, as module names."""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    top_level = set(map(id, tree.body))
+    first, deferred = [], []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names = [node.module]
+        else:
+            continue
+        (first if id(node) in top_level else deferred).extend(names)
+    first = list(dict.fromkeys(first))
+    return first, [m for m in dict.fromkeys(deferred) if m not in first]
+
+
+def profile_imports(modules: list, top: int = 10) -> dict:
+    """Import `modules` in a fresh interpreter and summarise `-X importtime`. Missing modules are listed, not fatal."""
+    code = "\n".join(f"try:\n    import {m}\nexcept ImportError as e:\n    print({m!r}, e)" for m in modules)
+    start = time.perf_counter()
+    done = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=BASE_DIR,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    baseline_start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], capture_output=True)
+    baseline = time.perf_counter() - baseline_start
+
+    entries = []
+    for line in done.stderr.splitlines():
+        m = _IMPORTTIME.match(line)
+        if m:
+            entries.append((m.group(4), int(m.group(1)), int(m.group(2)), (len(m.group(3)) - 1) // 2))
+            if m.group(4) == "site" and not entries[-1][3]:
+                # Interpreter startup (site and its .pth imports) is in the baseline, not the app's cost
+                entries = []
+    packages = {}
+    for name, self_us, _, _ in entries:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+
+    return {
+        "modules": modules,
+        "missing": [line for line in done.stdout.splitlines() if line.strip()],
+        "wall_ms": round((wall - baseline) * 1000, 1),
+        "import_ms": round(sum(c for _, _, c, depth in entries if depth == 0) / 1000, 1),
+        "slowest": [{"module": name, "cumulative_ms": round(c / 1000, 1)}
+                    for name, _, c, _ in sorted(entries, key=lambda e: -e[2])[:top]],
+        "packages_self_ms": {p: round(us / 1000, 1)
+                             for p, us in sorted(packages.items(), key=lambda kv: -kv[1])[:top]}
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile app.py startup: import time breakdown and warm-up.")
+    parser.add_argument("--top", type=int, default=10, help="modules and packages listed per profile")
+    parser.add_argument("--warmup", action="store_true", help="also time the warm-up steps in this process")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    first, deferred = app_imports()
+    report = {
+        "first_render": profile_imports(first, args.top),
+        "eager": profile_imports(first + deferred, args.top),
+        "deferred_modules": deferred
+    }
+    if args.warmup:
+        from utils.startup import warm_up
+        report["warmup"] = warm_up()
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,374 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import numpy as np
+import faiss
+from models.ann_index import create_index, needs_training, apply_search_params, describe_storage
+from utils.chunking import iter_chunked
+from utils.tracing import trace
+from benchmarks.load_test import DEFAULT_QUERIES
+from config.config import (
+    DATA_DIR,
+    RAW_PDF_DIR,
+    CHUNKS_PATH,
+    FAISS_INDEX_PATH,
+    FULL_VECTORS_PATH,
+    FAISS_INDEX_TYPE,
+    EMBED_MODEL_LOCAL,
+    EMBED_BATCH_SIZE,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    RETRIEVAL_MODE,
+    TOP_K
+)
+
+# Offline, reproducible benchmark suite. Nothing here calls Groq or Google.
+#   ingest     pages/s (PDF extraction), chunks/s (chunking) and embeddings/s
+#   retrieval  FAISS build time, latency percentiles and recall@k at several
+#              corpus sizes, on synthetic vectors scaled up from the indexed
+#              chunks (each synthetic vector is a real one plus seeded noise)
+#   e2e        turn latency (retrieval, speculative search, streamed answer)
+#              against the local Groq/Google stubs in utils.mock_servers
+# Results are JSON with the git commit, machine and settings; `compare` diffs
+# two result files and exits non-zero on regressions beyond --threshold.
+# Stages whose inputs are missing (no embedding model, no index) are
+# recorded as skipped with the reason instead of failing the run.
+#
+#   python -m benchmarks.suite run                                  # -> data/benchmarks/<commit>.json
+#   python -m benchmarks.suite run --stages retrieval --sizes 10000 100000 1000000
+#   python -m benchmarks.suite compare data/benchmarks/abc123.json data/benchmarks/def456.json
+
+STAGES = ("ingest", "retrieval", "e2e")
+RESULTS_DIR = os.path.join(DATA_DIR, "benchmarks")
+BLOCK = 50000           # synthetic vectors generated (and exact-searched) per block
+TRAIN_SIZE = 50000      # IVF/PQ training sample
+
+
+def _percentiles(seconds) -> dict:
+    ms = np.asarray(seconds) * 1000
+    return {f"p{p}_ms": round(float(np.percentile(ms, p)), 3) for p in (50, 95, 99)}
+
+
+def _git_commit() -> dict:
+    def git(*args):
+        return subprocess.run(["git", *args], capture_output=True, text=True, cwd=os.path.dirname(DATA_DIR)).stdout
+    return {"commit": git("rev-parse", "--short", "HEAD").strip() or "unknown",
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no").strip())}
+
+
+def environment() -> dict:
+    return {
+        **_git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "faiss": faiss.__version__,
+        "settings": {"index_type": FAISS_INDEX_TYPE, "vector_storage": describe_storage(), "embed_model": EMBED_MODEL_LOCAL, "chunk_size": CHUNK_SIZE,
+                     "chunk_overlap": CHUNK_OVERLAP, "retrieval_mode": RETRIEVAL_MODE, "k": TOP_K}
+    }
+
+
+# --- ingest ---
+
+def bench_ingest(pdf_dir: str = RAW_PDF_DIR, embed_sample: int = 512) -> dict:
+    """Extraction, chunking and embedding throughput over the bundled PDFs."""
+    try:
+        import pdfplumber
+        from utils.pdf_parser import iter_pdf_texts
+    except ImportError as e:
+        return {"skipped": f"PDF extraction unavailable ({e})"}
+    files = sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf")) if os.path.isdir(pdf_dir) else []
+    if not files:
+        return {"skipped": f"no PDFs in {pdf_dir}"}
+
+    pages = 0
+    for file in files:
+        with pdfplumber.open(os.path.join(pdf_dir, file)) as pdf:
+            pages += len(pdf.pages)
+    start = time.perf_counter()
+    docs = [{"filename": f, "text": text} for f, text, error in iter_pdf_texts(pdf_dir, files) if error is None]
+    extract = time.perf_counter() - start
+
+    start = time.perf_counter()
+    spans = list(iter_chunked(docs))
+    chunking = time.perf_counter() - start
+    texts = [doc["text"][a:b] for doc, doc_spans in spans for a, b, _ in doc_spans]
+    mb = sum(len(d["text"].encode("utf-8")) for d in docs) / 1e6
+
+    report = {
+        "files": len(files),
+        "pages": pages,
+        "extract_seconds": round(extract, 3),
+        "pages_per_second": round(pages / extract, 2),
+        "chunks": len(texts),
+        "chunk_seconds": round(chunking, 4),
+        "chunks_per_second": round(len(texts) / chunking, 1),
+        "chunk_mb_per_second": round(mb / chunking, 2)
+    }
+    try:
+        from models.embedding_service import encode_texts
+        sample = (texts * (embed_sample // max(len(texts), 1) + 1))[:embed_sample]
+        encode_texts(sample[:EMBED_BATCH_SIZE])     # load the model outside the timing
+        start = time.perf_counter()
+        encode_texts(sample)
+        embed = time.perf_counter() - start
+        report.update(embedded=len(sample), embed_seconds=round(embed, 3),
+                      embeddings_per_second=round(len(sample) / embed, 1))
+    except (ImportError, OSError) as e:
+        report["embeddings"] = {"skipped": f"embedding model unavailable ({e})"}
+    return report
+
+
+# --- retrieval at scale ---
+
+def base_vectors(index_path: str = FAISS_INDEX_PATH) -> np.ndarray:
+    """
+    Vectors of the indexed chunks: the full-precision rows of a compressed
+    index, else read back from the FAISS index, else embedded from the chunk file.
+    """
+    if os.path.exists(FULL_VECTORS_PATH):
+        from utils.vector_store import VectorStore
+        store = VectorStore(FULL_VECTORS_PATH)
+        if len(store):
+            return store.get_many(range(len(store)))
+    if os.path.exists(index_path):
+        index = faiss.read_index(index_path)
+        try:
+            return index.reconstruct_n(0, index.ntotal).astype("float32")
+        except RuntimeError:
+            pass
+    from models.embedding_service import encode_texts
+    from utils.chunk_store import get_chunk_store
+    store = get_chunk_store(CHUNKS_PATH)
+    return encode_texts([store.get(row).get("text", "") for row in range(len(store))])
+
+
+def synthetic_block(base: np.ndarray, start: int, size: int, noise: float, seed: int, stream: int = 0) -> np.ndarray:
+    """
+    Rows start..start+size of a synthetic set (stream 0 = corpus, 1 = queries).
+    The same (seed, stream, start) always gives the same rows.
+    """
+    rng = np.random.default_rng([seed, stream, start])
+    dim = base.shape[1]
+    vectors = base[rng.integers(len(base), size=size)] + rng.normal(0, noise / np.sqrt(dim), (size, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype("float32")
+
+
+def bench_retrieval_size(base: np.ndarray, n: int, index_type: str, queries: np.ndarray, k: int,
+                         noise: float, seed: int) -> dict:
+    """Build an index of `n` synthetic vectors block by block and time single-query search against it."""
+    dim = base.shape[1]
+    index = create_index(dim, n, index_type)
+    exact = faiss.ResultHeap(len(queries), k)
+
+    train = add = 0.0
+    if needs_training(index_type):
+        sample = synthetic_block(base, 0, min(n, TRAIN_SIZE), noise, seed)
+        start = time.perf_counter()
+        index.train(sample)
+        train = time.perf_counter() - start
+    for offset in range(0, n, BLOCK):
+        block = synthetic_block(base, offset, min(BLOCK, n - offset), noise, seed)
+        start = time.perf_counter()
+        index.add(block)
+        add += time.perf_counter() - start
+        # Ground truth is accumulated block by block, so the full corpus is never held twice
+        distances, ids = faiss.knn(queries, block, k)
+        exact.add_result(distances, ids + offset)
+    exact.finalize()
+    apply_search_params(index)
+
+    latencies, found = [], []
+    for q in queries:
+        q_start = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - q_start)
+        found.append(ids[0])
+    batch_start = time.perf_counter()
+    index.search(queries, k)
+    batch = time.perf_counter() - batch_start
+
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, exact.I))
+    return {
+        "n_vectors": n,
+        "train_seconds": round(train, 3),
+        "add_seconds": round(add, 3),
+        "index_mb": round(faiss.serialize_index(index).size / 1e6, 1),
+        "latency": _percentiles(latencies),
+        "batch_queries_per_second": round(len(queries) / batch, 1),
+        "recall_at_k": round(hits / (len(queries) * k), 4)
+    }
+
+
+def bench_retrieval(sizes, index_types=(FAISS_INDEX_TYPE,), n_queries: int = 200, k: int = TOP_K,
+                    noise: float = 0.3, seed: int = 0) -> dict:
+    try:
+        base = base_vectors()
+    except (ImportError, OSError) as e:
+        return {"skipped": f"no FAISS index and no embedding model to build one ({e})"}
+    queries = synthetic_block(base, 0, n_queries, noise, seed, stream=1)
+    report = {"base_vectors": len(base), "dim": base.shape[1], "n_queries": n_queries, "k": k, "noise": noise,
+              "seed": seed}
+    for index_type in index_types:
+        report[index_type] = {}
+        for n in sizes:
+            report[index_type][str(n)] = bench_retrieval_size(base, n, index_type, queries, k, noise, seed)
+            print(f"  retrieval {index_type} n={n}: {report[index_type][str(n)]['latency']}", file=sys.stderr)
+    return report
+
+
+# --- end to end against the stubs ---
+
+def bench_e2e(queries, turns: int = 40, llm_delay: float = 0.3, token_delay: float = 0.01,
+              search_delay: float = 0.15, mode: str = RETRIEVAL_MODE) -> dict:
+    """Streamlit-style turns (prepare_context + streamed answer) with the Groq/Google stubs on localhost."""
+    from utils.mock_servers import MockServer
+    from utils import rag_search, web_search, orchestrator
+    from models import llm
+    try:
+        rag_search.embed_query(queries[0])
+    except (ImportError, OSError) as e:
+        return {"skipped": f"embedding model unavailable ({e})"}
+
+    server = MockServer(llm_delay=llm_delay, token_delay=token_delay, search_delay=search_delay)
+    server.start()
+    llm.GROQ_API_URL, llm.GROQ_API_KEY = server.chat_url, llm.GROQ_API_KEY or "benchmark"
+    web_search.GOOGLE_SEARCH_URL = server.search_url
+    # Every turn pays the full path: no answer cache, cold retrieval caches
+    llm.ANSWER_CACHE_ENABLED = False
+
+    latencies, first_tokens, stages = [], [], {}
+    try:
+        for i in range(turns):
+            query = queries[i % len(queries)]
+            rag_search.result_cache.clear()
+            rag_search.embedding_cache.clear()
+            with trace("turn") as turn:
+                prepared = orchestrator.prepare_context(query, TOP_K, mode=mode, response_mode="concise")
+                first = None
+                if prepared["context"].strip():
+                    for _ in llm.generate_answer_stream(query, prepared["context"], "concise",
+                                                        prepared["sources"], prepared["chunk_ids"],
+                                                        web_fallback=not prepared["web_used"],
+                                                        web_in_context=prepared["web_used"]):
+                        if first is None:
+                            first = time.perf_counter() - turn.start
+            latencies.append(turn.seconds)
+            if first is not None:
+                first_tokens.append(first)
+            for name, seconds in turn.stages().items():
+                stages.setdefault(name, []).append(seconds)
+    finally:
+        server.stop()
+
+    return {
+        "turns": turns,
+        "mode": mode,
+        "stub_delays": {"llm": llm_delay, "token": token_delay, "search": search_delay},
+        "latency": _percentiles(latencies),
+        "first_token": _percentiles(first_tokens) if first_tokens else {},
+        "stage_mean_ms": {name: round(float(np.mean(v)) * 1000, 3) for name, v in sorted(stages.items())},
+        "web_fallback_rate": orchestrator.orchestrator_stats()["fallback_rate"]
+    }
+
+
+# --- comparing runs ---
+
+def _flatten(report, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in report.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def _direction(metric: str):
+    """+1 if higher is better, -1 if lower is better, None if the metric isn't a performance figure."""
+    leaf = metric.rsplit(".", 1)[-1]
+    if leaf.endswith("per_second") or leaf.startswith("recall"):
+        return 1
+    if leaf.endswith("_ms") or leaf.endswith("_seconds") or leaf.endswith("_mb"):
+        return -1
+    return None
+
+
+def compare(old: dict, new: dict, threshold: float = 0.1) -> dict:
+    """Relative change of every shared metric; regressions are changes for the worse beyond `threshold`."""
+    before, after = _flatten(old["results"]), _flatten(new["results"])
+    changes, regressions = {}, []
+    for metric in sorted(set(before) & set(after)):
+        direction = _direction(metric)
+        if direction is None or not before[metric]:
+            continue
+        change = (after[metric] - before[metric]) / abs(before[metric])
+        changes[metric] = {"before": before[metric], "after": after[metric], "change": round(change, 4)}
+        if change * direction < -threshold:
+            regressions.append(metric)
+    return {"before": old["environment"].get("commit"), "after": new["environment"].get("commit"),
+            "threshold": threshold, "changes": changes, "regressions": regressions}
+
+
+def run(stages, args) -> dict:
+    results = {}
+    if "ingest" in stages:
+        results["ingest"] = bench_ingest(args.pdf_dir)
+    if "retrieval" in stages:
+        results["retrieval"] = bench_retrieval(args.sizes, args.index_types, args.n_queries, args.k, args.noise,
+                                               args.seed)
+    if "e2e" in stages:
+        results["e2e"] = bench_e2e(DEFAULT_QUERIES, args.turns, args.llm_delay, args.token_delay,
+                                   args.search_delay)
+    return {"environment": environment(), "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark suite with machine-readable results.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run benchmark stages and write a result file")
+    run_parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    run_parser.add_argument("--out", help=f"result file (default {RESULTS_DIR}/<commit>.json)")
+    run_parser.add_argument("--pdf-dir", default=RAW_PDF_DIR)
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000],
+                            help="synthetic corpus sizes in chunks (e.g. 10000 100000 1000000)")
+    run_parser.add_argument("--index-types", nargs="+", default=[FAISS_INDEX_TYPE])
+    run_parser.add_argument("--n-queries", type=int, default=200)
+    run_parser.add_argument("--k", type=int, default=TOP_K)
+    run_parser.add_argument("--noise", type=float, default=0.3, help="norm of the noise added to each base vector")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--turns", type=int, default=40)
+    run_parser.add_argument("--llm-delay", type=float, default=0.3, help="stub seconds before the first token")
+    run_parser.add_argument("--token-delay", type=float, default=0.01, help="stub seconds between streamed tokens")
+    run_parser.add_argument("--search-delay", type=float, default=0.15, help="stub web search seconds")
+
+    compare_parser = commands.add_parser("compare", help="diff two result files")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.before, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.after, "r", encoding="utf-8") as f:
+            new = json.load(f)
+        diff = compare(old, new, args.threshold)
+        print(json.dumps(diff, indent=2))
+        raise SystemExit(1 if diff["regressions"] else 0)
+
+    result = run(args.stages, args)
+    out = args.out or os.path.join(RESULTS_DIR, f"{result['environment']['commit']}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+    print(f"Results saved to: {out}", file=sys.stderr)
@@ -6,36 +6,170 @@ load_dotenv()
 
 # --- API KEYS & ENDPOINTS ---
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 GOOGLE_CX_ID = os.getenv("GOOGLE_CX_ID", "")
-GOOGLE_SEARCH_URL = "https://customsearch.googleapis.com/customsearch/v1"
+GOOGLE_SEARCH_URL = os.getenv("GOOGLE_SEARCH_URL", "https://customsearch.googleapis.com/customsearch/v1")
 ENABLE_WEB_SEARCH = os.getenv("ENABLE_WEB_SEARCH", "true").lower() == "true"
+WEB_SPECULATIVE = os.getenv("WEB_SPECULATIVE", "true").lower() == "true"   # search alongside retrieval
+WEB_SPECULATIVE_MIN_RATE = float(os.getenv("WEB_SPECULATIVE_MIN_RATE", "0.2"))  # ...only while this share of recent turns had weak RAG
+WEB_SPECULATIVE_WINDOW = int(os.getenv("WEB_SPECULATIVE_WINDOW", "50"))         # recent turns that share is measured over
+WEB_FALLBACK_MIN_WORDS = int(os.getenv("WEB_FALLBACK_MIN_WORDS", "250"))      # weaker RAG context gets web results
 
 # LLM SETTINGS (Groq) 
 LLM_PROVIDER = "groq"
 LLM_MODEL = "llama-3.3-70b-versatile"
 LLM_TEMPERATURE = 0.25           
 MAX_CONTEXT_TOKENS = 128000     
+STREAM_FALLBACK_WINDOW = int(os.getenv("STREAM_FALLBACK_WINDOW", "160"))   # chars held back to detect "insufficient" replies
+
+# HTTP CLIENT SETTINGS (Groq + Google Search)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_CONCURRENCY = int(os.getenv("HTTP_CONCURRENCY", "8"))         # in-flight requests per host
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))                 # on 429/5xx and connection errors
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))   # seconds, doubled per attempt, full jitter
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "8"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))               # per-call deadline, retries included
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "10"))
+
+# BATCH QA SETTINGS
+BATCH_QA_SIZE = int(os.getenv("BATCH_QA_SIZE", "256"))                # queries per retrieval batch
+BATCH_QA_CONCURRENCY = int(os.getenv("BATCH_QA_CONCURRENCY", "8"))   # LLM calls in flight
+
+# API SERVER SETTINGS (server.py)
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "2"))               # processes, each loads model + index once
+SERVER_MAX_INFLIGHT = int(os.getenv("SERVER_MAX_INFLIGHT", "32"))    # concurrent requests per worker
+SERVER_QUEUE_TIMEOUT = float(os.getenv("SERVER_QUEUE_TIMEOUT", "2"))  # seconds to wait for a slot before 503
+
+# APP STARTUP
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"   # load models/index in a background thread
+
+# TRACING AND METRICS (GET /metrics serves Prometheus text)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"   # per-stage spans and histograms
+TRACE_LOG = os.getenv("TRACE_LOG", "false").lower() == "true"              # print a stage breakdown per turn
+OTEL_EXPORTER = os.getenv("OTEL_EXPORTER", "")                             # "" = off | otlp | console
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "healthcare-rag")
 
 # EMBEDDING MODEL 
 EMBED_PROVIDER = "local"
 EMBED_MODEL_LOCAL = os.getenv("EMBED_MODEL_LOCAL", "intfloat/e5-base-v2")
 EMBED_DIM = 768
+EMBED_DEVICE = os.getenv("EMBED_DEVICE", "")               # "" = auto, or "cpu", "cuda", "mps"
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))       # 0 = library default
+EMBED_PRECISION = os.getenv("EMBED_PRECISION", "fp32")     # fp32 | fp16 | int8
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")        # torch | onnx
+EMBED_ONNX_FILE = os.getenv("EMBED_ONNX_FILE", "")         # e.g. onnx/model_qint8_avx512_vnni.onnx
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_MICROBATCH = os.getenv("EMBED_MICROBATCH", "true").lower() == "true"    # batch concurrent query encodes
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "3"))       # how long a batch stays open
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))                    # queries per micro-batch
 
 # CHUNKING SETTINGS 
 CHUNK_SIZE = 550         # ~350 words
 CHUNK_OVERLAP = 80       # preserve continuity
 TOP_K = 6                # number of retrieved chunks
+CHUNKER = os.getenv("CHUNKER", "native")              # native | langchain
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", "0"))   # 0 = one per CPU core, 1 = serial
+
+# PDF EXTRACTION SETTINGS
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0"))                 # 0 = one per CPU core, 1 = serial
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "25"))  # large files are split into page ranges
+
+# STREAMING INGESTION SETTINGS
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))       # items buffered between stages
+PIPELINE_TRAIN_SIZE = int(os.getenv("PIPELINE_TRAIN_SIZE", "20000"))   # vectors buffered to train IVF/PQ; nlist targets the extrapolated corpus but is capped at this/39
+
+# CONTEXT ASSEMBLY (token budgets, dedup, MMR)
+CONTEXT_BUILDER_ENABLED = os.getenv("CONTEXT_BUILDER_ENABLED", "true").lower() == "true"
+CONTEXT_BUDGET_CONCISE = int(os.getenv("CONTEXT_BUDGET_CONCISE", "1200"))     # context tokens, concise answers
+CONTEXT_BUDGET_DETAILED = int(os.getenv("CONTEXT_BUDGET_DETAILED", "2500"))   # context tokens, detailed answers
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))                            # 1 = relevance only, 0 = diversity only
+DEDUP_JACCARD = float(os.getenv("DEDUP_JACCARD", "0.8"))                      # shingle overlap treated as duplicate
+
+# ANN INDEX SETTINGS
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")   # flat | ivf_flat | ivf_pq | hnsw
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))               # 0 = auto (~4*sqrt(n), capped by training size)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))             # search-time lists probed
+PQ_M = int(os.getenv("PQ_M", "48"))                        # sub-quantizers, must divide EMBED_DIM
+PQ_NBITS = int(os.getenv("PQ_NBITS", "8"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))   # search-time beam width
+VECTOR_CODEC = os.getenv("VECTOR_CODEC", "fp32")          # fp32 | fp16 | int8 — how the index stores vectors (not ivf_pq)
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "0"))             # 0 = full EMBED_DIM, else reduce to this many dimensions
+VECTOR_REDUCTION = os.getenv("VECTOR_REDUCTION", "pca")    # pca | matryoshka (keep the leading dimensions)
+RESCORE_CANDIDATES = int(os.getenv("RESCORE_CANDIDATES", "50"))   # shortlist re-scored in fp32 (0 = off)
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() == "true"    # memory-map the index read-only when supported (else read it in)
+INDEX_BUNDLE = os.getenv("INDEX_BUNDLE", "false").lower() == "true"   # serve from data/index_bundle
+INDEX_BUNDLE_VERIFY = os.getenv("INDEX_BUNDLE_VERIFY", "false").lower() == "true"   # sha256 every file on load
+INDEX_BUNDLE_KEEP = int(os.getenv("INDEX_BUNDLE_KEEP", "2"))               # builds kept on disk
+INDEX_BENCHMARK = os.getenv("INDEX_BENCHMARK", "true").lower() == "true"
+INDEX_BENCHMARK_QUERIES = int(os.getenv("INDEX_BENCHMARK_QUERIES", "200"))
+
+# SHARDED INDEX (corpus split across several FAISS indexes, searched in parallel)
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))          # 0 = single index; >0 = build and search this many shards
+SHARD_BY = os.getenv("SHARD_BY", "hash")                  # hash (per chunk) | file (whole documents per shard)
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0"))      # fan-out threads, 0 = one per shard
+SHARD_ENDPOINTS = os.getenv("SHARD_ENDPOINTS", "")        # host:port of each shard server, comma-separated; empty = in-process
+SHARD_AUTHKEY = os.getenv("SHARD_AUTHKEY", "")   # shared secret for shard server connections (required, no default)
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", "2.0"))  # seconds to connect to / hear back from a shard server
+
+# RETRIEVAL MODE (dense FAISS, sparse BM25, or both fused)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")     # dense | sparse | hybrid
+FUSION_METHOD = os.getenv("FUSION_METHOD", "rrf")         # rrf | weighted
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_DENSE_WEIGHT = float(os.getenv("HYBRID_DENSE_WEIGHT", "0.5"))   # weighted fusion only
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "30"))          # per-retriever candidates before fusion
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# CROSS-ENCODER RERANKING (optional second stage over over-fetched candidates)
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_DEVICE = os.getenv("RERANK_DEVICE", "cpu")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))          # rows fetched before reranking to TOP_K
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))          # pairs per forward pass
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "0.1"))         # best score below this = weak context
+RERANK_SKIP_DISTANCE = float(os.getenv("RERANK_SKIP_DISTANCE", "0.25"))  # dense top-1 this close...
+RERANK_SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", "0.05"))      # ...and this far ahead skips reranking
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))       # cached (query, chunk) scores
+
+# UPLOADED-DOCUMENT SESSION INDEXES
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", "1800"))                # seconds before an idle session is dropped
+SESSION_MAX = int(os.getenv("SESSION_MAX", "64"))                            # sessions kept in memory
+SESSION_MAX_DISTANCE = float(os.getenv("SESSION_MAX_DISTANCE", "0.6"))       # L2 cutoff for uploaded chunks
+
+# QUERY CACHE SETTINGS
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))        # cached retrieval results
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))        # cached query embeddings
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "3600"))          # seconds
+QUERY_CACHE_BACKEND = os.getenv("QUERY_CACHE_BACKEND", "memory")     # memory | disk
+
+# SEMANTIC ANSWER CACHE SETTINGS
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "86400"))                 # seconds
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))    # min cosine similarity
 
 # PATHS
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 RAW_PDF_DIR = os.path.join(DATA_DIR, "raw_pdfs")
+PDF_TEXTS_PATH = os.path.join(DATA_DIR, "pdf_texts.jsonl")
 CHUNKS_PATH = os.path.join(DATA_DIR, "processed_chunks.jsonl")
 FAISS_INDEX_PATH = os.path.join(DATA_DIR, "faiss_index.bin")
-METADATA_PATH = os.path.join(DATA_DIR, "chunk_metadata.jsonl")
+FULL_VECTORS_PATH = os.path.join(DATA_DIR, "vectors.f32")   # full-precision rows for rescoring compressed indexes
+SPARSE_INDEX_PATH = os.path.join(DATA_DIR, "sparse_index.npz")
+INDEX_REPORT_PATH = os.path.join(DATA_DIR, "index_report.json")
+INGEST_MANIFEST_PATH = os.path.join(DATA_DIR, "ingest_manifest.json")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+INDEX_BUNDLE_DIR = os.path.join(DATA_DIR, "index_bundle")
+SHARD_DIR = os.path.join(DATA_DIR, "shards")
 
 # SYSTEM PROMPT
 DEFAULT_SYSTEM_PROMPT = """
@@ -0,0 +1,343 @@
+import math
+import time
+import numpy as np
+import faiss
+from config.config import (
+    FAISS_INDEX_TYPE,
+    IVF_NLIST,
+    IVF_NPROBE,
+    PQ_M,
+    PQ_NBITS,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    VECTOR_CODEC,
+    VECTOR_DIM,
+    VECTOR_REDUCTION,
+    INDEX_BENCHMARK_QUERIES,
+    TOP_K
+)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+VECTOR_CODECS = {"fp32": "Flat", "fp16": "SQfp16", "int8": "SQ8"}
+
+# k-means in FAISS wants at least this many training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+NPROBE_SWEEP = [1, 2, 4, 8, 16, 32, 64, 128]
+EF_SEARCH_SWEEP = [16, 32, 64, 128, 256]
+
+
+def _auto_nlist(n_vectors: int, expected: int = 0) -> int:
+    """~4*sqrt(corpus size), where the corpus is `expected` vectors when larger than the training set."""
+    if IVF_NLIST > 0:
+        return IVF_NLIST
+    return max(1, min(int(4 * math.sqrt(max(n_vectors, expected))), n_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def _pq_nbits(n_vectors: int) -> int:
+    """Shrink PQ codebooks on small corpora so every centroid has training data."""
+    nbits = PQ_NBITS
+    while nbits > 4 and n_vectors < MIN_POINTS_PER_CENTROID * (1 << nbits):
+        nbits -= 1
+    return nbits
+
+
+def index_factory_string(index_type: str, n_vectors: int, dim: int, codec: str = VECTOR_CODEC,
+                         expected: int = 0) -> str:
+    """
+    Translate a FAISS_INDEX_TYPE name into a faiss.index_factory description.
+    `codec` sets how flat, ivf_flat and hnsw store vectors (fp32, fp16 or
+    int8 scalar-quantized); ivf_pq is already compressed and ignores it.
+    `expected` is the final corpus size when training on a sample of it.
+    """
+    index_type = index_type.lower()
+    if codec not in VECTOR_CODECS:
+        raise ValueError(f"Unknown VECTOR_CODEC '{codec}'. Choose from: {', '.join(VECTOR_CODECS)}")
+    storage = VECTOR_CODECS[codec]
+    if index_type == "flat":
+        return storage
+    if index_type == "ivf_flat":
+        return f"IVF{_auto_nlist(n_vectors, expected)},{storage}"
+    if index_type == "ivf_pq":
+        if dim % PQ_M:
+            raise ValueError(f"PQ_M={PQ_M} must divide the embedding dimension {dim}.")
+        return f"IVF{_auto_nlist(n_vectors, expected)},PQ{PQ_M}x{_pq_nbits(n_vectors)}"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M}" if codec == "fp32" else f"HNSW{HNSW_M},{storage}"
+    raise ValueError(f"Unknown FAISS_INDEX_TYPE '{index_type}'. Choose from: {', '.join(INDEX_TYPES)}")
+
+
+def _reduction(dim: int, n_vectors: int, reduce_dim: int, reduction: str):
+    """The dimension-reducing transform for VECTOR_DIM, or None at full dimension."""
+    if not reduce_dim or reduce_dim >= dim:
+        return None
+    if reduction == "pca":
+        if n_vectors > reduce_dim:
+            return faiss.PCAMatrix(dim, reduce_dim)
+        # PCA cannot output more components than it has training vectors
+        print(f"[Error] PCA to {reduce_dim} dimensions needs more than {n_vectors} vectors; "
+              f"keeping the leading {reduce_dim} dimensions instead.")
+    elif reduction != "matryoshka":
+        raise ValueError(f"Unknown VECTOR_REDUCTION '{reduction}'. Choose from: pca, matryoshka")
+    # Matryoshka-style truncation: keep the first reduce_dim dimensions
+    return faiss.RemapDimensionsTransform(dim, reduce_dim, False)
+
+
+def describe_storage(index_type: str = FAISS_INDEX_TYPE, codec: str = VECTOR_CODEC, reduce_dim: int = VECTOR_DIM,
+                     reduction: str = VECTOR_REDUCTION) -> str:
+    """Short label for how vectors are stored, e.g. 'fp32', 'int8' or 'pca256+fp16'."""
+    storage = "pq" if index_type.lower() == "ivf_pq" else codec
+    return f"{reduction}{reduce_dim}+{storage}" if reduce_dim else storage
+
+
+def is_compressed(index_type: str = FAISS_INDEX_TYPE, codec: str = VECTOR_CODEC, reduce_dim: int = VECTOR_DIM) -> bool:
+    """Whether the index stores vectors lossily, so full-precision copies are kept for rescoring."""
+    return index_type.lower() == "ivf_pq" or codec != "fp32" or bool(reduce_dim)
+
+
+def needs_training(index_type: str, codec: str = VECTOR_CODEC, reduce_dim: int = VECTOR_DIM,
+                   reduction: str = VECTOR_REDUCTION) -> bool:
+    """Whether the index learns quantizers (IVF/PQ, int8 ranges, PCA) from data before vectors can be added."""
+    return index_type.lower() not in ("flat", "hnsw") or codec == "int8" or bool(reduce_dim and reduction == "pca")
+
+
+def base_index(index):
+    """Unwrap ID maps and pre-transforms to reach the index that holds search parameters."""
+    while True:
+        if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexPreTransform)):
+            index = faiss.downcast_index(index.index)
+        else:
+            return index
+
+
+def apply_search_params(index, nprobe: int = IVF_NPROBE, ef_search: int = HNSW_EF_SEARCH) -> dict:
+    """Set search-time knobs (nprobe for IVF, efSearch for HNSW). Returns what was applied."""
+    base = base_index(index)
+    applied = {}
+
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+        applied["nprobe"] = ivf.nprobe
+
+    if hasattr(base, "hnsw"):
+        base.hnsw.efSearch = ef_search
+        applied["efSearch"] = ef_search
+
+    return applied
+
+
+def create_index(dim: int, n_vectors: int, index_type: str = FAISS_INDEX_TYPE, codec: str = VECTOR_CODEC,
+                 reduce_dim: int = VECTOR_DIM, reduction: str = VECTOR_REDUCTION, expected: int = 0):
+    """
+    Create an empty (possibly untrained) index for the configured type, codec
+    and dimension, to be trained on `n_vectors` vectors and hold `expected`.
+    """
+    transform = _reduction(dim, n_vectors, reduce_dim, reduction)
+    index_dim = transform.d_out if transform is not None else dim
+    index = faiss.index_factory(index_dim, index_factory_string(index_type, n_vectors, index_dim, codec, expected),
+                                faiss.METRIC_L2)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    if transform is not None:
+        index = faiss.IndexPreTransform(transform, index)
+    return index
+
+
+def build_ann_index(vectors: np.ndarray, index_type: str = FAISS_INDEX_TYPE, train_vectors: np.ndarray = None,
+                    ids: np.ndarray = None):
+    """
+    Create, train (IVF/PQ) and fill an index with `vectors`.
+    The index is ID-mapped: each vector's ID is its row in the chunk store
+    (0..n-1 unless `ids` is given), so rows can later be added or removed.
+    """
+    n_vectors, dim = vectors.shape
+    index = create_index(dim, n_vectors, index_type)
+    if not index.is_trained:
+        index.train(train_vectors if train_vectors is not None else vectors)
+    index = faiss.IndexIDMap2(index)
+    if ids is None:
+        ids = np.arange(n_vectors, dtype="int64")
+    index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    apply_search_params(index)
+    return index
+
+
+def _reconstruct_all(index) -> np.ndarray:
+    """Recover stored vectors in internal order (exact for Flat/HNSW, approximate for PQ)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def reconstruct_rows(index, rows):
+    """Stored vectors for the given IDs, or None if this index type can't reconstruct them."""
+    rows = [int(r) for r in rows]
+    for attempt in range(2):
+        try:
+            return np.stack([index.reconstruct(r) for r in rows]).astype("float32")
+        except RuntimeError:
+            base = base_index(index)
+            ivf = faiss.try_extract_index_ivf(base) if isinstance(base, faiss.Index) else None
+            if ivf is None or attempt:
+                return None
+            ivf.make_direct_map()
+    return None
+
+
+def _empty_copy(index):
+    """Clone a trained index without its vectors."""
+    fresh = faiss.clone_index(index)
+    fresh.reset()
+    return fresh
+
+
+def ensure_id_map(index):
+    """Wrap a legacy positional index in IndexIDMap2, keeping IDs equal to positions."""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return index
+    vectors = _reconstruct_all(index)
+    wrapped = faiss.IndexIDMap2(_empty_copy(index))
+    wrapped.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+    apply_search_params(wrapped)
+    return wrapped
+
+
+def remove_ids(index, ids):
+    """
+    Remove vectors by ID from an ID-mapped index and return the (possibly new) index.
+    HNSW graphs cannot delete in place, so they are rebuilt from their own stored
+    vectors — no re-embedding is needed.
+    """
+    ids = np.asarray(list(ids), dtype="int64")
+    if not len(ids):
+        return index
+    try:
+        index.remove_ids(ids)
+        return index
+    except RuntimeError:
+        # Rebuild below any dimension-reducing transform, so it is kept
+        inner = faiss.downcast_index(index.index)
+        all_ids = faiss.vector_to_array(index.id_map)
+        vectors = _reconstruct_all(inner)
+        keep = ~np.isin(all_ids, ids)
+        rebuilt = faiss.IndexIDMap2(_empty_copy(inner))
+        rebuilt.add_with_ids(vectors[keep], all_ids[keep])
+        apply_search_params(rebuilt)
+        return rebuilt
+
+
+def _sweep(index):
+    base = base_index(index)
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        return [{"nprobe": p} for p in NPROBE_SWEEP if p <= ivf.nlist]
+    if hasattr(base, "hnsw"):
+        return [{"efSearch": ef} for ef in EF_SEARCH_SWEEP]
+    return [{}]
+
+
+def _timed_search(index, queries, k):
+    """Search one query at a time (as the app does) and record per-query latency."""
+    ids, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        _, found = index.search(q.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(found[0])
+    return np.array(ids), np.array(latencies)
+
+
+def _latency_summary(latencies):
+    return {
+        "mean": round(float(latencies.mean()), 4),
+        "p50": round(float(np.percentile(latencies, 50)), 4),
+        "p95": round(float(np.percentile(latencies, 95)), 4),
+        "p99": round(float(np.percentile(latencies, 99)), 4)
+    }
+
+
+def benchmark_index(index, vectors: np.ndarray, k: int = TOP_K, n_queries: int = INDEX_BENCHMARK_QUERIES,
+                    query_vectors: np.ndarray = None, seed: int = 0, rescore: int = 0) -> dict:
+    """
+    Measure recall@k and latency of `index` against an exact Flat index.
+    Without explicit query vectors, a random sample of corpus vectors is used
+    leave-one-out: each query's own row is excluded from both result lists.
+    With `rescore`, each setting is also measured fetching that many
+    candidates and re-ranking them by exact distance to `vectors`, as
+    retrieval does for compressed indexes.
+    """
+    n_vectors, dim = vectors.shape
+    flat = faiss.IndexFlatL2(dim)
+    flat.add(vectors)
+
+    if query_vectors is None:
+        rng = np.random.default_rng(seed)
+        query_ids = rng.choice(n_vectors, size=min(n_queries, n_vectors), replace=False)
+        queries = vectors[query_ids]
+        query_set = "leave-one-out corpus sample"
+    else:
+        query_ids = np.full(len(query_vectors), -1)
+        queries = np.ascontiguousarray(query_vectors, dtype="float32")
+        query_set = "provided queries"
+
+    fetch = min(k + 1, n_vectors)
+
+    def top_k(found):
+        return [[i for i in row if i != qid and i != -1][:k] for row, qid in zip(found, query_ids)]
+
+    def exact_order(found):
+        """Candidate rows sorted by exact distance to their query."""
+        ordered = []
+        for q, row in zip(queries, found):
+            row = row[row != -1]
+            diff = vectors[row] - q
+            ordered.append(row[np.argsort(np.einsum("ij,ij->i", diff, diff), kind="stable")])
+        return ordered
+
+    truth_ids, flat_latency = _timed_search(flat, queries, fetch)
+    truth = top_k(truth_ids)
+    total = sum(len(t) for t in truth)
+
+    def measure(params, found, latency, shortlist=0):
+        hits = sum(len(set(f) & set(t)) for f, t in zip(top_k(found), truth))
+        row = {"params": params, "recall_at_k": round(hits / max(total, 1), 4)}
+        row["recall_lost"] = round(1 - row["recall_at_k"], 4)
+        if shortlist:
+            row["rescore"] = shortlist
+        row["latency_ms"] = _latency_summary(latency)
+        return row
+
+    results = []
+    shortlist = min(max(rescore, fetch), n_vectors) if rescore else 0
+    for params in _sweep(index):
+        apply_search_params(index, nprobe=params.get("nprobe", IVF_NPROBE),
+                            ef_search=params.get("efSearch", HNSW_EF_SEARCH))
+        found_ids, latency = _timed_search(index, queries, fetch)
+        results.append(measure(params, found_ids, latency))
+        if shortlist:
+            candidates, latency = _timed_search(index, queries, shortlist)
+            start = time.perf_counter()
+            ordered = exact_order(candidates)
+            rescore_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            results.append(measure(params, ordered, latency + rescore_ms, shortlist))
+
+    # Leave the index on the configured search parameters
+    apply_search_params(index)
+
+    index_bytes = int(faiss.serialize_index(index).size)
+    flat_bytes = int(faiss.serialize_index(flat).size)
+    return {
+        "k": k,
+        "n_vectors": n_vectors,
+        "dim": dim,
+        "n_queries": len(queries),
+        "query_set": query_set,
+        "index_bytes": index_bytes,
+        "flat_bytes": flat_bytes,
+        "memory_saved": round(1 - index_bytes / flat_bytes, 4),
+        "flat_latency_ms": _latency_summary(flat_latency),
+        "results": results
+    }
@@ -0,0 +1,119 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from utils.metrics import counter
+from config.config import (
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_THRESHOLD
+)
+
+
+class SemanticAnswerCache:
+    """
+    Caches LLM answers by query meaning rather than exact text.
+    A lookup hits when a stored query's embedding is at least `threshold`
+    cosine-similar to the new one AND it was answered from the same retrieved
+    chunks (or the same context, when chunk IDs are unknown or web results
+    are part of it) in the same response mode. Entries expire after `ttl`, the oldest are evicted past
+    `max_size`, and everything is dropped when the index generation changes.
+    """
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._generation = None
+        self.lookups = 0
+        self.hits = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def evidence_key(chunk_ids, context: str, response_mode: str, web: bool = False):
+        """
+        What the answer was grounded on: chunk IDs if known, else a hash of the
+        context. Web results merged into the context (web=True) have no IDs, so
+        the context hash is added to the chunk IDs.
+        """
+        digest = hashlib.sha1((context or "").encode("utf-8")).hexdigest()
+        if chunk_ids:
+            evidence = tuple(sorted(str(i) for i in chunk_ids))
+            if web:
+                evidence = (evidence, digest)
+        else:
+            evidence = digest
+        return evidence, (response_mode or "").lower()
+
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+    def lookup(self, query_vector: np.ndarray, chunk_ids, context: str, response_mode: str, generation=None,
+               web: bool = False):
+        """Return the cached answer for a near-duplicate query, or None."""
+        evidence = self.evidence_key(chunk_ids, context, response_mode, web)
+        now = time.time()
+        with self._lock:
+            self._check_generation(generation)
+            self.lookups += 1
+
+            candidates = []
+            for entry_id, entry in list(self._entries.items()):
+                if entry["expires"] < now:
+                    del self._entries[entry_id]
+                elif entry["evidence"] == evidence:
+                    candidates.append(entry_id)
+            if not candidates:
+                return None
+
+            matrix = np.stack([self._entries[i]["vector"] for i in candidates])
+            sims = matrix @ query_vector
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+
+            entry = self._entries[candidates[best]]
+            self._entries.move_to_end(candidates[best])
+            self.hits += 1
+            self.saved_seconds += entry["latency"]
+            return entry["answer"]
+
+    def store(self, query_vector: np.ndarray, chunk_ids, context: str, response_mode: str, answer: str,
+              latency: float, generation=None, web: bool = False):
+        with self._lock:
+            self._check_generation(generation)
+            self._entries[self._next_id] = {
+                "vector": np.asarray(query_vector, dtype="float32"),
+                "evidence": self.evidence_key(chunk_ids, context, response_mode, web),
+                "answer": answer,
+                "latency": latency,
+                "expires": time.time() + self.ttl
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3)
+        }
+
+
+answer_cache = SemanticAnswerCache()
+counter("answer_cache_lookups_total", "Semantic answer cache lookups", lambda: answer_cache.lookups)
+counter("answer_cache_hits_total", "Semantic answer cache hits", lambda: answer_cache.hits)
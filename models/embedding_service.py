@@ -0,0 +1,165 @@
+import os
+import time
+import queue
+import threading
+import numpy as np
+from utils.metrics import histogram, SIZE_BUCKETS
+from utils.tracing import span
+from config.config import (
+    EMBED_MODEL_LOCAL,
+    EMBED_DIM,
+    EMBED_DEVICE,
+    EMBED_THREADS,
+    EMBED_PRECISION,
+    EMBED_BACKEND,
+    EMBED_ONNX_FILE,
+    EMBED_BATCH_SIZE,
+    EMBED_MICROBATCH,
+    EMBED_BATCH_WINDOW_MS,
+    EMBED_MAX_BATCH
+)
+
+# One model per process, shared by the index builder, query path and uploads.
+# Nothing is loaded until the first encode call.
+_model = None
+_model_lock = threading.Lock()
+
+
+def _load_model():
+    """Build the SentenceTransformer with the configured device, threads and precision."""
+    if EMBED_THREADS > 0:
+        # ONNX Runtime and MKL read these when the session/library initializes
+        os.environ.setdefault("OMP_NUM_THREADS", str(EMBED_THREADS))
+        os.environ.setdefault("MKL_NUM_THREADS", str(EMBED_THREADS))
+
+    from sentence_transformers import SentenceTransformer
+
+    print(f"Loading embedding model: {EMBED_MODEL_LOCAL} "
+          f"(backend={EMBED_BACKEND}, precision={EMBED_PRECISION}, device={EMBED_DEVICE or 'auto'})")
+
+    kwargs = {"device": EMBED_DEVICE} if EMBED_DEVICE else {}
+
+    if EMBED_BACKEND == "onnx":
+        model_kwargs = {}
+        if EMBED_ONNX_FILE:
+            model_kwargs["file_name"] = EMBED_ONNX_FILE
+        elif EMBED_PRECISION == "int8":
+            model_kwargs["file_name"] = "onnx/model_qint8_avx512_vnni.onnx"
+        return SentenceTransformer(EMBED_MODEL_LOCAL, backend="onnx", model_kwargs=model_kwargs, **kwargs)
+
+    import torch
+    if EMBED_THREADS > 0:
+        torch.set_num_threads(EMBED_THREADS)
+
+    model = SentenceTransformer(EMBED_MODEL_LOCAL, **kwargs)
+    if EMBED_PRECISION == "fp16":
+        if model.device.type == "cpu":
+            print("[Warning] fp16 embeddings on CPU are usually slower than fp32.")
+        model.half()
+    elif EMBED_PRECISION == "int8":
+        if model.device.type != "cpu":
+            print("[Warning] int8 dynamic quantization is CPU-only; using fp32.")
+        else:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def get_embedding_model():
+    """Return the shared embedding model, loading it on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                with span("model_load"):
+                    _model = _load_model()
+    return _model
+
+
+def is_model_loaded() -> bool:
+    return _model is not None
+
+
+def encode_texts(texts, batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """Encode a batch of texts into normalized float32 embeddings."""
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, EMBED_DIM), dtype="float32")
+    return get_embedding_model().encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    ).astype("float32")
+
+
+class QueryBatcher:
+    """
+    Micro-batches concurrent single-query encodes. The first request opens a
+    window of `window_ms`; every request that arrives before it closes (up to
+    `max_batch`) is encoded in the same forward pass, and each caller gets its
+    own row back. Queue wait and batch size go to histograms.
+    """
+
+    def __init__(self, window_ms: float = EMBED_BATCH_WINDOW_MS, max_batch: int = EMBED_MAX_BATCH):
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.queue_wait = histogram("embed_queue_wait_seconds", "Time a query waited to be batched")
+        self.batch_size = histogram("embed_batch_size", "Queries per micro-batch", SIZE_BUCKETS)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                    self._thread.start()
+
+    def encode(self, text: str) -> np.ndarray:
+        self._ensure_started()
+        request = {"text": text, "done": threading.Event(), "enqueued": time.perf_counter()}
+        self._queue.put(request)
+        request["done"].wait()
+        if "error" in request:
+            raise request["error"]
+        return request["vector"]
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            start = time.perf_counter()
+            for request in batch:
+                self.queue_wait.observe(start - request["enqueued"])
+            self.batch_size.observe(len(batch))
+            try:
+                vectors = encode_texts([request["text"] for request in batch], batch_size=len(batch))
+                for request, vector in zip(batch, vectors):
+                    request["vector"] = vector
+            except Exception as e:
+                for request in batch:
+                    request["error"] = e
+            for request in batch:
+                request["done"].set()
+
+
+_batcher = QueryBatcher() if EMBED_MICROBATCH else None
+
+
+def encode_query(query: str) -> np.ndarray:
+    """Encode a single query into a normalized float32 embedding (micro-batched when enabled)."""
+    if _batcher is not None:
+        return _batcher.encode(query)
+    return encode_texts([query])[0]
@@ -1,49 +1,93 @@
 import os
 import json
+import time
 import numpy as np
 import faiss
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
-from config.config import DATA_DIR, FAISS_INDEX_PATH, EMBED_MODEL_LOCAL
-
-# Load local embedding model
-print(f"Loading embedding model: {EMBED_MODEL_LOCAL}")
-embed_model = SentenceTransformer(EMBED_MODEL_LOCAL)
-
-def embed_texts(texts, batch_size=32):
-    """Convert text chunks into dense embeddings."""
-    embeddings = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
-        emb = embed_model.encode(
-            batch,
-            convert_to_numpy=True,
-            normalize_embeddings=True,
-            show_progress_bar=False
-        )
-        embeddings.append(emb)
-    return np.vstack(embeddings)
-
-def build_faiss_index(chunks_path, index_path):
-    """Generate embeddings for chunks and build FAISS index."""
+from models.embedding_service import encode_texts
+from models.ann_index import build_ann_index, benchmark_index, index_factory_string, is_compressed, describe_storage
+from utils.vector_store import write_vectors, discard_vectors
+from utils.sparse_index import build_sparse_index
+from utils.index_bundle import build_bundle
+from utils.shards import build_shards
+from utils.ingest import compact_manifest, save_manifest
+from config.config import (
+    DATA_DIR,
+    CHUNKS_PATH,
+    FAISS_INDEX_PATH,
+    FULL_VECTORS_PATH,
+    EMBED_BATCH_SIZE,
+    FAISS_INDEX_TYPE,
+    INDEX_BENCHMARK,
+    INDEX_REPORT_PATH,
+    INGEST_MANIFEST_PATH,
+    SPARSE_INDEX_PATH,
+    INDEX_BUNDLE,
+    SHARD_COUNT,
+    VECTOR_DIM,
+    RESCORE_CANDIDATES
+)
+
+def embed_texts(texts, batch_size=EMBED_BATCH_SIZE):
+    """Convert text chunks into dense embeddings using the shared model."""
+    return encode_texts(texts, batch_size=batch_size)
+
+def write_index_report(index, vectors, index_type, build_seconds, report_path=INDEX_REPORT_PATH):
+    """
+    Benchmark the built index against exact Flat search and save the report as JSON.
+    For compressed indexes, results are also given with the shortlist re-scored
+    in full precision, next to the memory the compression saves.
+    """
+    n_vectors, dim = vectors.shape
+    rescore = RESCORE_CANDIDATES if is_compressed(index_type) else 0
+    report = {
+        "index_type": index_type,
+        "factory": index_factory_string(index_type, n_vectors, min(VECTOR_DIM or dim, dim)),
+        "storage": describe_storage(index_type),
+        "build_seconds": round(build_seconds, 3),
+        **benchmark_index(index, vectors, rescore=rescore)
+    }
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Index report saved to: {report_path}")
+    print(f"  {report['storage']}: {report['index_bytes'] / n_vectors:.0f} bytes/vector, "
+          f"{report['memory_saved']:.1%} smaller than fp32 Flat")
+    for row in report["results"]:
+        label = row['params'] or 'exact'
+        if row.get("rescore"):
+            label = f"{label} + rescore {row['rescore']}"
+        print(f"  {label}: recall@{report['k']}={row['recall_at_k']:.3f}, "
+              f"p50={row['latency_ms']['p50']:.3f} ms")
+    return report
+
+def build_faiss_index(chunks_path, index_path, index_type=FAISS_INDEX_TYPE):
+    """Generate embeddings for chunks and build a FAISS index of the configured type."""
     try:
         if not os.path.exists(chunks_path):
             print(f"[Error] Chunk file not found: {chunks_path}")
             return
 
         print(f"Reading chunks from: {chunks_path}")
-        texts, metadata = [], []
+        lines = []
 
-        # Load chunked data
+        # Load chunked data (topic/section/filename are served by the chunk store)
         with open(chunks_path, "r", encoding="utf-8") as f:
             for line in tqdm(f, desc="Loading chunks"):
-                obj = json.loads(line.strip())
-                texts.append(obj.get("text", ""))
-                metadata.append({
-                    "topic": obj.get("topic_title", ""),
-                    "section": obj.get("section", ""),
-                    "filename": obj.get("filename", "")
-                })
+                if line.strip():
+                    lines.append(line.strip())
+
+        # Incremental removes/updates leave dead rows behind; keep only the rows the
+        # ingest manifest still assigns to a file, renumbered from 0
+        manifest, compacted = None, False
+        if os.path.exists(INGEST_MANIFEST_PATH) and os.path.abspath(chunks_path) == os.path.abspath(CHUNKS_PATH):
+            with open(INGEST_MANIFEST_PATH, "r", encoding="utf-8") as f:
+                live, manifest = compact_manifest(json.load(f), len(lines))
+            if len(live) < len(lines):
+                print(f"Compacting chunks: dropping {len(lines) - len(live)} dead rows, keeping {len(live)}")
+                lines = [lines[row] for row in live]
+                compacted = True
+        texts = [json.loads(line).get("text", "") for line in lines]
 
         if not texts:
             print("[Error] No chunks found in file.")
@@ -52,19 +96,51 @@ def build_faiss_index(chunks_path, index_path):
         print(f"Creating embeddings for {len(texts)} chunks...")
         vectors = embed_texts(texts).astype("float32")
 
-        dim = vectors.shape[1]
-        index = faiss.IndexFlatL2(dim)
-        index.add(vectors)
+        print(f"Building '{index_type}' index...")
+        start = time.perf_counter()
+        index = build_ann_index(vectors, index_type)
+        build_seconds = time.perf_counter() - start
 
-        faiss.write_index(index, index_path)
+        # Publish the compacted chunk file with the index built over it
+        if compacted:
+            tmp_chunks = chunks_path + ".tmp"
+            with open(tmp_chunks, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_chunks, chunks_path)
+
+        # Atomic swap: the app reloads the index when the file changes
+        tmp_path = index_path + ".tmp"
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, index_path)
         print(f"FAISS index saved to: {index_path}")
 
-        metadata_path = os.path.join(DATA_DIR, "chunk_metadata.jsonl")
-        with open(metadata_path, "w", encoding="utf-8") as f:
-            for meta in metadata:
-                f.write(json.dumps(meta) + "\n")
+        # Compressed indexes re-score their shortlist against the full-precision rows
+        if is_compressed(index_type):
+            write_vectors(vectors, FULL_VECTORS_PATH)
+            print(f"Full-precision vectors saved to: {FULL_VECTORS_PATH}")
+        else:
+            discard_vectors(FULL_VECTORS_PATH)
+
+        # BM25 inverted index over the same rows, for sparse/hybrid retrieval
+        build_sparse_index(range(len(texts)), texts, SPARSE_INDEX_PATH)
+        print(f"Sparse index saved to: {SPARSE_INDEX_PATH}")
+
+        # Rows were renumbered: keep the manifest in step, or let ingestion
+        # re-derive it when it describes another chunk file
+        if manifest is not None:
+            save_manifest(manifest, INGEST_MANIFEST_PATH)
+        elif os.path.exists(INGEST_MANIFEST_PATH):
+            os.remove(INGEST_MANIFEST_PATH)
+
+        if INDEX_BENCHMARK:
+            write_index_report(index, vectors, index_type, build_seconds)
+
+        if INDEX_BUNDLE:
+            summary = build_bundle(chunks_path, index_path)
+            print(f"Index bundle written to: {summary['path']}")
 
-        print(f"Metadata saved to: {metadata_path}")
+        if SHARD_COUNT:
+            build_shards(SHARD_COUNT, chunks_path=chunks_path, index_path=index_path, index_type=index_type)
 
     except Exception as e:
         print(f"[Build Index Error] {e}")
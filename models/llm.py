@@ -1,23 +1,94 @@
 import os
-import requests
+import time
 import json
-from utils.web_search import google_search
+import asyncio
+import httpx
+from utils.http_client import request, stream_lines, run_sync, iter_sync
+from utils.web_search import google_search_async
+from utils.context_builder import fit_web_context
+from models.answer_cache import answer_cache
+from utils.tracing import span
+from utils.metrics import counter, histogram
 from config.config import (
     GROQ_API_KEY,
     GROQ_API_URL,
     LLM_MODEL,
     LLM_TEMPERATURE,
+    LLM_TIMEOUT,
+    ANSWER_CACHE_ENABLED,
+    STREAM_FALLBACK_WINDOW,
 )
 
-def generate_answer(query: str, context: str, response_mode: str = "detailed", sources: list = None):
+llm_requests = counter("llm_requests_total", "Groq chat completion calls")
+llm_errors = counter("llm_errors_total", "Groq calls that failed or returned an invalid response")
+llm_web_fallbacks = counter("llm_web_fallbacks_total", "Answers retried with web results after an insufficient reply")
+tokens_in = counter("llm_tokens_in_total", "Prompt tokens sent to Groq (from the reported usage)")
+tokens_out = counter("llm_tokens_out_total", "Completion tokens received from Groq")
+first_token = histogram("llm_first_token_seconds", "Time to the first streamed token")
+
+def _record_usage(usage: dict):
+    if usage:
+        tokens_in.inc(usage.get("prompt_tokens", 0))
+        tokens_out.inc(usage.get("completion_tokens", 0))
+
+def _cache_lookup(query: str, context: str, response_mode: str, chunk_ids: list, web_in_context: bool = False):
+    """Return (cached answer or None, query vector, index generation)."""
+    # Lazy import: the retrieval stack is only needed when caching is on
+    from utils.rag_search import embed_query, index_generation
+    query_vector = embed_query(query)
+    generation = index_generation()
+    cached = answer_cache.lookup(query_vector, chunk_ids, context, response_mode, generation, web_in_context)
+    return cached, query_vector, generation
+
+def _cache_store(query_vector, chunk_ids: list, context: str, response_mode: str, answer: str,
+                 start: float, generation, web_in_context: bool = False, web_fallback_used: bool = False):
+    # Error, partial-failure and "insufficient information" answers are never cached, so near-duplicates
+    # retry; nor are web-fallback answers, grounded on search results no later lookup can key on
+    if answer and "⚠️" not in answer and not is_insufficient(answer) and not web_fallback_used:
+        answer_cache.store(query_vector, chunk_ids, context, response_mode, answer,
+                           time.perf_counter() - start, generation, web_in_context)
+
+def generate_answer(query: str, context: str, response_mode: str = "detailed", sources: list = None,
+                    chunk_ids: list = None, web_fallback: bool = True, web_in_context: bool = False):
     """
-    Generate grounded, healthcare-focused answers using Groq API (LLaMA 3.3 70B).
-    Features:
-      - Strict healthcare-only domain filtering
-      - Automatic web search fallback if context is insufficient
-      - Clear, structured, medically factual responses
+    Answer a query, serving near-duplicate questions grounded on the same
+    chunks (chunk_ids) and response mode from the semantic answer cache.
+    Pass web_fallback=False and web_in_context=True when web results are
+    already in the context.
     """
+    if not ANSWER_CACHE_ENABLED:
+        return _generate_answer(query, context, response_mode, sources, web_fallback)[0]
+
+    cached, query_vector, generation = _cache_lookup(query, context, response_mode, chunk_ids, web_in_context)
+    if cached is not None:
+        return cached
+
+    start = time.perf_counter()
+    answer, web_used = _generate_answer(query, context, response_mode, sources, web_fallback)
+    _cache_store(query_vector, chunk_ids, context, response_mode, answer, start, generation, web_in_context,
+                 web_used)
+    return answer
+
+async def generate_answer_async(query: str, context: str, response_mode: str = "detailed", sources: list = None,
+                                chunk_ids: list = None, web_fallback: bool = True, web_in_context: bool = False):
+    """Async variant of generate_answer for callers running their own event loop."""
+    if not ANSWER_CACHE_ENABLED:
+        return (await _generate_answer_async(query, context, response_mode, sources, web_fallback))[0]
+
+    # Off the event loop: embedding may wait on a micro-batch
+    cached, query_vector, generation = await asyncio.to_thread(_cache_lookup, query, context, response_mode,
+                                                               chunk_ids, web_in_context)
+    if cached is not None:
+        return cached
 
+    start = time.perf_counter()
+    answer, web_used = await _generate_answer_async(query, context, response_mode, sources, web_fallback)
+    _cache_store(query_vector, chunk_ids, context, response_mode, answer, start, generation, web_in_context,
+                 web_used)
+    return answer
+
+def _build_request(query: str, context: str, response_mode: str = "detailed", sources: list = None):
+    """Build headers, chat payload and user prompt for a Groq chat completion."""
     if not GROQ_API_KEY:
         raise ValueError("Missing GROQ_API_KEY in environment variables.")
 
@@ -83,41 +154,207 @@ Rules:
         "max_tokens": 900,
         "temperature": LLM_TEMPERATURE,
     }
+    return headers, payload, full_prompt
 
-    # PRIMARY REQUEST (RAG Context)
-    try:
-        response = requests.post(GROQ_API_URL, headers=headers, json=payload, timeout=120)
+# Phrases the model uses when the context can't support an answer
+INSUFFICIENT_PHRASES = [
+    "i don’t have enough medical information",
+    "i don't have enough medical information",
+    "insufficient context",
+    "not enough information",
+]
+
+def is_insufficient(answer: str) -> bool:
+    return any(phrase in answer.lower() for phrase in INSUFFICIENT_PHRASES)
+
+def _with_web_results(payload: dict, full_prompt: str, web_context: str) -> dict:
+    retry = dict(payload)
+    retry["messages"] = [
+        payload["messages"][0],
+        {"role": "user", "content": f"{full_prompt}\n\n### Additional Web Search Results:\n{web_context}"},
+    ]
+    return retry
+
+async def _post_chat(headers: dict, payload: dict, stage: str = "llm_first") -> str:
+    """One chat completion; `stage` names the span (llm_first, or llm_second for the web-grounded retry)."""
+    llm_requests.inc()
+    with span(stage, model=payload["model"]):
+        response = await request("POST", GROQ_API_URL, timeout=LLM_TIMEOUT, headers=headers, json=payload)
         response.raise_for_status()
         data = response.json()
-        answer = data["choices"][0]["message"]["content"].strip()
+    _record_usage(data.get("usage"))
+    return data["choices"][0]["message"]["content"].strip()
+
+def _generate_answer(query: str, context: str, response_mode: str = "detailed", sources: list = None,
+                     web_fallback: bool = True):
+    """Blocking wrapper around _generate_answer_async. Returns (answer, whether the web fallback answered)."""
+    return run_sync(_generate_answer_async(query, context, response_mode, sources, web_fallback))
+
+async def _generate_answer_async(query: str, context: str, response_mode: str = "detailed", sources: list = None,
+                                 web_fallback: bool = True):
+    """
+    Generate grounded, healthcare-focused answers using Groq API (LLaMA 3.3 70B).
+    Features:
+      - Strict healthcare-only domain filtering
+      - Automatic web search fallback if context is insufficient
+      - Clear, structured, medically factual responses
+    Returns (answer, whether the web fallback answered).
+    """
+    headers, payload, full_prompt = _build_request(query, context, response_mode, sources)
+    web_used = False
+
+    # PRIMARY REQUEST (RAG Context)
+    try:
+        answer = await _post_chat(headers, payload)
 
         # FALLBACK: WEB SEARCH IF CONTEXT TOO WEAK
-        insufficient_phrases = [
-            "i don’t have enough medical information",
-            "i don't have enough medical information",
-            "insufficient context",
-            "not enough information",
-        ]
-
-        if any(phrase in answer.lower() for phrase in insufficient_phrases):
-            web_context = google_search(query)
+        if web_fallback and is_insufficient(answer):
+            llm_web_fallbacks.inc()
+            web_context = fit_web_context(await google_search_async(query), context, response_mode)
             if web_context and web_context.strip():
-                combined_prompt = f"{full_prompt}\n\n### Additional Web Search Results:\n{web_context}"
-                payload["messages"][1]["content"] = combined_prompt
-
                 try:
-                    response = requests.post(GROQ_API_URL, headers=headers, json=payload, timeout=120)
-                    response.raise_for_status()
-                    data = response.json()
-                    answer = data["choices"][0]["message"]["content"].strip()
+                    answer = await _post_chat(headers, _with_web_results(payload, full_prompt, web_context),
+                                              "llm_second")
                     sources = (sources or []) + ["Google Search"]
+                    web_used = True
                 except Exception:
                     answer += "\n\n⚠️ Web search data could not be processed."
 
-        return answer
+        return answer, web_used
+
+    except httpx.HTTPError:
+        llm_errors.inc()
+        return "⚠️ Network or API request failed while generating the response.", web_used
+
+    except (KeyError, IndexError, json.JSONDecodeError):
+        llm_errors.inc()
+        return "⚠️ Received an invalid response from the model.", web_used
+
+async def _stream_completion(headers: dict, payload: dict, stage: str = "llm_first"):
+    """
+    Yield content tokens from an OpenAI-compatible SSE chat completion stream.
+    Token counts come from the usage block Groq sends with the last chunk;
+    without one, each content delta is counted as one completion token.
+    """
+    body = dict(payload, stream=True)
+    llm_requests.inc()
+    start, deltas, usage = time.perf_counter(), 0, None
+    with span(stage, model=payload["model"], stream=True):
+        async for line in stream_lines("POST", GROQ_API_URL, timeout=LLM_TIMEOUT, headers=headers, json=body):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            usage = chunk.get("usage") or chunk.get("x_groq", {}).get("usage") or usage
+            if not chunk.get("choices"):
+                continue
+            token = chunk["choices"][0].get("delta", {}).get("content")
+            if token:
+                if not deltas:
+                    first_token.observe(time.perf_counter() - start)
+                deltas += 1
+                yield token
+    _record_usage(usage or {"completion_tokens": deltas})
+
+def generate_answer_stream(query: str, context: str, response_mode: str = "detailed", sources: list = None,
+                           chunk_ids: list = None, web_fallback: bool = True, web_in_context: bool = False):
+    """
+    Streaming variant of generate_answer: yields answer text as tokens arrive.
+    The first STREAM_FALLBACK_WINDOW characters are held back so an
+    "insufficient information" reply can be swapped for a web-grounded answer
+    before anything is shown. If the phrase only appears later, the web-grounded
+    answer is appended as a follow-up section. With web_fallback=False nothing
+    is held back.
+    """
+    if ANSWER_CACHE_ENABLED:
+        cached, query_vector, generation = _cache_lookup(query, context, response_mode, chunk_ids, web_in_context)
+        if cached is not None:
+            yield cached
+            return
+
+    start = time.perf_counter()
+    parts, outcome = [], {}
+    for token in iter_sync(_stream_answer(query, context, response_mode, sources, web_fallback, outcome)):
+        parts.append(token)
+        yield token
+
+    if ANSWER_CACHE_ENABLED:
+        _cache_store(query_vector, chunk_ids, context, response_mode, "".join(parts).strip(), start, generation,
+                     web_in_context, outcome.get("web_used", False))
+
+async def generate_answer_stream_async(query: str, context: str, response_mode: str = "detailed",
+                                       sources: list = None, chunk_ids: list = None, web_fallback: bool = True,
+                                       web_in_context: bool = False):
+    """Async variant of generate_answer_stream."""
+    if ANSWER_CACHE_ENABLED:
+        cached, query_vector, generation = await asyncio.to_thread(_cache_lookup, query, context, response_mode,
+                                                                   chunk_ids, web_in_context)
+        if cached is not None:
+            yield cached
+            return
+
+    start = time.perf_counter()
+    parts, outcome = [], {}
+    async for token in _stream_answer(query, context, response_mode, sources, web_fallback, outcome):
+        parts.append(token)
+        yield token
+
+    if ANSWER_CACHE_ENABLED:
+        _cache_store(query_vector, chunk_ids, context, response_mode, "".join(parts).strip(), start, generation,
+                     web_in_context, outcome.get("web_used", False))
+
+async def _stream_answer(query: str, context: str, response_mode: str = "detailed", sources: list = None,
+                         web_fallback: bool = True, outcome: dict = None):
+    """Answer tokens; sets outcome["web_used"] when the web fallback answered."""
+    headers, payload, full_prompt = _build_request(query, context, response_mode, sources)
+    parts, buffered, flushed = [], "", not web_fallback
+    outcome = {} if outcome is None else outcome
+
+    async def web_answer():
+        llm_web_fallbacks.inc()
+        web_context = fit_web_context(await google_search_async(query), context, response_mode)
+        if web_context and web_context.strip():
+            outcome["web_used"] = True
+            async for token in _stream_completion(headers, _with_web_results(payload, full_prompt, web_context),
+                                                  "llm_second"):
+                yield token
+
+    try:
+        async for token in _stream_completion(headers, payload):
+            if flushed:
+                parts.append(token)
+                yield token
+                continue
+            buffered += token
+            if len(buffered) >= STREAM_FALLBACK_WINDOW and not is_insufficient(buffered):
+                flushed = True
+                parts.append(buffered)
+                yield buffered
 
-    except requests.exceptions.RequestException:
-        return "⚠️ Network or API request failed while generating the response."
+        if not flushed:
+            if is_insufficient(buffered):
+                fallback = False
+                async for token in web_answer():
+                    fallback = True
+                    yield token
+                if fallback:
+                    buffered = ""
+            if buffered:
+                yield buffered
+        elif web_fallback and is_insufficient("".join(parts)):
+            note = "\n\n**Additional information from web search:**\n\n"
+            first = True
+            async for token in web_answer():
+                if first:
+                    yield note
+                    first = False
+                yield token
 
+    except httpx.HTTPError:
+        llm_errors.inc()
+        yield "⚠️ Network or API request failed while generating the response."
     except (KeyError, IndexError, json.JSONDecodeError):
-        return "⚠️ Received an invalid response from the model."
+        llm_errors.inc()
+        yield "⚠️ Received an invalid response from the model."
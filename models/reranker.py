@@ -0,0 +1,99 @@
+import os
+import hashlib
+import threading
+import numpy as np
+from utils.cache import TTLCache, make_key
+from utils.metrics import histogram, SIZE_BUCKETS
+from utils.tracing import span
+from config.config import (
+    RERANK_MODEL,
+    RERANK_DEVICE,
+    RERANK_BATCH_SIZE,
+    RERANK_CACHE_SIZE,
+    RERANK_SKIP_DISTANCE,
+    RERANK_SKIP_MARGIN,
+    QUERY_CACHE_TTL,
+    QUERY_CACHE_BACKEND,
+    CACHE_DIR
+)
+
+# Optional second retrieval stage: a small cross-encoder scores (query, chunk)
+# pairs from an over-fetched candidate list, and the best k are kept. Scores
+# are cached per (model, query, chunk text), so repeated and overlapping
+# queries only score new pairs. The model is loaded on first use.
+
+_model = None
+_model_lock = threading.Lock()
+
+score_cache = TTLCache("rerank_scores", RERANK_CACHE_SIZE, QUERY_CACHE_TTL,
+                       os.path.join(CACHE_DIR, "rerank.sqlite") if QUERY_CACHE_BACKEND == "disk" else None)
+
+# Scoring time is recorded by the "rerank" span as rerank_seconds
+rerank_pairs = histogram("rerank_pairs_scored", "Uncached pairs scored per query", SIZE_BUCKETS + (512,))
+
+_stats_lock = threading.Lock()
+_stats = {"reranked": 0, "skipped": 0, "pairs": 0, "cached_pairs": 0}
+
+
+def get_reranker():
+    """Return the shared cross-encoder, loading it on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import CrossEncoder
+                print(f"Loading reranker: {RERANK_MODEL} (device={RERANK_DEVICE or 'auto'})")
+                kwargs = {"device": RERANK_DEVICE} if RERANK_DEVICE else {}
+                _model = CrossEncoder(RERANK_MODEL, **kwargs)
+    return _model
+
+
+def is_decisive(distances) -> bool:
+    """True when the dense top-1 is close and clearly ahead of the runner-up, so reranking can't help."""
+    if not distances:
+        return False
+    if distances[0] > RERANK_SKIP_DISTANCE:
+        return False
+    return len(distances) < 2 or distances[1] - distances[0] >= RERANK_SKIP_MARGIN
+
+
+def score(query: str, texts) -> np.ndarray:
+    """Cross-encoder relevance scores (higher is better) for each text, cached per pair."""
+    texts = list(texts)
+    if not texts:
+        return np.zeros(0, dtype="float32")
+    with span("rerank", pairs=len(texts)):
+        query = " ".join(query.lower().split())
+        keys = [make_key(RERANK_MODEL, query, hashlib.sha1(t.encode("utf-8")).hexdigest()) for t in texts]
+        scores = [score_cache.get(key) for key in keys]
+        missing = [i for i, s in enumerate(scores) if s is None]
+        if missing:
+            predicted = get_reranker().predict(
+                [(query, texts[i]) for i in missing],
+                batch_size=RERANK_BATCH_SIZE,
+                show_progress_bar=False
+            )
+            for i, value in zip(missing, predicted):
+                scores[i] = float(value)
+                score_cache.set(keys[i], scores[i])
+
+    rerank_pairs.observe(len(missing))
+    with _stats_lock:
+        _stats["reranked"] += 1
+        _stats["pairs"] += len(missing)
+        _stats["cached_pairs"] += len(texts) - len(missing)
+    return np.asarray(scores, dtype="float32")
+
+
+def record_skip():
+    with _stats_lock:
+        _stats["skipped"] += 1
+
+
+def rerank_stats() -> dict:
+    with _stats_lock:
+        report = dict(_stats)
+    total = report["reranked"] + report["skipped"]
+    report["skip_rate"] = round(report["skipped"] / total, 4) if total else 0.0
+    report["cache"] = score_cache.stats()
+    return report
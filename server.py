@@ -0,0 +1,178 @@
+import time
+import asyncio
+from contextlib import asynccontextmanager
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel
+from models.embedding_service import get_embedding_model
+from models.llm import generate_answer_async, generate_answer_stream_async
+from utils.rag_search import get_index, cache_stats
+from utils.sparse_index import get_sparse_index
+from utils.orchestrator import prepare_context_async, orchestrator_stats
+from utils.http_client import aclose
+from models.answer_cache import answer_cache
+from models.reranker import rerank_stats
+from utils.metrics import snapshot as metrics_snapshot, prometheus_text
+from utils.tracing import trace
+from config.config import (
+    TOP_K,
+    RETRIEVAL_MODE,
+    ENABLE_WEB_SEARCH,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_WORKERS,
+    SERVER_MAX_INFLIGHT,
+    SERVER_QUEUE_TIMEOUT
+)
+
+# Headless QA API, independent of Streamlit's rerun model:
+#   POST /retrieve        -> context, sources and chunk IDs
+#   POST /answer          -> full answer
+#   POST /answer/stream   -> answer streamed as plain-text chunks
+#   GET  /metrics         -> histograms and counters in Prometheus text format
+# Each worker process loads the embedding model and FAISS index once at
+# startup. The chunk store and (with the default FAISS_MMAP) the index are
+# memory-mapped read-only, so workers share those pages through the OS page cache.
+# At most SERVER_MAX_INFLIGHT requests run per worker. Requests that can't get
+# a slot within SERVER_QUEUE_TIMEOUT get a 503 with Retry-After, so overload
+# sheds load instead of growing an unbounded queue.
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start = time.perf_counter()
+    # Sparse-only retrieval never embeds queries; anything else that needs the
+    # model (a per-request mode, the answer cache) loads it on first use
+    if RETRIEVAL_MODE != "sparse":
+        await asyncio.to_thread(get_embedding_model)
+    if RETRIEVAL_MODE != "dense":
+        await asyncio.to_thread(get_sparse_index)
+    await asyncio.to_thread(get_index)
+    print(f"Worker ready in {time.perf_counter() - start:.2f}s")
+    yield
+    await aclose()
+
+
+app = FastAPI(title="Healthcare RAG API", lifespan=lifespan)
+_slots = asyncio.Semaphore(SERVER_MAX_INFLIGHT)
+_inflight = 0
+
+
+class RetrieveRequest(BaseModel):
+    query: str
+    k: int = TOP_K
+    mode: str = RETRIEVAL_MODE
+    web: bool = ENABLE_WEB_SEARCH
+    response_mode: str = "concise"
+
+
+class AnswerRequest(RetrieveRequest):
+    pass
+
+
+async def _acquire_slot():
+    global _inflight
+    try:
+        await asyncio.wait_for(_slots.acquire(), SERVER_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
+    _inflight += 1
+
+
+def _release_slot():
+    global _inflight
+    _inflight -= 1
+    _slots.release()
+
+
+def _no_context():
+    return "No relevant information found. Please rephrase your question."
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "index_loaded": get_index() is not None}
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "inflight": _inflight,
+        "caches": cache_stats(),
+        "answer_cache": answer_cache.stats(),
+        "orchestrator": orchestrator_stats(),
+        "reranker": rerank_stats(),
+        "metrics": metrics_snapshot()
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/retrieve")
+async def retrieve(request: RetrieveRequest):
+    await _acquire_slot()
+    try:
+        return await prepare_context_async(request.query, request.k, mode=request.mode, web_enabled=request.web,
+                                           response_mode=request.response_mode)
+    finally:
+        _release_slot()
+
+
+@app.post("/answer")
+async def answer(request: AnswerRequest):
+    await _acquire_slot()
+    try:
+        with trace("answer") as turn:
+            prepared = await prepare_context_async(request.query, request.k, mode=request.mode,
+                                                   web_enabled=request.web, response_mode=request.response_mode)
+            start = time.perf_counter()
+            if prepared["context"].strip():
+                text = await generate_answer_async(request.query, prepared["context"],
+                                                   response_mode=request.response_mode,
+                                                   sources=prepared["sources"], chunk_ids=prepared["chunk_ids"],
+                                                   web_fallback=request.web and not prepared["web_used"],
+                                                   web_in_context=prepared["web_used"])
+            else:
+                text = _no_context()
+        timings = dict(prepared["timings"], llm=time.perf_counter() - start, stages=turn.stages())
+        return {"answer": text, "sources": prepared["sources"], "chunk_ids": prepared["chunk_ids"],
+                "source_used": prepared["source_used"], "timings": timings}
+    finally:
+        _release_slot()
+
+
+@app.post("/answer/stream")
+async def answer_stream(request: AnswerRequest):
+    await _acquire_slot()
+    try:
+        prepared = await prepare_context_async(request.query, request.k, mode=request.mode,
+                                               web_enabled=request.web, response_mode=request.response_mode)
+    except BaseException:
+        _release_slot()
+        raise
+
+    async def body():
+        # The slot is held until the stream finishes or the client disconnects
+        try:
+            if not prepared["context"].strip():
+                yield _no_context()
+                return
+            async for token in generate_answer_stream_async(
+                request.query, prepared["context"], response_mode=request.response_mode,
+                sources=prepared["sources"], chunk_ids=prepared["chunk_ids"],
+                web_fallback=request.web and not prepared["web_used"],
+                web_in_context=prepared["web_used"]
+            ):
+                yield token
+        finally:
+            _release_slot()
+
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8")
+
+
+if __name__ == "__main__":
+    uvicorn.run("server:app", host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS)
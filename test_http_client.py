@@ -0,0 +1,41 @@
+import time
+import asyncio
+from utils.mock_servers import MockServer
+from utils.http_client import request, stream_lines, run_sync, iter_sync, DeadlineExceeded
+
+# Exercises the pooled HTTP client against the local mock servers:
+# concurrency, retries on injected 503s, deadlines and SSE streaming.
+
+mock = MockServer(llm_delay=0.2, token_delay=0.001).start()
+payload = {"messages": [{"role": "user", "content": "### User Question:\nWhat is anemia?\n###"}]}
+
+
+async def concurrent(n):
+    return await asyncio.gather(*[request("POST", mock.chat_url, json=payload) for _ in range(n)])
+
+start = time.perf_counter()
+responses = run_sync(concurrent(8))
+print(f"8 concurrent calls: {time.perf_counter() - start:.2f}s, statuses={[r.status_code for r in responses]}")
+
+mock.fail_next = 2
+response = run_sync(request("POST", mock.chat_url, json=payload))
+print(f"After 2 injected 503s: status={response.status_code}")
+assert response.status_code == 200
+
+mock.llm_delay = 1.0
+try:
+    run_sync(request("POST", mock.chat_url, timeout=0.3, json=payload))
+    raise AssertionError("Deadline not enforced: a 1s response returned within a 0.3s timeout")
+except DeadlineExceeded as e:
+    print(f"Deadline enforced: {e}")
+mock.llm_delay = 0.0
+
+stream_payload = dict(payload, stream=True)
+lines = list(iter_sync(stream_lines("POST", mock.chat_url, json=stream_payload)))
+events = [line for line in lines if line.startswith("data:")]
+expected = len(mock.responder(stream_payload).split(" ")) + 1   # one per token, plus [DONE]
+print(f"Streamed {len(events)} SSE events")
+assert len(events) == expected, f"expected {expected} SSE events, got {len(events)}"
+assert events[-1].strip() == "data: [DONE]"
+
+mock.stop()
@@ -1,4 +1,6 @@
-
+import os
 from utils.pdf_parser import extract_text_from_pdf
-text = extract_text_from_pdf("C:\\Users\\niket\\Downloads\\NeoStats AI Engineer Use Case\\NeoStats AI Engineer Use Case\\healthcare_rag_chatbot\\data\\raw_pdfs\\01 - Healthy Diet and Nutrition.pdf")
+from config.config import RAW_PDF_DIR
+
+text = extract_text_from_pdf(os.path.join(RAW_PDF_DIR, "01 - Healthy Diet and Nutrition.pdf"))
 print(text[:500])
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+from utils.rag_search import get_relevant_contexts
+from utils.web_search import google_search_async
+from utils.orchestrator import context_is_weak
+from utils.context_builder import context_budget, fit_web_context
+from utils.http_client import aclose
+from models.llm import generate_answer_async
+from config.config import (
+    TOP_K,
+    RETRIEVAL_MODE,
+    ENABLE_WEB_SEARCH,
+    BATCH_QA_SIZE,
+    BATCH_QA_CONCURRENCY,
+    CONTEXT_BUILDER_ENABLED
+)
+
+# Batch question answering over the RAG pipeline, for nightly regression runs
+# and cache pre-warming. Queries are retrieved BATCH_QA_SIZE at a time (one
+# embedding batch and one FAISS search per batch). LLM calls are fanned out
+# with at most BATCH_QA_CONCURRENCY in flight, and the next batch is retrieved
+# while they run. Results stream to JSONL in completion order.
+
+QUERY_FIELDS = ("query", "question", "body", "title")
+ID_FIELDS = ("id", "request_id", "query_id")
+
+
+def iter_queries(input_path: str, field: str = None):
+    """Yield (id, query) from a JSONL file; plain-text lines are taken as queries."""
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = line
+            if not isinstance(record, dict):
+                yield line_no, str(record)
+                continue
+            fields = (field,) if field else QUERY_FIELDS
+            query = next((record[name] for name in fields if record.get(name)), None)
+            if query is None:
+                print(f"[Error] Line {line_no} has no query field, skipping.")
+                continue
+            item_id = next((record[name] for name in ID_FIELDS if name in record), line_no)
+            yield item_id, query
+
+
+def _batched(items, size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _answer_one(item_id, query: str, retrieved, retrieval_time: float, limit: asyncio.Semaphore,
+                      response_mode: str, web: bool) -> dict:
+    context, sources, chunk_ids = retrieved
+    created = time.perf_counter()
+    async with limit:
+        started = time.perf_counter()
+        web_used = False
+        search_time = 0.0
+        if web and context_is_weak(context):
+            web_context = fit_web_context(await google_search_async(query), context, response_mode)
+            search_time = time.perf_counter() - started
+            if web_context.strip():
+                context = f"{context}\n\n{web_context}" if context.strip() else web_context
+                sources = sources + ["Google Search"]
+                web_used = True
+
+        if context.strip():
+            answer = await generate_answer_async(query, context, response_mode=response_mode, sources=sources,
+                                                 chunk_ids=chunk_ids, web_fallback=web and not web_used,
+                                                 web_in_context=web_used)
+        else:
+            answer = "No relevant information found. Please rephrase your question."
+        finished = time.perf_counter()
+
+    return {
+        "id": item_id,
+        "query": query,
+        "answer": answer,
+        "sources": sources,
+        "chunk_ids": chunk_ids,
+        "web_used": web_used,
+        "error": answer.startswith("⚠️"),
+        "timings": {
+            "retrieval": round(retrieval_time, 4),
+            "queued": round(started - created, 4),
+            "search": round(search_time, 4),
+            "llm": round(finished - started - search_time, 4),
+            "total": round(finished - created + retrieval_time, 4)
+        }
+    }
+
+
+async def run_batch_async(input_path: str, output_path: str, k: int = TOP_K, mode: str = RETRIEVAL_MODE,
+                          response_mode: str = "concise", concurrency: int = BATCH_QA_CONCURRENCY,
+                          batch_size: int = BATCH_QA_SIZE, web: bool = ENABLE_WEB_SEARCH, field: str = None) -> dict:
+    """Answer every query in input_path, writing one JSON result per line to output_path."""
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    limit = asyncio.Semaphore(concurrency)
+    budget = context_budget(response_mode) if CONTEXT_BUILDER_ENABLED else None
+    pending = set()
+    totals = {"answered": 0, "errors": 0, "web": 0, "retrieval": 0.0, "llm": 0.0}
+    start = time.perf_counter()
+
+    def write(done, out):
+        for task in done:
+            record = task.result()
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            totals["answered"] += 1
+            totals["errors"] += record["error"]
+            totals["web"] += record["web_used"]
+            totals["llm"] += record["timings"]["llm"]
+        out.flush()
+
+    try:
+        with open(output_path, "w", encoding="utf-8") as out:
+            for batch in _batched(iter_queries(input_path, field), batch_size):
+                batch_start = time.perf_counter()
+                retrieved = await asyncio.to_thread(get_relevant_contexts, [q for _, q in batch], k, mode, budget)
+                batch_time = time.perf_counter() - batch_start
+                totals["retrieval"] += batch_time
+                per_item = batch_time / len(batch)
+
+                for (item_id, query), result in zip(batch, retrieved):
+                    pending.add(asyncio.create_task(
+                        _answer_one(item_id, query, result, per_item, limit, response_mode, web)
+                    ))
+
+                # Backpressure: retrieve at most one batch ahead of the LLM calls
+                while len(pending) > max(concurrency, batch_size):
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    write(done, out)
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                write(done, out)
+    finally:
+        for task in pending:
+            task.cancel()
+        await aclose()
+
+    wall = time.perf_counter() - start
+    n = totals["answered"]
+    return {
+        "answered": n,
+        "errors": totals["errors"],
+        "web_used": totals["web"],
+        "wall_seconds": round(wall, 3),
+        "queries_per_second": round(n / wall, 3) if wall else 0.0,
+        "retrieval_seconds": round(totals["retrieval"], 3),
+        "mean_llm_seconds": round(totals["llm"] / n, 4) if n else 0.0,
+        "concurrency": concurrency
+    }
+
+
+def run_batch(input_path: str, output_path: str, **kwargs) -> dict:
+    """Blocking entry point for run_batch_async."""
+    return asyncio.run(run_batch_async(input_path, output_path, **kwargs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of queries through the RAG pipeline.")
+    parser.add_argument("input", help="JSONL with one query per line (query/question/body/title field)")
+    parser.add_argument("--out", default="data/batch_results.jsonl")
+    parser.add_argument("--field", default=None, help="JSON field holding the query text")
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--mode", default=RETRIEVAL_MODE, choices=["dense", "sparse", "hybrid"])
+    parser.add_argument("--response-mode", default="concise", choices=["concise", "detailed"])
+    parser.add_argument("--concurrency", type=int, default=BATCH_QA_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=BATCH_QA_SIZE)
+    parser.add_argument("--no-web", action="store_true", help="never fall back to web search")
+    args = parser.parse_args()
+
+    summary = run_batch(args.input, args.out, k=args.k, mode=args.mode, response_mode=args.response_mode,
+                        concurrency=args.concurrency, batch_size=args.batch_size,
+                        web=ENABLE_WEB_SEARCH and not args.no_web, field=args.field)
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,135 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from utils.metrics import counter
+
+
+def make_key(*parts) -> str:
+    """Stable string key for arbitrary (repr-able) parts."""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+class _DiskBackend:
+    """SQLite-backed store so warm entries survive process restarts."""
+
+    def __init__(self, path: str, max_entries: int):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL, used REAL)"
+        )
+        self._writes = 0
+        self.prune()
+
+    def get(self, key):
+        row = self._conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires < time.time():
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+            return None
+        return pickle.loads(value), expires
+
+    def set(self, key, value, expires):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires, used) VALUES (?, ?, ?, ?)",
+            (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires, time.time())
+        )
+        self._conn.commit()
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.prune()
+
+    def prune(self):
+        """Drop expired entries and trim to max_entries, least recently written first."""
+        self._conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+        self._conn.execute(
+            "DELETE FROM cache WHERE key NOT IN (SELECT key FROM cache ORDER BY used DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+        self._conn.commit()
+
+    def clear(self):
+        self._conn.execute("DELETE FROM cache")
+        self._conn.commit()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL and hit/miss/eviction counters.
+    With `disk_path`, entries are written through to SQLite and memory misses
+    fall back to disk, so a restarted process starts warm.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: float, disk_path: str = None):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = _DiskBackend(disk_path, max_size * 10) if disk_path else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        for field in ("hits", "misses", "evictions"):
+            counter(f"cache_{name}_{field}_total", f"{name} cache {field}", lambda f=field: getattr(self, f))
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires >= now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+
+            if self._disk is not None:
+                stored = self._disk.get(key)
+                if stored is not None:
+                    self._insert(key, *stored)
+                    self.hits += 1
+                    return stored[0]
+
+            self.misses += 1
+            return default
+
+    def _insert(self, key, value, expires):
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._insert(key, value, expires)
+            if self._disk is not None:
+                self._disk.set(key, value, expires)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            if self._disk is not None:
+                self._disk.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,150 @@
+import os
+import json
+import mmap
+import threading
+import numpy as np
+from config.config import CHUNKS_PATH
+
+
+def file_generation(path: str):
+    """(inode, mtime, size) of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class ChunkStore:
+    """
+    Memory-mapped, offset-indexed view over a chunk JSONL file.
+    Row N is fetched in O(1) by slicing the mapped file at its line offset,
+    so only the rows FAISS returns are ever JSON-parsed.
+    The store reloads itself when the file's generation (mtime/size/inode) changes.
+    """
+
+    def __init__(self, path: str = CHUNKS_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._file = None
+        self._mm = None
+        self._starts = np.zeros(0, dtype=np.int64)
+        self._ends = np.zeros(0, dtype=np.int64)
+        self._generation = None
+
+    def _close(self):
+        if self._mm is not None:
+            self._mm.close()
+        if self._file is not None:
+            self._file.close()
+        self._mm, self._file = None, None
+
+    def _load(self, generation):
+        """Map the file and index the start/end offset of every line."""
+        self._close()
+        self._starts = np.zeros(0, dtype=np.int64)
+        self._ends = np.zeros(0, dtype=np.int64)
+        self._generation = generation
+
+        if generation is None or generation[2] == 0:
+            return
+
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Newline scan is a single vectorized pass — no JSON parsing at load time
+        buf = np.frombuffer(self._mm, dtype=np.uint8)
+        newlines = np.flatnonzero(buf == 10).astype(np.int64)
+        del buf
+        size = len(self._mm)
+        ends = newlines if size and self._mm[size - 1] == 10 else np.append(newlines, size)
+        starts = np.concatenate(([0], newlines[:len(ends) - 1] + 1)).astype(np.int64)
+
+        # Skip blank lines so row numbers match what the index builder saw
+        keep = ends > starts
+        self._starts, self._ends = starts[keep], ends[keep]
+
+    def refresh(self) -> bool:
+        """Reload if the underlying file changed. Returns True when a reload happened."""
+        generation = file_generation(self.path)
+        with self._lock:
+            if generation == self._generation:
+                return False
+            self._load(generation)
+            return True
+
+    @property
+    def generation(self):
+        self.refresh()
+        return self._generation
+
+    def __len__(self):
+        self.refresh()
+        return len(self._starts)
+
+    def get(self, row: int) -> dict:
+        """Return the chunk record stored on line `row`."""
+        self.refresh()
+        with self._lock:
+            if row < 0 or row >= len(self._starts):
+                raise IndexError(f"Chunk row {row} out of range ({len(self._starts)} rows)")
+            raw = self._mm[int(self._starts[row]):int(self._ends[row])]
+        return json.loads(raw)
+
+    def get_many(self, rows) -> list:
+        """Return chunk records for several rows, skipping any that are out of range."""
+        self.refresh()
+        records = []
+        for row in rows:
+            try:
+                records.append(self.get(int(row)))
+            except IndexError:
+                continue
+        return records
+
+    def metadata(self, row: int) -> dict:
+        """Topic/section/filename for a row (replaces the old chunk_metadata.jsonl list)."""
+        obj = self.get(row)
+        return {
+            "topic": obj.get("topic_title", ""),
+            "section": obj.get("section", ""),
+            "filename": obj.get("filename", "")
+        }
+
+    def append(self, records) -> list:
+        """Append records to the end of the file and return their row numbers."""
+        with self._lock:
+            start = len(self)
+            needs_newline = False
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) != b"\n"
+
+            with open(self.path, "ab") as f:
+                if needs_newline:
+                    f.write(b"\n")
+                for record in records:
+                    f.write((json.dumps(record) + "\n").encode("utf-8"))
+
+            self.refresh()
+            return list(range(start, start + len(records)))
+
+    def close(self):
+        with self._lock:
+            self._close()
+            self._generation = None
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_chunk_store(path: str = CHUNKS_PATH) -> ChunkStore:
+    """Return the process-wide store for `path`, creating it on first use."""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = ChunkStore(path)
+            _stores[path] = store
+        return store
@@ -1,76 +1,275 @@
-import json
 import os
 import re
+import json
+import bisect
+import operator
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict
 
-# Try fallback import for LangChain versions
-try:
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
-except ImportError:
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
+from config.config import CHUNK_SIZE, CHUNK_OVERLAP, CHUNKER, CHUNK_WORKERS, PDF_TEXTS_PATH, CHUNKS_PATH
 
-from config.config import CHUNK_SIZE, CHUNK_OVERLAP
+# Fields every chunk carries; the index bundle stores them once
+CHUNK_DEFAULTS = {"sources": ["WHO", "CDC", "ICMR"], "published_year": 2024, "region": ["Global"]}
 
+_MD_HEADING = re.compile(r"#{1,6}\s+(.+)")
+# Heading lines: markdown, or short capitalised (optionally numbered) lines without end punctuation
+_HEADING_LINE = re.compile(r"[ \t]*(#{1,6}[ \t]+\S.*|(?:\d+(?:\.\d+)*\.?[ \t]+)?[A-Z].{0,58}[^.,;:!?)\s])[ \t]*")
+# Sentence ends, line breaks after a colon or a [Source]/(Source) note, and before
+# list bullets. The leading lookahead lets the regex engine skip to candidate characters.
+_SENTENCE_END = re.compile(r"(?=[.!?:\])\n])(?:([.!?])\s+|([:\])])\n\s*|\n(?=[●•▪◦*–-]\s))")
+
+
+def _headings(text: str):
+    """
+    Yield (start, end, title) for heading lines. A non-markdown candidate
+    counts only with at most 8 words and when it follows a sentence end, a
+    source note, another heading or the start of the text.
+    """
+    pos, after_break = 0, True
+    for line in text.split("\n"):
+        n = len(line)
+        if (after_break and n <= 70) or "#" in line:
+            m = _HEADING_LINE.fullmatch(line)
+            if m is not None:
+                title = m.group(1)
+                if title[0] == "#":
+                    yield pos + m.start(1), pos + m.end(1), _MD_HEADING.match(title).group(1).strip()
+                    after_break = True
+                elif after_break and len(title.split()) <= 8:
+                    yield pos + m.start(1), pos + m.end(1), title
+                    after_break = True
+                else:
+                    after_break = False
+                pos += n + 1
+                continue
+        tail = line.rstrip()
+        if tail:
+            after_break = tail[-1] in ".!?])"
+        pos += n + 1
+
+
+def _strip(text: str, start: int, end: int) -> tuple:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _cut(text: str, start: int, end: int, chunk_size: int) -> list:
+    """Split an over-long unit at the last whitespace before each chunk_size boundary."""
+    pieces = []
+    while end - start > chunk_size:
+        cut = max(text.rfind(" ", start, start + chunk_size), text.rfind("\n", start, start + chunk_size))
+        cut = cut if cut > start else start + chunk_size
+        pieces.append((start, cut))
+        start, _ = _strip(text, cut, end)
+    if end > start:
+        pieces.append((start, end))
+    return pieces
+
+
+def _sections(text: str) -> list:
+    """(title, heading span or None, body start, body end) for the text before the first heading and each heading."""
+    sections = []
+    title, heading, body_start = None, None, 0
+    for start, end, next_title in _headings(text):
+        sections.append((title, heading) + _strip(text, body_start, start))
+        title, heading, body_start = next_title, (start, end), end
+    sections.append((title, heading) + _strip(text, body_start, len(text)))
+    return [s for s in sections if s[1] is not None or s[3] > s[2]]
+
+
+def _pack(text: str, group: list, chunk_size: int, overlap: int) -> list:
+    """Greedily pack the units (headings and body sentences) of a run of sections into chunks."""
+    group_start = group[0][1][0] if group[0][1] is not None else group[0][2]
+    group_end = group[-1][3] if group[-1][3] > group[-1][2] else group[-1][1][1]
+    if group_end - group_start <= chunk_size:
+        # Most sections fit in one chunk and never need splitting into sentences
+        title = next((t for t, _, body_start, body_end in group if body_end > body_start), group[-1][0])
+        return [(group_start, group_end, title or "General")]
+
+    starts, ends, titles, headings = [], [], [], []
+    for title, heading, body_start, body_end in group:
+        if heading is not None:
+            starts.append(heading[0])
+            ends.append(heading[1])
+            titles.append(title)
+            headings.append(True)
+        if body_end <= body_start:
+            continue
+        marks = [(m.end(1) if m.start(1) >= 0 else m.end(2) if m.start(2) >= 0 else m.start(), m.end())
+                 for m in _SENTENCE_END.finditer(text, body_start, body_end)]
+        unit_starts = [body_start] + [after for _, after in marks]
+        unit_ends = [before for before, _ in marks] + [body_end]
+        if max(map(operator.sub, unit_ends, unit_starts)) > chunk_size:
+            pieces = [p for s, e in zip(unit_starts, unit_ends) for p in _cut(text, s, e, chunk_size)]
+            unit_starts, unit_ends = [s for s, _ in pieces], [e for _, e in pieces]
+        starts.extend(unit_starts)
+        ends.extend(unit_ends)
+        titles.extend([title] * len(unit_starts))
+        headings.extend([False] * len(unit_starts))
+
+    spans, i, n = [], 0, len(starts)
+    while i < n:
+        # Last unit that still fits, leaving trailing headings for the next chunk
+        j = max(i, bisect.bisect_right(ends, starts[i] + chunk_size, i, n) - 1)
+        while j > i and headings[j]:
+            j -= 1
+        first_body = next((u for u in range(i, j + 1) if not headings[u]), j)
+        spans.append((starts[i], ends[j], titles[first_body] or "General"))
+        if j + 1 >= n:
+            break
+        # Repeat whole trailing units of at most `overlap` chars, as long as the next unit still fits
+        k = bisect.bisect_left(starts, ends[j] - overlap, i + 1, j + 1)
+        i = max(k, bisect.bisect_left(starts, ends[j + 1] - chunk_size, i + 1, j + 1))
+    return spans
+
+
+def split_spans(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[tuple]:
+    """
+    Native chunker. Returns (start, end, section) character offsets into
+    `text` for chunks of at most chunk_size characters, in one pass:
+    headings are found with one regex scan, bodies are split into sentences
+    and list items (which may cross PDF line wraps), and units are packed
+    greedily with binary search over their offsets. Each section starts a
+    new chunk once the previous one holds a quarter of chunk_size; within a
+    section, consecutive chunks repeat up to `overlap` characters of whole
+    trailing sentences.
+    """
+    spans, group = [], []
+    min_size = chunk_size // 4
+    for section in _sections(text):
+        group.append(section)
+        group_start = group[0][1][0] if group[0][1] is not None else group[0][2]
+        section_end = section[3] if section[3] > section[2] else section[1][1]
+        if section_end - group_start >= min_size:
+            spans.extend(_pack(text, group, chunk_size, overlap))
+            group = []
+    if group:
+        spans.extend(_pack(text, group, chunk_size, overlap))
+    return spans
+
+
+def _langchain_chunks(text: str) -> List[tuple]:
+    """(chunk text, section) pairs from LangChain's RecursiveCharacterTextSplitter (CHUNKER=langchain)."""
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+    except ImportError:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-def chunk_text(text: str, filename: str = "uploaded_document") -> List[Dict]:
-    """Split text into overlapping chunks for RAG embedding."""
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
         separators=["\n##", "\n#", ".", "\n", " "]
     )
+    chunks = []
+    for chunk in splitter.split_text(text):
+        section_match = re.search(r"## (.*?)\n", chunk)
+        chunks.append((chunk.strip(), section_match.group(1).strip() if section_match else "General"))
+    return chunks
+
 
+def make_chunks(text: str, filename: str, spans: List[tuple]) -> List[Dict]:
+    """Chunk records for (start, end, section) spans of `text`."""
     topic = filename.replace(".pdf", "").replace("_", " ").strip().title()
-    chunks = []
+    return [
+        {
+            "filename": filename,
+            "topic_title": topic,
+            "section": section,
+            "chunk_id": i,
+            "start": start,
+            "end": end,
+            "text": text[start:end],
+            **CHUNK_DEFAULTS
+        }
+        for i, (start, end, section) in enumerate(spans)
+    ]
 
-    for i, chunk in enumerate(splitter.split_text(text)):
-        try:
-            section_match = re.search(r"## (.*?)\n", chunk)
-            section = section_match.group(1).strip() if section_match else "General"
-
-            chunks.append({
-                "filename": filename,
-                "topic_title": topic,
-                "section": section,
-                "chunk_id": i,
-                "text": chunk.strip(),
-                "sources": ["WHO", "CDC", "ICMR"],
-                "published_year": 2024,
-                "region": ["Global"]
-            })
-        except Exception as e:
-            print(f"[Warning] Skipped chunk {i} due to parsing error: {e}")
 
-    return chunks
+def chunk_text(text: str, filename: str = "uploaded_document", chunker: str = CHUNKER) -> List[Dict]:
+    """Split text into overlapping chunks for RAG embedding."""
+    if chunker == "native":
+        return make_chunks(text, filename, split_spans(text))
+
+    topic = filename.replace(".pdf", "").replace("_", " ").strip().title()
+    return [
+        {"filename": filename, "topic_title": topic, "section": section, "chunk_id": i, "text": chunk,
+         **CHUNK_DEFAULTS}
+        for i, (chunk, section) in enumerate(_langchain_chunks(text))
+    ]
+
+
+def iter_documents(input_path: str):
+    """Yield extracted documents from a JSONL file (streamed) or a legacy JSON array."""
+    with open(input_path, "r", encoding="utf-8") as f:
+        if input_path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
 
 
-def chunk_documents(input_json: str, output_json: str):
-    """Split all documents in input JSON and save as JSONL."""
+def iter_chunked(docs, workers: int = CHUNK_WORKERS):
+    """
+    Yield (doc, spans) in input order, splitting documents across a process
+    pool with at most 2x workers in flight. Workers return offsets only, so
+    chunk text is never pickled back.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for doc in docs:
+            yield doc, split_spans(doc.get("text", ""))
+        return
+
+    pending = deque()
+    docs = iter(docs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while len(pending) < workers * 2:
+                doc = next(docs, None)
+                if doc is None:
+                    break
+                pending.append((doc, pool.submit(split_spans, doc.get("text", ""))))
+            if not pending:
+                return
+            doc, future = pending.popleft()
+            yield doc, future.result()
+
+
+def chunk_documents(input_json: str, output_json: str, chunker: str = CHUNKER, workers: int = CHUNK_WORKERS):
+    """Split all documents in the extracted-text file and save as JSONL."""
     try:
         if not os.path.exists(input_json):
             print(f"[Error] Input file not found: {input_json}")
             return
 
-        with open(input_json, "r", encoding="utf-8") as f:
-            docs = json.load(f)
-
-        all_chunks = []
-        for doc in docs:
-            filename = doc.get("filename", "unknown.pdf")
-            text = doc.get("text", "")
-            if text.strip():
-                doc_chunks = chunk_text(text, filename)
-                all_chunks.extend(doc_chunks)
+        docs = (doc for doc in iter_documents(input_json) if doc.get("text", "").strip())
+        if chunker == "native":
+            chunked = ((doc, make_chunks(doc["text"], doc.get("filename", "unknown.pdf"), spans))
+                       for doc, spans in iter_chunked(docs, workers))
+        else:
+            chunked = ((doc, chunk_text(doc["text"], doc.get("filename", "unknown.pdf"), chunker)) for doc in docs)
 
-        with open(output_json, "w", encoding="utf-8") as f:
-            for chunk in all_chunks:
-                f.write(json.dumps(chunk) + "\n")
+        # Write to a temp file and swap it in, so readers holding a
+        # memory-mapped view of the old file never see a half-written one
+        tmp_path = output_json + ".tmp"
+        total = 0
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for _, chunks in chunked:
+                for chunk in chunks:
+                    f.write(json.dumps(chunk) + "\n")
+                    total += 1
+        os.replace(tmp_path, output_json)
 
-        print(f"Chunked {len(all_chunks)} text segments → {output_json}")
+        print(f"Chunked {total} text segments → {output_json}")
 
     except Exception as e:
         print(f"[Chunking Error] {e}")
 
 
 if __name__ == "__main__":
-    chunk_documents("data/pdf_texts.json", "data/processed_chunks.jsonl")
+    chunk_documents(PDF_TEXTS_PATH, CHUNKS_PATH)
@@ -0,0 +1,158 @@
+import re
+import numpy as np
+from models.embedding_service import get_embedding_model
+from utils.metrics import histogram
+from config.config import (
+    CONTEXT_BUILDER_ENABLED,
+    CONTEXT_BUDGET_CONCISE,
+    CONTEXT_BUDGET_DETAILED,
+    MMR_LAMBDA,
+    DEDUP_JACCARD,
+    CHUNK_OVERLAP
+)
+
+# Token-budgeted context assembly. Retrieved blocks (chunks, uploaded-report
+# chunks, web snippets) are de-duplicated (near-duplicate shingles and the
+# CHUNK_OVERLAP spans shared by neighbouring chunks), ordered by MMR using the
+# embeddings the indexes already store, and greedily packed into a token
+# budget that depends on the response mode. Tokens are counted with the
+# embedding model's tokenizer, which is already loaded for query embedding.
+
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+MIN_PARTIAL_TOKENS = 64      # smallest truncated block worth including
+
+tokens_in = histogram("context_tokens_in", "Context tokens before assembly", TOKEN_BUCKETS)
+tokens_out = histogram("context_tokens_out", "Context tokens after assembly", TOKEN_BUCKETS)
+tokens_saved = histogram("context_tokens_saved", "Context tokens removed per request", TOKEN_BUCKETS)
+
+
+def context_budget(response_mode: str = "detailed") -> int:
+    return CONTEXT_BUDGET_CONCISE if (response_mode or "").lower() == "concise" else CONTEXT_BUDGET_DETAILED
+
+
+def count_tokens(texts) -> list:
+    texts = list(texts)
+    if not texts:
+        return []
+    tokenizer = get_embedding_model().tokenizer
+    encoded = tokenizer(texts, add_special_tokens=False, truncation=False, verbose=False)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+def render(block: dict) -> str:
+    return f"{block['header']}\n{block['text']}\n" if block.get("header") else block["text"]
+
+
+def _shingles(text: str, n: int = 5) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+
+
+def _trim_overlap(kept: str, text: str, min_chars: int = 20) -> str:
+    """Drop a prefix of `text` that repeats the end of `kept`, or a suffix that repeats its start."""
+    limit = min(len(kept), len(text), CHUNK_OVERLAP * 2)
+    for size in range(limit, min_chars - 1, -1):
+        if kept.endswith(text[:size]):
+            return text[size:].lstrip()
+        if kept.startswith(text[-size:]):
+            return text[:-size].rstrip()
+    return text
+
+
+def dedupe(blocks: list) -> list:
+    """Remove near-duplicate blocks and overlapping spans; earlier (better-ranked) blocks win."""
+    kept = []
+    for block in blocks:
+        shingles = _shingles(block["text"])
+        if any(len(shingles & k["_shingles"]) / max(1, len(shingles | k["_shingles"])) >= DEDUP_JACCARD
+               for k in kept):
+            continue
+        text = block["text"]
+        for k in kept:
+            text = _trim_overlap(k["text"], text)
+        if not text.strip():
+            continue
+        kept.append(dict(block, text=text, _shingles=shingles))
+    for block in kept:
+        del block["_shingles"]
+    return kept
+
+
+def mmr_order(blocks: list, query_vector: np.ndarray = None, lam: float = MMR_LAMBDA) -> list:
+    """
+    Maximal marginal relevance over blocks that carry a normalized "vector";
+    blocks without one keep their relative order after them.
+    """
+    with_vectors = [b for b in blocks if b.get("vector") is not None]
+    others = [b for b in blocks if b.get("vector") is None]
+    if query_vector is None or len(with_vectors) < 2:
+        return with_vectors + others
+
+    vectors = np.stack([b["vector"] for b in with_vectors])
+    relevance = vectors @ query_vector
+    similarity = vectors @ vectors.T
+    selected, remaining = [], list(range(len(with_vectors)))
+    while remaining:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = lam * relevance[remaining] - (1 - lam) * redundancy
+        best = remaining[int(np.argmax(scores))]
+        selected.append(best)
+        remaining.remove(best)
+    return [with_vectors[i] for i in selected] + others
+
+
+def _truncate(block: dict, max_tokens: int):
+    """Shorten a block to whole sentences within max_tokens, or None."""
+    sentences = re.split(r"(?<=[.!?])\s+", block["text"])
+    while len(sentences) > 1:
+        sentences.pop()
+        candidate = dict(block, text=" ".join(sentences))
+        if count_tokens([render(candidate)])[0] <= max_tokens:
+            return candidate
+    return None
+
+
+def assemble(blocks: list, budget: int, query_vector: np.ndarray = None) -> tuple:
+    """
+    Dedupe, MMR-order and pack blocks into `budget` tokens.
+    Returns (kept blocks in order, tokens used). Token metrics are recorded.
+    """
+    if not blocks:
+        return [], 0
+    original = count_tokens([render(b) for b in blocks])
+    ordered = mmr_order(dedupe(blocks), query_vector)
+    sizes = count_tokens([render(b) for b in ordered])
+
+    packed, used = [], 0
+    for block, size in zip(ordered, sizes):
+        if used + size <= budget:
+            packed.append(block)
+            used += size
+        elif budget - used >= MIN_PARTIAL_TOKENS:
+            partial = _truncate(block, budget - used)
+            if partial is not None:
+                packed.append(partial)
+                used += count_tokens([render(partial)])[0]
+
+    total = sum(original)
+    tokens_in.observe(total)
+    tokens_out.observe(used)
+    tokens_saved.observe(total - used)
+    return packed, used
+
+
+def join_blocks(blocks: list) -> str:
+    return "\n\n".join(render(b) for b in blocks)
+
+
+def fit_web_context(web_context: str, context: str, response_mode: str = "detailed") -> str:
+    """Trim web snippets to whatever budget the RAG context left over."""
+    if not CONTEXT_BUILDER_ENABLED or not web_context.strip():
+        return web_context
+    used = count_tokens([context])[0] if context.strip() else 0
+    blocks = [{"text": snippet.strip()} for snippet in web_context.split("\n\n") if snippet.strip()]
+    packed, _ = assemble(blocks, max(0, context_budget(response_mode) - used))
+    return join_blocks(packed)
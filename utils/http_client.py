@@ -0,0 +1,193 @@
+import time
+import random
+import asyncio
+import threading
+import httpx
+from config.config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_CONCURRENCY,
+    HTTP_RETRIES,
+    HTTP_BACKOFF_BASE,
+    HTTP_BACKOFF_MAX
+)
+
+# Shared HTTP layer for the Groq and Google Search calls: one pooled
+# httpx.AsyncClient per event loop (keep-alive connections are reused across
+# calls), a per-host concurrency limit, jittered retries on 429/5xx and
+# connection errors, and a deadline covering the whole call.
+# Synchronous code runs coroutines on a background event-loop thread.
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """The call, including retries and backoff, ran past its deadline."""
+
+
+_pools = {}        # event loop -> httpx.AsyncClient
+_limits = {}       # (event loop, host) -> asyncio.Semaphore
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _get_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _pools.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+            timeout=None
+        )
+        _pools[loop] = client
+    return client
+
+
+def _get_limit(url: str) -> asyncio.Semaphore:
+    key = (asyncio.get_running_loop(), httpx.URL(url).host)
+    limit = _limits.get(key)
+    if limit is None:
+        limit = _limits[key] = asyncio.Semaphore(HTTP_CONCURRENCY)
+    return limit
+
+
+def _retryable(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+def _backoff(attempt: int, retry_after: str = None) -> float:
+    """Full-jitter exponential backoff; a numeric Retry-After header wins."""
+    if retry_after:
+        try:
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+
+def _remaining(deadline: float, what: str) -> float:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded(f"{what} exceeded its deadline")
+    return remaining
+
+
+async def _send(method: str, url: str, timeout: float, kwargs: dict) -> httpx.Response:
+    async with _get_limit(url):
+        return await _get_client().request(method, url, timeout=timeout, **kwargs)
+
+
+async def request(method: str, url: str, timeout: float = 30.0, retries: int = HTTP_RETRIES,
+                  **kwargs) -> httpx.Response:
+    """
+    Send a request through the shared pool. `timeout` is the deadline for the
+    whole call, retries included. Returns the last response once retries are
+    used up (callers still raise_for_status), or re-raises the last
+    connection error.
+    """
+    what = f"{method} {url}"
+    deadline = time.monotonic() + timeout
+    last = None
+
+    for attempt in range(retries + 1):
+        remaining = _remaining(deadline, what)
+        try:
+            last = await asyncio.wait_for(_send(method, url, remaining, kwargs), remaining)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"{what} exceeded its {timeout}s deadline")
+        except httpx.TransportError as e:
+            last = e
+            delay = _backoff(attempt)
+        else:
+            if not _retryable(last.status_code):
+                return last
+            delay = _backoff(attempt, last.headers.get("Retry-After"))
+
+        if attempt == retries or time.monotonic() + delay >= deadline:
+            break
+        await asyncio.sleep(delay)
+
+    if isinstance(last, httpx.TimeoutException) and time.monotonic() >= deadline:
+        raise DeadlineExceeded(f"{what} exceeded its {timeout}s deadline") from last
+    if isinstance(last, Exception):
+        raise last
+    return last
+
+
+async def stream_lines(method: str, url: str, timeout: float = 120.0, retries: int = HTTP_RETRIES, **kwargs):
+    """
+    Yield response lines as they arrive (e.g. SSE). Retries only happen before
+    the first line is yielded; the deadline covers the whole stream.
+    """
+    what = f"{method} {url}"
+    deadline = time.monotonic() + timeout
+    started = False
+
+    for attempt in range(retries + 1):
+        delay = None
+        async with _get_limit(url):
+            try:
+                async with _get_client().stream(method, url, timeout=_remaining(deadline, what),
+                                                **kwargs) as response:
+                    if _retryable(response.status_code) and attempt < retries:
+                        delay = _backoff(attempt, response.headers.get("Retry-After"))
+                    else:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            _remaining(deadline, what)
+                            started = True
+                            yield line
+                        return
+            except httpx.TransportError as e:
+                if isinstance(e, httpx.TimeoutException) and time.monotonic() >= deadline:
+                    raise DeadlineExceeded(f"{what} exceeded its {timeout}s deadline") from e
+                if started or attempt == retries:
+                    raise
+                delay = _backoff(attempt)
+
+        if time.monotonic() + delay >= deadline:
+            raise DeadlineExceeded(f"{what} exceeded its {timeout}s deadline")
+        await asyncio.sleep(delay)
+
+
+async def aclose():
+    """Close the pooled client bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _pools.pop(loop, None)
+    for key in [key for key in _limits if key[0] is loop]:
+        del _limits[key]
+    if client is not None:
+        await client.aclose()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="http-client", daemon=True).start()
+        return _loop
+
+
+def run_sync(coro):
+    """Run a coroutine on the shared background loop and block for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
+
+
+async def _anext(agen):
+    return await agen.__anext__()
+
+
+async def _aclose(agen):
+    await agen.aclose()
+
+
+def iter_sync(agen):
+    """Drive an async generator from synchronous code, one item at a time."""
+    try:
+        while True:
+            try:
+                yield run_sync(_anext(agen))
+            except StopAsyncIteration:
+                return
+    finally:
+        run_sync(_aclose(agen))
@@ -0,0 +1,287 @@
+import os
+import json
+import mmap
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+import numpy as np
+import faiss
+from utils.chunk_store import get_chunk_store, file_generation
+from config.config import (
+    CHUNKS_PATH,
+    FAISS_INDEX_PATH,
+    FULL_VECTORS_PATH,
+    INDEX_BUNDLE,
+    INDEX_BUNDLE_DIR,
+    INDEX_BUNDLE_VERIFY,
+    INDEX_BUNDLE_KEEP
+)
+
+# Versioned, read-only index bundle for serving. One directory per build:
+#   manifest.json   format version, row count, per-file sha256 and size, column dictionaries
+#   index.faiss     the FAISS index, memory-mapped read-only on load
+#   vectors.f32     full-precision rows for rescoring, when the index is compressed
+#   text.bin        every chunk's text back to back (UTF-8)
+#   offsets.npy     int64 byte offsets into text.bin (rows + 1 entries)
+#   col_<field>.npy dictionary codes for each metadata field (uint8/16/32), or
+#                   the values themselves for high-cardinality integer fields
+# Fields with a single value across the corpus (sources, published_year,
+# region) are kept only in the manifest. `CURRENT` names the live build and
+# is swapped atomically, so readers reload on its generation like the other
+# data files. Everything is mapped, not read, so startup is a manifest parse
+# and worker processes share the pages through the OS page cache.
+
+BUNDLE_FORMAT = "healthcare-rag-bundle"
+BUNDLE_VERSION = 1
+CURRENT_FILE = "CURRENT"
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _code_dtype(n_values: int):
+    if n_values <= 1 << 8:
+        return np.uint8
+    if n_values <= 1 << 16:
+        return np.uint16
+    return np.uint32
+
+
+class IndexBundle:
+    """Read-only, memory-mapped view of one bundle build; a drop-in for ChunkStore reads."""
+
+    def __init__(self, path: str, verify: bool = INDEX_BUNDLE_VERIFY):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != BUNDLE_FORMAT or self.manifest.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported bundle {self.manifest.get('format')} v{self.manifest.get('version')}")
+
+        # Sizes are checked on every load; full checksums only on request
+        bad = self.verify(checksums=verify)
+        if bad:
+            raise ValueError(f"Bundle {path} failed verification: {', '.join(bad)}")
+
+        self.rows = self.manifest["rows"]
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self._file = open(os.path.join(path, "text.bin"), "rb")
+        self._text = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if self.manifest["files"]["text.bin"]["bytes"] else b""
+        self.columns = {
+            field: (np.load(os.path.join(path, spec["file"]), mmap_mode="r"), spec.get("values"))
+            for field, spec in self.manifest["columns"].items()
+        }
+        self.constants = self.manifest["constants"]
+
+    @property
+    def index_path(self):
+        path = os.path.join(self.path, "index.faiss")
+        return path if "index.faiss" in self.manifest["files"] else None
+
+    @property
+    def vectors_path(self):
+        path = os.path.join(self.path, "vectors.f32")
+        return path if "vectors.f32" in self.manifest["files"] else None
+
+    def verify(self, checksums: bool = True) -> list:
+        """Names of files whose size (and, with checksums, sha256) don't match the manifest."""
+        bad = []
+        for name, entry in self.manifest["files"].items():
+            path = os.path.join(self.path, name)
+            if not os.path.exists(path) or os.path.getsize(path) != entry["bytes"]:
+                bad.append(name)
+            elif checksums and _sha256(path) != entry["sha256"]:
+                bad.append(name)
+        return bad
+
+    def read_index(self):
+        """The bundle's FAISS index, memory-mapped read-only when the index type allows it."""
+        try:
+            return faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            print(f"[Error] Could not memory-map {self.index_path} ({e}); loading it into memory instead.")
+            return faiss.read_index(self.index_path)
+
+    def __len__(self):
+        return self.rows
+
+    def text(self, row: int) -> str:
+        return self._text[int(self.offsets[row]):int(self.offsets[row + 1])].decode("utf-8")
+
+    def get(self, row: int) -> dict:
+        """Rebuild the chunk record for `row` from the text blob, columns and constants."""
+        if row < 0 or row >= self.rows:
+            raise IndexError(f"Chunk row {row} out of range ({self.rows} rows)")
+        record = dict(self.constants)
+        for field, (column, values) in self.columns.items():
+            value = int(column[row]) if values is None else values[int(column[row])]
+            if value is not None:
+                record[field] = value
+        record["text"] = self.text(row)
+        return record
+
+    def get_many(self, rows) -> list:
+        records = []
+        for row in rows:
+            try:
+                records.append(self.get(int(row)))
+            except IndexError:
+                continue
+        return records
+
+    def metadata(self, row: int) -> dict:
+        obj = self.get(row)
+        return {
+            "topic": obj.get("topic_title", ""),
+            "section": obj.get("section", ""),
+            "filename": obj.get("filename", "")
+        }
+
+
+def build_bundle(chunks_path: str = CHUNKS_PATH, index_path: str = FAISS_INDEX_PATH,
+                 root: str = INDEX_BUNDLE_DIR, keep: int = INDEX_BUNDLE_KEEP,
+                 vectors_path: str = FULL_VECTORS_PATH) -> dict:
+    """Write a new bundle from the chunk store and FAISS index, publish it, and prune old builds."""
+    store = get_chunk_store(chunks_path)
+    n = len(store)
+    now = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+    name = f"v{BUNDLE_VERSION}-{stamp}-{int(now * 1000) % 1000:03d}-{os.getpid()}"
+    tmp_dir = os.path.join(root, name + ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    dictionaries, codes = {}, {}
+    with open(os.path.join(tmp_dir, "text.bin"), "wb") as f:
+        for row in range(n):
+            record = store.get(row)
+            text = record.pop("text", "").encode("utf-8")
+            f.write(text)
+            offsets[row + 1] = offsets[row] + len(text)
+            for field in set(codes) | set(record):
+                if field not in codes:
+                    # A field first seen now is missing (None, code 0) on earlier rows
+                    dictionaries[field] = {"null": 0}
+                    codes[field] = [0] * row
+                key = json.dumps(record.get(field), sort_keys=True)
+                codes[field].append(dictionaries[field].setdefault(key, len(dictionaries[field])))
+    np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+
+    columns, constants = {}, {}
+    for field, dictionary in dictionaries.items():
+        values = [json.loads(key) for key in dictionary]
+        used = set(codes[field])
+        if len(used) == 1 and values[next(iter(used))] is not None:
+            constants[field] = values[next(iter(used))]
+            continue
+        file = f"col_{field}.npy"
+        present = [values[code] for code in used]
+        if len(values) > 1 << 8 and all(type(v) is int for v in present):
+            # High-cardinality integers (offsets, chunk_id) are cheaper stored as-is
+            raw = np.asarray([values[code] for code in codes[field]], dtype=np.int64)
+            np.save(os.path.join(tmp_dir, file), raw.astype(np.int32 if raw.max() < 1 << 31 else np.int64))
+            columns[field] = {"file": file, "encoding": "raw"}
+            continue
+        np.save(os.path.join(tmp_dir, file), np.asarray(codes[field], dtype=_code_dtype(len(values))))
+        columns[field] = {"file": file, "encoding": "dictionary", "values": values}
+
+    if os.path.exists(index_path):
+        shutil.copyfile(index_path, os.path.join(tmp_dir, "index.faiss"))
+    if os.path.exists(vectors_path):
+        shutil.copyfile(vectors_path, os.path.join(tmp_dir, "vectors.f32"))
+
+    files = {}
+    for file in sorted(os.listdir(tmp_dir)):
+        path = os.path.join(tmp_dir, file)
+        files[file] = {"bytes": os.path.getsize(path), "sha256": _sha256(path)}
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "rows": n,
+        "files": files,
+        "columns": columns,
+        "constants": constants
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    final_dir = os.path.join(root, name)
+    os.replace(tmp_dir, final_dir)
+    pointer = os.path.join(root, CURRENT_FILE)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+    _prune(root, name, keep)
+
+    source_bytes = sum(os.path.getsize(p) for p in (chunks_path, index_path) if os.path.exists(p))
+    bundle_bytes = sum(entry["bytes"] for entry in files.values())
+    return {"path": final_dir, "rows": n, "source_bytes": source_bytes, "bundle_bytes": bundle_bytes,
+            "files": {file: entry["bytes"] for file, entry in files.items()}}
+
+
+def _prune(root: str, current: str, keep: int):
+    """Drop all but the `keep` newest builds. Open mmaps of a removed build stay valid on POSIX."""
+    builds = sorted((d for d in os.listdir(root) if d.startswith("v") and not d.endswith(".tmp")),
+                    key=lambda d: os.path.getmtime(os.path.join(root, d)), reverse=True)
+    for old in [d for d in builds if d != current][max(0, keep - 1):]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+
+# Process-wide bundle, reloaded when CURRENT is swapped
+_bundle = None
+_bundle_generation = None
+_bundle_lock = threading.Lock()
+
+
+def bundle_generation(root: str = INDEX_BUNDLE_DIR):
+    return file_generation(os.path.join(root, CURRENT_FILE))
+
+
+def get_bundle(root: str = INDEX_BUNDLE_DIR):
+    """Return the live bundle under `root`, or None if none has been built or it fails to load."""
+    global _bundle, _bundle_generation
+    generation = bundle_generation(root)
+    if generation != _bundle_generation:
+        with _bundle_lock:
+            if generation != _bundle_generation:
+                _bundle = None
+                if generation is not None:
+                    with open(os.path.join(root, CURRENT_FILE), "r", encoding="utf-8") as f:
+                        name = f.read().strip()
+                    try:
+                        _bundle = IndexBundle(os.path.join(root, name))
+                        print(f"Loaded index bundle {name} ({_bundle.rows} rows)")
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"[Error] Could not load index bundle {name}: {e}")
+                _bundle_generation = generation
+    return _bundle
+
+
+def active_bundle():
+    """The bundle to serve from when INDEX_BUNDLE is on, else None."""
+    return get_bundle() if INDEX_BUNDLE else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or verify the serving index bundle.")
+    parser.add_argument("command", choices=["build", "verify"])
+    parser.add_argument("--root", default=INDEX_BUNDLE_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(json.dumps(build_bundle(root=args.root), indent=2))
+    else:
+        bundle = get_bundle(args.root)
+        if bundle is None:
+            raise SystemExit(f"No loadable bundle under {args.root}")
+        bad = bundle.verify(checksums=True)
+        print("OK" if not bad else f"Checksum mismatch: {', '.join(bad)}")
+        raise SystemExit(1 if bad else 0)
@@ -0,0 +1,231 @@
+import os
+import json
+import threading
+import faiss
+import numpy as np
+from utils.pdf_parser import extract_text_from_pdf, file_sha256
+from utils.chunking import chunk_text
+from utils.chunk_store import get_chunk_store
+from utils.sparse_index import SparseIndex
+from utils.index_bundle import build_bundle
+from utils.shards import request_rebuild
+from models.embedding_service import encode_texts
+from utils.vector_store import get_vector_store
+from models.ann_index import build_ann_index, ensure_id_map, remove_ids, is_compressed
+from config.config import (
+    RAW_PDF_DIR,
+    CHUNKS_PATH,
+    FAISS_INDEX_PATH,
+    FULL_VECTORS_PATH,
+    INGEST_MANIFEST_PATH,
+    SPARSE_INDEX_PATH,
+    FAISS_INDEX_TYPE,
+    INDEX_BUNDLE,
+    SHARD_COUNT
+)
+
+# Incremental ingestion keyed by file content hash.
+# The chunk file is append-only: a chunk's FAISS ID is its row number, so new
+# files append rows + vectors, and removed/changed files only drop their vectors.
+# Compressed indexes also append full-precision rows to FULL_VECTORS_PATH.
+# Dead rows stay in the chunk file until the next full rebuild
+# (models.embeddings) drops them with compact_manifest and renumbers the rest.
+# With SHARD_COUNT, the re-split of the shards is queued in the background.
+
+_ingest_lock = threading.Lock()
+
+
+def _file_entry(path: str, digest: str, rows: list) -> dict:
+    st = os.stat(path)
+    return {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "rows": rows}
+
+
+def bootstrap_manifest(pdf_dir: str = RAW_PDF_DIR, chunks_path: str = CHUNKS_PATH) -> dict:
+    """Build a manifest for an index that was produced by the full batch pipeline."""
+    rows_by_file = {}
+    store = get_chunk_store(chunks_path)
+    for row in range(len(store)):
+        rows_by_file.setdefault(store.get(row).get("filename", ""), []).append(row)
+
+    files = {}
+    for filename, rows in rows_by_file.items():
+        path = os.path.join(pdf_dir, filename)
+        if os.path.exists(path):
+            files[filename] = _file_entry(path, file_sha256(path), rows)
+        else:
+            # Indexed but no longer on disk — tracked so the next sync removes it
+            files[filename] = {"sha256": None, "size": None, "mtime_ns": None, "rows": rows}
+    return {"files": files}
+
+
+def compact_manifest(manifest: dict, n_rows: int) -> tuple:
+    """
+    (live rows, renumbered manifest): the rows the manifest assigns to a file,
+    ascending, and the manifest rewritten for a chunk file holding only them.
+    """
+    live = sorted({row for entry in manifest["files"].values() for row in entry["rows"] if 0 <= row < n_rows})
+    new_row = {old: new for new, old in enumerate(live)}
+    files = {filename: dict(entry, rows=[new_row[row] for row in entry["rows"] if row in new_row])
+             for filename, entry in manifest["files"].items()}
+    return live, dict(manifest, files=files)
+
+
+def load_manifest(path: str = INGEST_MANIFEST_PATH) -> dict:
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    if os.path.exists(FAISS_INDEX_PATH):
+        print("No ingest manifest found — bootstrapping from the existing chunk store.")
+        return bootstrap_manifest()
+    return {"files": {}}
+
+
+def save_manifest(manifest: dict, path: str = INGEST_MANIFEST_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_index(index_path: str = FAISS_INDEX_PATH):
+    """Load the FAISS index as an ID-mapped index, or None if it does not exist yet."""
+    if not os.path.exists(index_path):
+        return None
+    return ensure_id_map(faiss.read_index(index_path))
+
+
+def save_index(index, index_path: str = FAISS_INDEX_PATH):
+    """Write atomically so readers reloading on mtime change never see a partial file."""
+    tmp_path = index_path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, index_path)
+
+
+def load_sparse(path: str = SPARSE_INDEX_PATH):
+    """The sparse index is maintained incrementally only once a full build has created it."""
+    return SparseIndex.load(path) if os.path.exists(path) else None
+
+
+def _remove_file(index, sparse, manifest: dict, filename: str):
+    entry = manifest["files"].pop(filename, None)
+    if entry and entry["rows"]:
+        if index is not None:
+            index = remove_ids(index, entry["rows"])
+        if sparse is not None:
+            sparse.remove_rows(entry["rows"])
+    return index
+
+
+def _add_file(index, sparse, manifest: dict, path: str, text: str = None, digest: str = None):
+    """Extract, chunk, embed and append one file. Returns (index, chunks added)."""
+    filename = os.path.basename(path)
+    digest = digest or file_sha256(path)
+
+    # A changed file replaces its previous rows
+    index = _remove_file(index, sparse, manifest, filename)
+
+    text = extract_text_from_pdf(path) if text is None else text
+    chunks = chunk_text(text, filename) if text.strip() else []
+    rows = []
+
+    if chunks:
+        vectors = encode_texts([c["text"] for c in chunks])
+        rows = get_chunk_store(CHUNKS_PATH).append(chunks)
+        ids = np.asarray(rows, dtype="int64")
+        if index is None:
+            index = build_ann_index(vectors, FAISS_INDEX_TYPE, ids=ids)
+        else:
+            index.add_with_ids(vectors, ids)
+        if is_compressed(FAISS_INDEX_TYPE):
+            get_vector_store(FULL_VECTORS_PATH).append(rows, vectors)
+        if sparse is not None:
+            sparse.add_documents(rows, [c["text"] for c in chunks])
+
+    manifest["files"][filename] = _file_entry(path, digest, rows)
+    return index, len(rows)
+
+
+def ingest_file(path: str, text: str = None) -> int:
+    """
+    Add or update a single document in the knowledge base.
+    Returns the number of chunks added (0 if the file is unchanged or empty).
+    """
+    with _ingest_lock:
+        manifest = load_manifest()
+        digest = file_sha256(path)
+        entry = manifest["files"].get(os.path.basename(path))
+        if entry and entry["sha256"] == digest:
+            return 0
+
+        sparse = load_sparse()
+        index, added = _add_file(load_index(), sparse, manifest, path, text=text, digest=digest)
+        if index is not None:
+            save_index(index)
+        if sparse is not None:
+            sparse.save()
+        save_manifest(manifest)
+        if INDEX_BUNDLE:
+            build_bundle()
+        if SHARD_COUNT:
+            request_rebuild()
+        return added
+
+
+def sync_directory(pdf_dir: str = RAW_PDF_DIR) -> dict:
+    """
+    Bring the index in line with the PDFs in `pdf_dir`: ingest new or changed
+    files and remove vectors of deleted ones. Unchanged files are detected by
+    size/mtime first and content hash second, so cost scales with the change.
+    """
+    with _ingest_lock:
+        manifest = load_manifest()
+        index = load_index()
+        sparse = load_sparse()
+        summary = {"added": [], "updated": [], "removed": [], "unchanged": 0, "chunks_added": 0}
+
+        on_disk = {f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf")} if os.path.isdir(pdf_dir) else set()
+
+        for filename in sorted(set(manifest["files"]) - on_disk):
+            index = _remove_file(index, sparse, manifest, filename)
+            summary["removed"].append(filename)
+
+        for filename in sorted(on_disk):
+            path = os.path.join(pdf_dir, filename)
+            entry = manifest["files"].get(filename)
+            st = os.stat(path)
+            if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                summary["unchanged"] += 1
+                continue
+
+            digest = file_sha256(path)
+            if entry and entry["sha256"] == digest:
+                entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+                summary["unchanged"] += 1
+                continue
+
+            try:
+                index, added = _add_file(index, sparse, manifest, path, digest=digest)
+            except Exception as e:
+                print(f"[Ingest Error] {filename}: {e}")
+                continue
+            summary["updated" if entry else "added"].append(filename)
+            summary["chunks_added"] += added
+
+        if index is not None:
+            save_index(index)
+        if sparse is not None:
+            sparse.save()
+        save_manifest(manifest)
+        changed = summary["added"] or summary["updated"] or summary["removed"]
+        if INDEX_BUNDLE and changed:
+            build_bundle()
+        if SHARD_COUNT and changed:
+            request_rebuild()
+        return summary
+
+
+if __name__ == "__main__":
+    result = sync_directory()
+    print(f"Added: {len(result['added'])}, updated: {len(result['updated'])}, "
+          f"removed: {len(result['removed'])}, unchanged: {result['unchanged']}, "
+          f"chunks added: {result['chunks_added']}")
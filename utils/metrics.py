@@ -0,0 +1,107 @@
+import bisect
+import threading
+
+# Process-wide metric registry. Histograms use Prometheus-style cumulative
+# buckets so they can be exported as-is; prometheus_text() renders the whole
+# registry in the text exposition format (served at GET /metrics).
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)   # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, total, n = list(self._counts), self._sum, self._count
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            running += count
+            cumulative[str(bound)] = running
+        return {"count": n, "sum": round(total, 6), "mean": round(total / n, 6) if n else 0.0,
+                "buckets": cumulative}
+
+
+class Counter:
+    """Monotonic counter. With `source`, the value is read from that callable (e.g. a cache's hit count)."""
+
+    def __init__(self, name: str, help: str, source=None):
+        self.name = name
+        self.help = help
+        self.source = source
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def snapshot(self):
+        return self.source() if self.source is not None else self._value
+
+
+def _register(name: str, factory):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = factory()
+        return metric
+
+
+def histogram(name: str, help: str = "", buckets=LATENCY_BUCKETS) -> Histogram:
+    """Get or create the histogram registered under `name`."""
+    return _register(name, lambda: Histogram(name, help, buckets))
+
+
+def counter(name: str, help: str = "", source=None) -> Counter:
+    """Get or create the counter registered under `name` (by convention ending in _total)."""
+    return _register(name, lambda: Counter(name, help, source))
+
+
+def snapshot() -> dict:
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {metric.name: metric.snapshot() for metric in metrics}
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def prometheus_text() -> str:
+    """The registry in Prometheus text exposition format (version 0.0.4)."""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    lines = []
+    for metric in metrics:
+        if metric.help:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+        if isinstance(metric, Counter):
+            lines.append(f"# TYPE {metric.name} counter")
+            lines.append(f"{metric.name} {_number(metric.snapshot())}")
+            continue
+        data = metric.snapshot()
+        lines.append(f"# TYPE {metric.name} histogram")
+        for bound, count in data["buckets"].items():
+            lines.append(f'{metric.name}_bucket{{le="{bound}"}} {count}')
+        lines.append(f"{metric.name}_sum {_number(data['sum'])}")
+        lines.append(f"{metric.name}_count {data['count']}")
+    return "\n".join(lines) + "\n"
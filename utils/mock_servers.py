@@ -0,0 +1,162 @@
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-ins for the Groq chat completions API (JSON and SSE streaming)
+# and Google Custom Search, so the LLM and web-search paths can run offline.
+# Point the app at them with GROQ_API_URL / GOOGLE_SEARCH_URL.
+
+CHAT_PATH = "/openai/v1/chat/completions"
+SEARCH_PATH = "/customsearch/v1"
+
+
+def default_responder(payload: dict) -> str:
+    """Echo-style answer; replies 'insufficient' when the question asks for it and no web results were added."""
+    prompt = payload["messages"][-1]["content"]
+    question = prompt.split("### User Question:")[-1].split("###")[0].strip()
+    if "insufficient" in question.lower() and "### Additional Web Search Results" not in prompt:
+        return "I don’t have enough medical information to answer confidently."
+    return f"Mock answer about {question}. " + "This is a grounded healthcare response. " * 8
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128     # the default of 5 drops SYNs under concurrent load
+
+
+class MockServer:
+    """Threaded HTTP server with configurable latency for both endpoints."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, llm_delay: float = 0.0, token_delay: float = 0.0,
+                 search_delay: float = 0.0, responder=default_responder):
+        self.llm_delay = llm_delay
+        self.token_delay = token_delay
+        self.search_delay = search_delay
+        self.responder = responder
+        self.requests = {"chat": 0, "stream": 0, "search": 0}
+        self.fail_next = 0          # answer the next N requests with fail_status
+        self.fail_status = 503
+        self._httpd = _Server((host, port), self._handler())
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def chat_url(self) -> str:
+        return self.base_url + CHAT_PATH
+
+    @property
+    def search_url(self) -> str:
+        return self.base_url + SEARCH_PATH
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _json(self, status: int, body: dict):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _injected_failure(self) -> bool:
+                with server._lock:
+                    if server.fail_next <= 0:
+                        return False
+                    server.fail_next -= 1
+                self._json(server.fail_status, {"error": "injected failure"})
+                return True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                if self._injected_failure():
+                    return
+                if urlparse(self.path).path != CHAT_PATH:
+                    return self._json(404, {"error": "not found"})
+                payload = json.loads(body or b"{}")
+                answer = server.responder(payload)
+                time.sleep(server.llm_delay)
+
+                if not payload.get("stream"):
+                    server.requests["chat"] += 1
+                    return self._json(200, {"choices": [{"message": {"role": "assistant", "content": answer}}]})
+
+                server.requests["stream"] += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def send(data: str):
+                    raw = f"data: {data}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(raw):X}\r\n".encode() + raw + b"\r\n")
+                    self.wfile.flush()
+
+                words = answer.split(" ")
+                for i, word in enumerate(words):
+                    token = word if i == 0 else " " + word
+                    send(json.dumps({"choices": [{"delta": {"content": token}}]}))
+                    time.sleep(server.token_delay)
+                send("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_GET(self):
+                if self._injected_failure():
+                    return
+                url = urlparse(self.path)
+                if url.path != SEARCH_PATH:
+                    return self._json(404, {"error": "not found"})
+                server.requests["search"] += 1
+                time.sleep(server.search_delay)
+                query = parse_qs(url.query).get("q", [""])[0]
+                num = int(parse_qs(url.query).get("num", ["3"])[0])
+                items = [
+                    {"title": f"Result {i + 1} for {query}", "snippet": f"Web snippet {i + 1} about {query}.",
+                     "link": f"https://example.org/{i + 1}"}
+                    for i in range(num)
+                ]
+                self._json(200, {"items": items})
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run mock Groq + Google Custom Search servers.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed tokens")
+    parser.add_argument("--search-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    mock = MockServer(port=args.port, llm_delay=args.llm_delay, token_delay=args.token_delay,
+                      search_delay=args.search_delay).start()
+    print(f"GROQ_API_URL={mock.chat_url}")
+    print(f"GOOGLE_SEARCH_URL={mock.search_url}")
+    try:
+        mock._thread.join()
+    except KeyboardInterrupt:
+        mock.stop()
@@ -0,0 +1,166 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from utils.rag_search import get_relevant_context
+from utils.web_search import google_search_async
+from utils.http_client import run_sync
+from utils.context_builder import context_budget, fit_web_context
+from utils.metrics import counter
+from config.config import (
+    TOP_K,
+    RETRIEVAL_MODE,
+    ENABLE_WEB_SEARCH,
+    WEB_SPECULATIVE,
+    WEB_SPECULATIVE_MIN_RATE,
+    WEB_SPECULATIVE_WINDOW,
+    WEB_FALLBACK_MIN_WORDS,
+    CONTEXT_BUILDER_ENABLED
+)
+
+# Runs retrieval and web search side by side instead of one after the other.
+# The web search is started speculatively together with retrieval, but only
+# while at least WEB_SPECULATIVE_MIN_RATE of the last WEB_SPECULATIVE_WINDOW
+# turns had weak RAG context: a cancelled search has usually been sent already
+# and still spends API quota. When the RAG context turns out strong, the search
+# is cancelled (or its result dropped).
+# When the context is weak, the search result is already in flight and is
+# merged into the context before the first LLM call. Either way, the
+# "is web data needed" decision is made before the LLM runs, so generation
+# never needs a second, web-grounded round trip.
+
+PATHS = ("rag", "web", "none")
+
+_stats_lock = threading.Lock()
+_stats = {path: {"count": 0, "wall": 0.0, "saved": 0.0} for path in PATHS}
+_searches = {"started": 0, "cancelled": 0, "wasted": 0, "skipped": 0}
+_recent_weak = deque(maxlen=WEB_SPECULATIVE_WINDOW)
+for _path in PATHS:
+    counter(f"turns_{_path}_total", f"Turns answered from the {_path} path", lambda p=_path: _stats[p]["count"])
+for _outcome in _searches:
+    counter(f"web_searches_{_outcome}_total", f"Speculative web searches {_outcome}", lambda o=_outcome: _searches[o])
+
+
+def _record(path: str, wall: float, saved: float, weak: bool):
+    with _stats_lock:
+        entry = _stats[path]
+        entry["count"] += 1
+        entry["wall"] += wall
+        entry["saved"] += saved
+        _recent_weak.append(weak)
+
+
+def _count_search(outcome: str):
+    # Turns run on the server loop and on http_client's background loop
+    with _stats_lock:
+        _searches[outcome] += 1
+
+
+def should_speculate() -> bool:
+    """Whether recent turns needed the web often enough to start the search before retrieval."""
+    with _stats_lock:
+        rate = sum(_recent_weak) / len(_recent_weak) if _recent_weak else 0.0
+    return rate >= WEB_SPECULATIVE_MIN_RATE
+
+
+def orchestrator_stats() -> dict:
+    """Fallback rate plus mean wall time and latency saved per path (seconds)."""
+    with _stats_lock:
+        total = sum(entry["count"] for entry in _stats.values())
+        report = {
+            "turns": total,
+            "fallback_rate": round(_stats["web"]["count"] / total, 4) if total else 0.0,
+            "searches": dict(_searches)
+        }
+        for path, entry in _stats.items():
+            n = entry["count"]
+            report[path] = {
+                "count": n,
+                "mean_wall": round(entry["wall"] / n, 4) if n else 0.0,
+                "mean_saved": round(entry["saved"] / n, 4) if n else 0.0
+            }
+        return report
+
+
+def context_is_weak(context: str) -> bool:
+    return len(context.split()) < WEB_FALLBACK_MIN_WORDS
+
+
+async def _timed_search(query: str):
+    start = time.perf_counter()
+    result = await google_search_async(query)
+    return result, time.perf_counter() - start
+
+
+async def prepare_context_async(query: str, k: int = TOP_K, session_id: str = None, mode: str = RETRIEVAL_MODE,
+                                web_query: str = None, web_enabled: bool = ENABLE_WEB_SEARCH,
+                                response_mode: str = "detailed") -> dict:
+    """
+    Retrieve RAG context with a concurrent web search fallback.
+    Returns a dict with context, sources, chunk_ids, source_used ("RAG",
+    "Web Search" or None), web_used (True when web results were merged in,
+    meaning the LLM-side fallback is redundant) and timings. The context is
+    packed to the token budget of response_mode.
+    """
+    start = time.perf_counter()
+    web_query = web_query or query
+    search = None
+    if web_enabled and WEB_SPECULATIVE:
+        if should_speculate():
+            search = asyncio.create_task(_timed_search(web_query))
+            _count_search("started")
+        else:
+            _count_search("skipped")
+
+    retrieve_start = time.perf_counter()
+    budget = context_budget(response_mode) if CONTEXT_BUILDER_ENABLED else None
+    context, sources, chunk_ids = await asyncio.to_thread(
+        get_relevant_context, query, k, session_id, mode, True, budget
+    )
+    retrieval_time = time.perf_counter() - retrieve_start
+
+    web_context, search_time, web_used = "", 0.0, False
+    weak = context_is_weak(context)
+    if web_enabled and weak:
+        if search is None:
+            _count_search("started")
+            search = asyncio.create_task(_timed_search(web_query))
+        web_context, search_time = await search
+        web_context = fit_web_context(web_context, context, response_mode)
+        if web_context.strip():
+            context = f"{context}\n\n{web_context}" if context.strip() else web_context
+            sources = list(dict.fromkeys(sources + ["Google Search"]))
+            web_used = True
+    elif search is not None:
+        if search.done():
+            _count_search("wasted")
+        else:
+            search.cancel()
+            _count_search("cancelled")
+
+    wall = time.perf_counter() - start
+    if web_used:
+        path, source_used = "web", "Web Search"
+        # A serial chain would have paid retrieval, then the search
+        saved = max(0.0, retrieval_time + search_time - wall)
+    elif context.strip():
+        path, source_used, saved = "rag", "RAG", 0.0
+    else:
+        path, source_used, saved = "none", None, 0.0
+    _record(path, wall, saved, weak)
+
+    return {
+        "context": context,
+        "sources": sources,
+        "chunk_ids": chunk_ids,
+        "source_used": source_used,
+        "web_used": web_used,
+        "timings": {"retrieval": retrieval_time, "search": search_time, "wall": wall, "saved": saved}
+    }
+
+
+def prepare_context(query: str, k: int = TOP_K, session_id: str = None, mode: str = RETRIEVAL_MODE,
+                    web_query: str = None, web_enabled: bool = ENABLE_WEB_SEARCH,
+                    response_mode: str = "detailed") -> dict:
+    """Blocking wrapper around prepare_context_async."""
+    return run_sync(prepare_context_async(query, k, session_id, mode, web_query, web_enabled, response_mode))
@@ -1,7 +1,38 @@
-import pdfplumber
 import os
 import json
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from tqdm import tqdm
+from config.config import RAW_PDF_DIR, PDF_TEXTS_PATH, PDF_WORKERS, PDF_PAGES_PER_TASK
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Hash a file's contents without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _page_texts(pdf, start: int = 0, end: int = None) -> list:
+    """Extract non-empty page texts for pages[start:end], releasing each page after use."""
+    texts = []
+    for page in pdf.pages[start:end]:
+        page_text = page.extract_text()
+        if page_text:
+            texts.append(page_text)
+        if hasattr(page, "close"):
+            page.close()
+    return texts
+
+
+def _open_pdf(file_path: str):
+    # Lazy import: pdfplumber/pdfminer are slow to import and only needed once a PDF is read
+    import pdfplumber
+    return pdfplumber.open(file_path)
+
 
 def extract_text_from_pdf(file_path: str) -> str:
     """Extract text from a single PDF file."""
@@ -9,13 +40,9 @@ def extract_text_from_pdf(file_path: str) -> str:
         print(f"[Error] File not found: {file_path}")
         return ""
 
-    text = ""
     try:
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+        with _open_pdf(file_path) as pdf:
+            text = "\n".join(_page_texts(pdf))
     except Exception as e:
         print(f"[PDF Extraction Error] {e}")
         return ""
@@ -23,34 +50,145 @@ def extract_text_from_pdf(file_path: str) -> str:
     return text.strip()
 
 
-def extract_text_from_pdfs(pdf_dir: str, output_path: str):
-    """Extract text from all PDFs in a directory and save as JSON."""
+def _extract_range(file_path: str, start: int, end: int):
+    """Worker task: extract pages[start:end] of one PDF. Returns (page texts, total pages)."""
+    with _open_pdf(file_path) as pdf:
+        return _page_texts(pdf, start, end), len(pdf.pages)
+
+
+def _existing_records(output_path: str, current_hashes: dict) -> set:
+    """
+    Return the (filename, sha256) pairs already extracted into `output_path`,
+    dropping records for files that were deleted or changed since (the file is
+    rewritten only if needed).
+    """
+    if not os.path.exists(output_path):
+        return set()
+
+    done, stale = set(), 0
+    tmp_path = output_path + ".tmp"
+    with open(output_path, "r", encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+        for line in src:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if current_hashes.get(record.get("filename")) == record.get("sha256"):
+                done.add((record["filename"], record["sha256"]))
+                dst.write(line if line.endswith("\n") else line + "\n")
+            else:
+                stale += 1
+
+    if stale:
+        os.replace(tmp_path, output_path)
+        print(f"Dropped {stale} stale records from {output_path}")
+    else:
+        os.remove(tmp_path)
+    return done
+
+
+def iter_pdf_texts(pdf_dir: str, files: list, workers: int = PDF_WORKERS,
+                   pages_per_task: int = PDF_PAGES_PER_TASK):
+    """
+    Yield (filename, text, error) for each file as soon as it finishes extracting.
+    Files, and page ranges of large files, are spread across a process pool with
+    at most 2x workers tasks in flight. A failing file yields its error instead of
+    text and does not affect the others.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        for file in files:
+            try:
+                pages, _ = _extract_range(os.path.join(pdf_dir, file), 0, None)
+            except Exception as e:
+                yield file, None, e
+                continue
+            yield file, "\n".join(pages).strip(), None
+        return
+
+    # The first task of each file also reports its page count; remaining
+    # ranges are queued at the front so files finish (and free memory) in order.
+    tasks = deque((file, 0) for file in files)
+    state = {}
+    pending = {}
+    max_in_flight = workers * 2
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while tasks or pending:
+            while tasks and len(pending) < max_in_flight:
+                file, start = tasks.popleft()
+                if state.get(file, {}).get("failed"):
+                    continue
+                future = pool.submit(_extract_range, os.path.join(pdf_dir, file), start, start + pages_per_task)
+                pending[future] = (file, start)
+
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                file, start = pending.pop(future)
+                entry = state.setdefault(file, {"parts": {}, "remaining": 0, "failed": False})
+                if entry["failed"]:
+                    continue
+                try:
+                    pages, n_pages = future.result()
+                except Exception as e:
+                    entry.update(failed=True, parts={})
+                    yield file, None, e
+                    continue
+
+                entry["parts"][start] = pages
+                if start == 0:
+                    extra = list(range(pages_per_task, n_pages, pages_per_task))
+                    entry["remaining"] = len(extra)
+                    tasks.extendleft((file, s) for s in reversed(extra))
+                else:
+                    entry["remaining"] -= 1
+
+                if entry["remaining"] == 0:
+                    ordered = [p for s in sorted(entry["parts"]) for p in entry["parts"][s]]
+                    del state[file]
+                    yield file, "\n".join(ordered).strip(), None
+
+
+def extract_text_from_pdfs(pdf_dir: str, output_path: str, workers: int = PDF_WORKERS,
+                           pages_per_task: int = PDF_PAGES_PER_TASK):
+    """
+    Extract text from all PDFs in a directory and stream it to a JSONL file.
+    Each finished file is appended as {"filename", "sha256", "text"} (text is
+    empty for PDFs without extractable text, so they are not retried); reruns
+    skip files whose name and content hash are already in the output.
+    """
     try:
         if not os.path.exists(pdf_dir):
             print(f"[Error] Directory not found: {pdf_dir}")
             return
 
-        data = []
-        pdf_files = [f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf")]
+        pdf_files = sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf"))
+        hashes = {f: file_sha256(os.path.join(pdf_dir, f)) for f in pdf_files}
+        done = _existing_records(output_path, hashes)
+        todo = [f for f in pdf_files if (f, hashes[f]) not in done]
+        if len(todo) < len(pdf_files):
+            print(f"Skipping {len(pdf_files) - len(todo)} already-extracted PDFs")
 
-        for file in tqdm(pdf_files, desc="Extracting PDF text"):
-            pdf_path = os.path.join(pdf_dir, file)
-            text = extract_text_from_pdf(pdf_path)
-            if text:
-                data.append({"filename": file, "text": text})
-            else:
-                print(f"[Warning] No text extracted from {file}")
+        written, failed = 0, 0
+        with open(output_path, "a", encoding="utf-8") as out:
+            results = iter_pdf_texts(pdf_dir, todo, workers, pages_per_task)
+            for file, text, error in tqdm(results, total=len(todo), desc="Extracting PDF text"):
+                if error is not None:
+                    print(f"[PDF Extraction Error] {file}: {error}")
+                    failed += 1
+                else:
+                    if text:
+                        written += 1
+                    else:
+                        print(f"[Warning] No text extracted from {file}")
+                    out.write(json.dumps({"filename": file, "sha256": hashes[file], "text": text}) + "\n")
+                    out.flush()
 
-        if data:
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
-            print(f"Extracted text from {len(data)} PDFs → {output_path}")
-        else:
-            print("[Warning] No valid PDF text extracted. Output not created.")
+        print(f"Extracted text from {written} PDFs → {output_path}" + (f" ({failed} failed)" if failed else ""))
 
     except Exception as e:
         print(f"[Batch Extraction Error] {e}")
 
 
 if __name__ == "__main__":
-    extract_text_from_pdfs("data/raw_pdfs", "data/pdf_texts.json")
+    extract_text_from_pdfs(RAW_PDF_DIR, PDF_TEXTS_PATH)
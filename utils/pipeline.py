@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import queue
+import threading
+import numpy as np
+import faiss
+from utils.pdf_parser import iter_pdf_texts, file_sha256
+from utils.chunking import chunk_text
+from utils.ingest import save_index, save_manifest
+from utils.index_bundle import build_bundle
+from utils.shards import build_shards
+from utils.sparse_index import SparseIndexBuilder
+from models.embedding_service import encode_texts
+from models.ann_index import create_index, apply_search_params, needs_training, is_compressed
+from utils.vector_store import discard_vectors
+from config.config import (
+    RAW_PDF_DIR,
+    CHUNKS_PATH,
+    FAISS_INDEX_PATH,
+    FULL_VECTORS_PATH,
+    FAISS_INDEX_TYPE,
+    INGEST_MANIFEST_PATH,
+    SPARSE_INDEX_PATH,
+    EMBED_BATCH_SIZE,
+    PDF_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_TRAIN_SIZE,
+    INDEX_BUNDLE,
+    SHARD_COUNT
+)
+
+# Single-pass ingestion: extract → chunk → embed → index.
+# Each stage runs in its own thread and talks to the next through a bounded
+# queue, so extraction (process pool) overlaps with embedding and peak memory
+# is set by the queue sizes, not by the corpus.
+
+_DONE = object()
+
+
+class _Stop(Exception):
+    """Raised inside a stage when another stage has failed."""
+
+
+def _put(q: queue.Queue, item, stop: threading.Event):
+    while True:
+        if stop.is_set():
+            raise _Stop()
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _drain(q: queue.Queue, stop: threading.Event):
+    while True:
+        if stop.is_set():
+            raise _Stop()
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        yield item
+
+
+def _run_stage(name, fn, outbox, stop, errors):
+    """Run a stage, signal completion downstream, and record failures."""
+    try:
+        fn()
+    except _Stop:
+        pass
+    except BaseException as e:
+        errors.append((name, e))
+        stop.set()
+    finally:
+        if outbox is not None:
+            try:
+                _put(outbox, _DONE, stop)
+            except _Stop:
+                pass
+
+
+def run_pipeline(pdf_dir: str = RAW_PDF_DIR, chunks_path: str = CHUNKS_PATH, index_path: str = FAISS_INDEX_PATH,
+                 index_type: str = FAISS_INDEX_TYPE, workers: int = PDF_WORKERS,
+                 batch_size: int = EMBED_BATCH_SIZE, queue_size: int = PIPELINE_QUEUE_SIZE) -> dict:
+    """
+    Build the chunk store, FAISS index and ingest manifest from `pdf_dir` in one
+    streaming pass. Returns per-stage busy time and throughput counters.
+    """
+    if not os.path.isdir(pdf_dir):
+        print(f"[Error] Directory not found: {pdf_dir}")
+        return {}
+
+    pdf_files = sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf"))
+    docs_q = queue.Queue(maxsize=queue_size)
+    batches_q = queue.Queue(maxsize=queue_size)
+    vectors_q = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors, busy = [], {}
+    counts = {"files": 0, "failed": 0, "chunks": 0}
+    file_rows = {}
+    sparse = SparseIndexBuilder()
+    tmp_chunks = chunks_path + ".tmp"
+
+    def extract():
+        results = iter_pdf_texts(pdf_dir, pdf_files, workers)
+        while True:
+            start = time.perf_counter()
+            item = next(results, None)
+            busy["extract"] = busy.get("extract", 0.0) + time.perf_counter() - start
+            if item is None:
+                break
+            file, text, error = item
+            if error is not None:
+                print(f"[PDF Extraction Error] {file}: {error}")
+                counts["failed"] += 1
+                continue
+            counts["files"] += 1
+            _put(docs_q, (file, text), stop)
+
+    def chunk():
+        row, texts, ids = 0, [], []
+        with open(tmp_chunks, "w", encoding="utf-8") as out:
+            for file, text in _drain(docs_q, stop):
+                start = time.perf_counter()
+                chunks = chunk_text(text, file) if text.strip() else []
+                file_rows[file] = list(range(row, row + len(chunks)))
+                ready = []
+                for c in chunks:
+                    out.write(json.dumps(c) + "\n")
+                    sparse.add(row, c["text"])
+                    texts.append(c["text"])
+                    ids.append(row)
+                    row += 1
+                    if len(texts) == batch_size:
+                        ready.append((texts, ids))
+                        texts, ids = [], []
+                busy["chunk"] = busy.get("chunk", 0.0) + time.perf_counter() - start
+                counts["chunks"] = row
+                for batch in ready:
+                    _put(batches_q, batch, stop)
+            if texts:
+                _put(batches_q, (texts, ids), stop)
+        counts["chunks"] = row
+
+    def embed():
+        for texts, ids in _drain(batches_q, stop):
+            start = time.perf_counter()
+            vectors = encode_texts(texts, batch_size=batch_size)
+            busy["embed"] = busy.get("embed", 0.0) + time.perf_counter() - start
+            _put(vectors_q, (vectors, np.asarray(ids, dtype="int64")), stop)
+
+    wall_start = time.perf_counter()
+    threads = [
+        threading.Thread(target=_run_stage, args=("extract", extract, docs_q, stop, errors), daemon=True),
+        threading.Thread(target=_run_stage, args=("chunk", chunk, batches_q, stop, errors), daemon=True),
+        threading.Thread(target=_run_stage, args=("embed", embed, vectors_q, stop, errors), daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    def expected_rows(buffered: int) -> int:
+        """Corpus size extrapolated from the files chunked so far, for sizing IVF nlist."""
+        return max(buffered, counts["chunks"] * len(pdf_files) // max(len(file_rows), 1))
+
+    # Index stage runs on the calling thread. Trainable indexes (IVF/PQ, int8, PCA) buffer
+    # up to PIPELINE_TRAIN_SIZE vectors, train on them, then stream the rest.
+    # Compressed indexes also stream full-precision rows to disk for rescoring.
+    # Any failure here stops the other stages and is reported like theirs
+    index, pending, pending_count = None, [], 0
+    busy["index"] = 0.0
+    tmp_vectors = FULL_VECTORS_PATH + ".tmp"
+    full_vectors = open(tmp_vectors, "wb") if is_compressed(index_type) else None
+    try:
+        for vectors, ids in _drain(vectors_q, stop):
+            start = time.perf_counter()
+            if full_vectors is not None:
+                np.ascontiguousarray(vectors, dtype="float32").tofile(full_vectors)
+            if index is None:
+                pending.append((vectors, ids))
+                pending_count += len(vectors)
+                if not needs_training(index_type) or pending_count >= PIPELINE_TRAIN_SIZE:
+                    index = _start_index(pending, index_type, expected_rows(pending_count))
+                    pending = []
+            else:
+                index.add_with_ids(vectors, ids)
+            busy["index"] += time.perf_counter() - start
+        if index is None and pending:
+            index = _start_index(pending, index_type, pending_count)
+    except _Stop:
+        pass
+    except Exception as e:
+        errors.append(("index", e))
+        stop.set()
+    finally:
+        if full_vectors is not None:
+            full_vectors.close()
+
+    for t in threads:
+        t.join()
+
+    if errors or index is None:
+        for tmp_path in (tmp_chunks, tmp_vectors):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    if errors:
+        for name, e in errors:
+            print(f"[Pipeline Error] {name} stage failed: {e}")
+        return {}
+    if index is None:
+        print("[Error] No chunks produced — index not written.")
+        return {}
+
+    # Publish chunk rows, dense and sparse indexes, and manifest together
+    os.replace(tmp_chunks, chunks_path)
+    save_index(index, index_path)
+    if full_vectors is not None:
+        os.replace(tmp_vectors, FULL_VECTORS_PATH)
+    else:
+        discard_vectors(FULL_VECTORS_PATH)
+    sparse.build().save(SPARSE_INDEX_PATH)
+    manifest = {"files": {}}
+    for file, rows in file_rows.items():
+        path = os.path.join(pdf_dir, file)
+        st = os.stat(path)
+        manifest["files"][file] = {"sha256": file_sha256(path), "size": st.st_size,
+                                   "mtime_ns": st.st_mtime_ns, "rows": rows}
+    save_manifest(manifest, INGEST_MANIFEST_PATH)
+    if INDEX_BUNDLE:
+        build_bundle(chunks_path, index_path)
+    if SHARD_COUNT:
+        build_shards(SHARD_COUNT, chunks_path=chunks_path, index_path=index_path, index_type=index_type)
+
+    wall = time.perf_counter() - wall_start
+    summary = {
+        **counts,
+        "vectors": int(index.ntotal),
+        "wall_seconds": round(wall, 3),
+        "stage_busy_seconds": {k: round(v, 3) for k, v in busy.items()},
+        "chunks_per_second": round(counts["chunks"] / wall, 2) if wall else 0.0
+    }
+    slowest = max(summary["stage_busy_seconds"], key=summary["stage_busy_seconds"].get)
+    print(f"Ingested {counts['files']} files → {counts['chunks']} chunks in {wall:.1f}s "
+          f"(slowest stage: {slowest}, {summary['stage_busy_seconds'][slowest]:.1f}s busy)")
+    return summary
+
+
+def _start_index(batches, index_type, expected: int = 0):
+    """Create (and train if needed) the index from the first buffered batches, sized for `expected` rows."""
+    vectors = np.vstack([v for v, _ in batches])
+    ids = np.concatenate([i for _, i in batches])
+    index = create_index(vectors.shape[1], len(vectors), index_type, expected=expected)
+    if not index.is_trained:
+        index.train(vectors)
+    index = faiss.IndexIDMap2(index)
+    index.add_with_ids(vectors, ids)
+    apply_search_params(index)
+    return index
+
+
+if __name__ == "__main__":
+    run_pipeline()
@@ -1,84 +1,465 @@
 import os
-import json
+import threading
 import numpy as np
 import faiss
-import re
-from sentence_transformers import SentenceTransformer
+from models.embedding_service import encode_query, encode_texts
+from models.ann_index import apply_search_params, reconstruct_rows
+from utils.chunk_store import get_chunk_store, file_generation
+from utils.vector_store import get_vector_store
+from utils.index_bundle import active_bundle, bundle_generation
+from utils.shards import get_sharded, shard_generation
+from utils.sparse_index import get_sparse_index
+from utils.session_index import get_session
+from utils.context_builder import assemble, join_blocks, render
+from models import reranker
+from utils.cache import TTLCache, make_key
+from utils.tracing import span
+from utils.metrics import counter
 from config.config import (
-    DATA_DIR,
     FAISS_INDEX_PATH,
+    FAISS_MMAP,
+    FULL_VECTORS_PATH,
+    RESCORE_CANDIDATES,
+    SHARD_COUNT,
+    SPARSE_INDEX_PATH,
     CHUNKS_PATH,
+    CACHE_DIR,
     EMBED_MODEL_LOCAL,
-    TOP_K
+    EMBED_DIM,
+    QUERY_CACHE_ENABLED,
+    QUERY_CACHE_SIZE,
+    EMBED_CACHE_SIZE,
+    QUERY_CACHE_TTL,
+    QUERY_CACHE_BACKEND,
+    TOP_K,
+    RETRIEVAL_MODE,
+    FUSION_METHOD,
+    RRF_K,
+    HYBRID_DENSE_WEIGHT,
+    HYBRID_CANDIDATES,
+    CONTEXT_BUILDER_ENABLED,
+    RERANK_ENABLED,
+    RERANK_MODEL,
+    RERANK_CANDIDATES,
+    RERANK_MIN_SCORE,
+    INDEX_BUNDLE
 )
 
-# Load embedding model
-print(f"Loading embedding model: {EMBED_MODEL_LOCAL}")
-embed_model = SentenceTransformer(EMBED_MODEL_LOCAL)
-
-# Load FAISS index safely
-print(f"Loading FAISS index from: {FAISS_INDEX_PATH}")
-if not os.path.exists(FAISS_INDEX_PATH):
-    print(f"FAISS index not found at {FAISS_INDEX_PATH}. Skipping RAG initialization.")
-    index = None
-else:
-    index = faiss.read_index(FAISS_INDEX_PATH)
-
-# Load metadata
-metadata_path = os.path.join(DATA_DIR, "chunk_metadata.jsonl")
-if os.path.exists(metadata_path):
-    with open(metadata_path, "r", encoding="utf-8") as f:
-        metadata = [json.loads(line) for line in f]
-else:
-    metadata = []
+weak_contexts = counter("rag_weak_contexts_total", "Retrievals too weak to answer from (web fallback)")
+
+# FAISS index, loaded on first use and reloaded when the file on disk changes
+# (full rebuilds and incremental ingestion both swap the file atomically)
+_index = None
+_index_generation = None
+_index_lock = threading.Lock()
+
+def _read_index(path: str):
+    """Read the index, memory-mapped read-only with FAISS_MMAP so worker processes share its pages."""
+    if FAISS_MMAP:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            print(f"[Error] Could not memory-map {path} ({e}); loading it into memory instead.")
+    return faiss.read_index(path)
+
+def get_index():
+    """
+    Return the current FAISS index (from the index bundle with INDEX_BUNDLE, or
+    the fan-out ShardedIndex with SHARD_COUNT), or None if it has not been built.
+    """
+    global _index, _index_generation
+    if SHARD_COUNT:
+        sharded = get_sharded()
+        return sharded[0] if sharded is not None else None
+    bundle = active_bundle()
+    path = bundle.index_path if bundle is not None else FAISS_INDEX_PATH
+    generation = file_generation(path) if path else None
+    if generation != _index_generation:
+        with _index_lock:
+            if generation != _index_generation:
+                if generation is None:
+                    print(f"FAISS index not found at {path or FAISS_INDEX_PATH}. Skipping RAG initialization.")
+                    _index = None
+                else:
+                    print(f"Loading FAISS index from: {path}")
+                    with span("index_load"):
+                        _index = bundle.read_index() if bundle is not None else _read_index(path)
+                        apply_search_params(_index)
+                _index_generation = generation
+    return _index
+
+# Query embedding and retrieval result caches. Result keys include the index
+# generation, and the result cache is cleared when the index is rebuilt.
+_disk = QUERY_CACHE_BACKEND == "disk"
+embedding_cache = TTLCache("query_embeddings", EMBED_CACHE_SIZE, QUERY_CACHE_TTL,
+                           os.path.join(CACHE_DIR, "embeddings.sqlite") if _disk else None)
+result_cache = TTLCache("retrieval_results", QUERY_CACHE_SIZE, QUERY_CACHE_TTL,
+                        os.path.join(CACHE_DIR, "results.sqlite") if _disk else None)
+_cached_generation = None
+
+def normalize_query(query: str) -> str:
+    """Case/whitespace-insensitive form of a query (e5-base-v2 is uncased)."""
+    return " ".join(query.lower().split())
+
+def index_generation():
+    """Identifies the current dense index, sparse index, chunk store, full-precision vectors, bundle and shards on disk."""
+    return (file_generation(FAISS_INDEX_PATH), file_generation(SPARSE_INDEX_PATH), file_generation(CHUNKS_PATH),
+            file_generation(FULL_VECTORS_PATH), bundle_generation() if INDEX_BUNDLE else None,
+            shard_generation() if SHARD_COUNT else None)
+
+def chunk_store():
+    """Chunk records by row: the shards with SHARD_COUNT, the index bundle with INDEX_BUNDLE, else the chunk JSONL."""
+    if SHARD_COUNT:
+        sharded = get_sharded()
+        if sharded is not None:
+            return sharded[1]
+    bundle = active_bundle()
+    return bundle if bundle is not None else get_chunk_store(CHUNKS_PATH)
+
+def cache_stats() -> dict:
+    return {"embeddings": embedding_cache.stats(), "results": result_cache.stats()}
 
 def embed_query(query: str):
     """Convert user query to normalized embedding."""
-    return embed_model.encode(
-        [query],
-        convert_to_numpy=True,
-        normalize_embeddings=True
-    )[0].astype("float32")
-
-def load_chunks():
-    """Load processed text chunks."""
-    with open(CHUNKS_PATH, "r", encoding="utf-8") as f:
-        return [json.loads(line) for line in f]
-
-def get_relevant_context(query: str, k: int = TOP_K, report_text: str = None):
-    """Retrieve the most relevant document chunks for a given query."""
-    if index is None:
-        return "", []
+    query = normalize_query(query)
+    with span("query_embed"):
+        if not QUERY_CACHE_ENABLED:
+            return encode_query(query)
+        key = make_key(EMBED_MODEL_LOCAL, query)
+        vector = embedding_cache.get(key)
+        if vector is None:
+            vector = encode_query(query)
+            embedding_cache.set(key, vector)
+        return vector
+
+def embed_queries(queries) -> np.ndarray:
+    """Embed many queries at once; only cache misses go through the model, in one batch."""
+    queries = [normalize_query(q) for q in queries]
+    if not QUERY_CACHE_ENABLED:
+        with span("query_embed", queries=len(queries)):
+            return encode_texts(queries)
+    keys = [make_key(EMBED_MODEL_LOCAL, q) for q in queries]
+    vectors = [embedding_cache.get(key) for key in keys]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        with span("query_embed", queries=len(missing)):
+            encoded = encode_texts([queries[i] for i in missing])
+        for i, vector in zip(missing, encoded):
+            vectors[i] = vector
+            embedding_cache.set(keys[i], vector)
+    return np.stack(vectors).astype("float32") if vectors else np.zeros((0, EMBED_DIM), dtype="float32")
+
+def full_vectors():
+    """
+    Full-precision rows kept beside a compressed index, or None when there are
+    none or rescoring is off. Shards re-score their own results.
+    """
+    if RESCORE_CANDIDATES <= 0 or SHARD_COUNT:
+        return None
+    bundle = active_bundle()
+    path = bundle.vectors_path if bundle is not None else FULL_VECTORS_PATH
+    if path is None or file_generation(path) is None:
+        return None
+    store = get_vector_store(path)
+    return store if len(store) else None
 
-    chunks = load_chunks()
+def _shortlist(k: int, store) -> int:
+    """How many candidates to fetch from the index: RESCORE_CANDIDATES when rescoring, else k."""
+    return max(k, RESCORE_CANDIDATES) if store is not None else k
 
-    # If a medical report is uploaded, use extracted keywords for query enrichment
-    if report_text:
-        keywords = re.findall(r"\b[A-Z][a-z]+(?:\s[A-Z][a-z]+)*\b", report_text)
-        keywords = list(set([k for k in keywords if len(k) > 3]))
-        if keywords:
-            query = " ".join(keywords[:30])
+def rescore(query_vector, hits, k: int, store):
+    """
+    Re-rank a shortlist from a compressed index by exact L2 against the
+    full-precision rows, so distances are on the same scale as a Flat index.
+    Hits are cut to k unchanged when any row has no full-precision vector.
+    """
+    if store is None or not hits:
+        return hits[:k]
+    rows = np.fromiter((row for row, _ in hits), dtype="int64", count=len(hits))
+    if rows.max() >= len(store):
+        return hits[:k]
+    with span("rescore", candidates=len(rows)):
+        distances = store.distances(query_vector, rows)
+        order = np.argsort(distances, kind="stable")[:k]
+    return [(int(rows[i]), float(distances[i])) for i in order]
 
-    # Embed query and retrieve top-k chunks
+def dense_search_batch(queries, k: int):
+    """One FAISS search call for many queries. Returns a [(row, L2 distance)] list per query."""
+    index = get_index()
+    if index is None or not queries:
+        return [[] for _ in queries]
+    vectors = embed_queries(queries)
+    store = full_vectors()
+    fetch = _shortlist(k, store)
+    with span("faiss_search", queries=len(queries), k=fetch):
+        distances, indices = index.search(vectors, fetch)
+    return [
+        rescore(vector, [(int(idx), float(dist)) for idx, dist in zip(row_ids, row_dists) if idx != -1], k, store)
+        for vector, row_ids, row_dists in zip(vectors, indices, distances)
+    ]
+
+def dense_search(query: str, k: int):
+    """FAISS search, re-scored in full precision for compressed indexes. Returns [(row, L2 distance)] best first."""
+    index = get_index()
+    if index is None:
+        return []
     q_emb = embed_query(query).reshape(1, -1)
-    distances, indices = index.search(q_emb, k)
-
-    selected_chunks, sources, total_distance = [], set(), 0.0
-
-    for i, idx in enumerate(indices[0]):
-        if idx == -1:
-            continue
-        total_distance += distances[0][i]
-        obj = chunks[idx]
-        topic = obj.get("topic_title", "General")
-        section = obj.get("section", "Unknown Section")
-        text = obj.get("text", "").strip().replace("\n", " ")
-        srcs = obj.get("sources", ["Unknown"])
-        sources.update(srcs)
-        selected_chunks.append(f"[{topic} - {section}]\n{text}\n")
+    store = full_vectors()
+    fetch = _shortlist(k, store)
+    with span("faiss_search", k=fetch):
+        distances, indices = index.search(q_emb, fetch)
+    hits = [(int(idx), float(dist)) for idx, dist in zip(indices[0], distances[0]) if idx != -1]
+    return rescore(q_emb[0], hits, k, store)
+
+def sparse_search(query: str, k: int):
+    """BM25 search. Returns [(row, score)] best first, or [] if no sparse index was built."""
+    sparse = get_sparse_index()
+    if sparse is None:
+        return []
+    with span("bm25_search", k=k):
+        return sparse.search(query, k)
+
+def fuse_results(dense_hits, sparse_hits, k: int, method: str = FUSION_METHOD):
+    """Merge dense and sparse rankings with reciprocal-rank fusion or weighted normalized scores."""
+    scores = {}
+    if method == "weighted":
+        def normalized(values):
+            lo, hi = min(values), max(values)
+            return [(v - lo) / (hi - lo) if hi > lo else 1.0 for v in values]
+        if dense_hits:
+            # Lower distance is better, so negate before normalizing
+            for (row, _), s in zip(dense_hits, normalized([-d for _, d in dense_hits])):
+                scores[row] = scores.get(row, 0.0) + HYBRID_DENSE_WEIGHT * s
+        if sparse_hits:
+            for (row, _), s in zip(sparse_hits, normalized([b for _, b in sparse_hits])):
+                scores[row] = scores.get(row, 0.0) + (1 - HYBRID_DENSE_WEIGHT) * s
+    else:
+        for hits in (dense_hits, sparse_hits):
+            for rank, (row, _) in enumerate(hits):
+                scores[row] = scores.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+def search_chunks(query: str, k: int = TOP_K, mode: str = RETRIEVAL_MODE):
+    """
+    Retrieve chunk rows for a query in 'dense', 'sparse' or 'hybrid' mode.
+    Returns (rows, dense distances of the dense top-k or None in sparse mode).
+    Only in dense mode does distances[i] belong to rows[i]; hybrid rows are
+    fused and keep the dense list's distances as a quality signal.
+    Hybrid falls back to dense when no sparse index has been built.
+    """
+    if mode == "sparse":
+        return [row for row, _ in sparse_search(query, k)], None
+
+    if mode == "hybrid":
+        candidates = max(k, HYBRID_CANDIDATES)
+        dense_hits = dense_search(query, candidates)
+        sparse_hits = sparse_search(query, candidates)
+        return fuse_results(dense_hits, sparse_hits, k), [d for _, d in dense_hits[:k]]
+
+    dense_hits = dense_search(query, k)
+    return [row for row, _ in dense_hits], [d for _, d in dense_hits]
+
+def search_chunks_batch(queries, k: int = TOP_K, mode: str = RETRIEVAL_MODE):
+    """search_chunks for many queries, with the dense part done as one batched FAISS search."""
+    if mode == "sparse":
+        return [search_chunks(query, k, mode) for query in queries]
+
+    if mode == "hybrid":
+        candidates = max(k, HYBRID_CANDIDATES)
+        results = []
+        for query, dense_hits in zip(queries, dense_search_batch(queries, candidates)):
+            sparse_hits = sparse_search(query, candidates)
+            results.append((fuse_results(dense_hits, sparse_hits, k), [d for _, d in dense_hits[:k]]))
+        return results
+
+    return [([row for row, _ in hits], [d for _, d in hits]) for hits in dense_search_batch(queries, k)]
+
+def rerank_rows(query: str, rows, distances, k: int, aligned: bool = True):
+    """
+    Rescore over-fetched rows with the cross-encoder and keep the best k.
+    Returns (rows, distances, scores); scores is None when the dense top-1 was
+    already decisive and the candidates were just cut to k. `aligned` says
+    distances[i] is rows[i]'s own (dense mode); otherwise the decisiveness
+    shortcut is skipped and distances are only cut to k, never permuted.
+    """
+    if (aligned and reranker.is_decisive(distances)) or len(rows) <= 1:
+        reranker.record_skip()
+        return rows[:k], distances[:k] if distances is not None else None, None
+
+    chunks = chunk_store()
+    keep = [i for i, row in enumerate(rows) if row < len(chunks)]
+    scores = reranker.score(query, [chunks.get(int(rows[i])).get("text", "") for i in keep])
+    order = [keep[j] for j in np.argsort(-scores, kind="stable")[:k]]
+    if aligned and distances is not None:
+        distances = [distances[i] for i in order]
+    elif distances is not None:
+        distances = distances[:k]
+    return [int(rows[i]) for i in order], distances, sorted((float(s) for s in scores), reverse=True)[:k]
+
+def retrieve_rows(query: str, k: int = TOP_K, mode: str = RETRIEVAL_MODE):
+    """search_chunks, over-fetching RERANK_CANDIDATES and reranking when enabled. Returns (rows, distances, scores)."""
+    if not RERANK_ENABLED:
+        rows, distances = search_chunks(query, k, mode)
+        return rows, distances, None
+    rows, distances = search_chunks(query, max(k, RERANK_CANDIDATES), mode)
+    return rerank_rows(query, rows, distances, k, aligned=mode == "dense")
+
+def get_relevant_context(query: str, k: int = TOP_K, session_id: str = None, mode: str = RETRIEVAL_MODE,
+                         return_ids: bool = False, token_budget: int = None):
+    """
+    Retrieve the most relevant document chunks for a given query (cached).
+    With session_id, chunks from that session's uploaded documents are merged in.
+    With token_budget, the context is de-duplicated, MMR-ordered and packed to
+    that many tokens (uploaded chunks get at most half).
+    Returns (context, sources), or (context, sources, chunk_ids) with return_ids=True.
+    """
+    with span("retrieval", k=k, mode=mode):
+        session = _session_context(query, k, session_id, token_budget // 2 if token_budget else None) \
+            if session_id else None
+        global_budget = token_budget - session[3] if token_budget and session else token_budget
+
+        context, sources, chunk_ids = _cached_context(query, k, mode, global_budget)
+    if session and session[0]:
+        session_context, session_sources, session_ids, _ = session
+        context = f"{session_context}\n\n{context}" if context else session_context
+        sources = list(dict.fromkeys(session_sources + list(sources)))
+        chunk_ids = list(chunk_ids) + session_ids
+    if return_ids:
+        return context, list(sources), list(chunk_ids)
+    return context, list(sources)
+
+def get_relevant_contexts(queries, k: int = TOP_K, mode: str = RETRIEVAL_MODE, token_budget: int = None):
+    """
+    Batch get_relevant_context for many queries (cached, return_ids form).
+    Cache misses are embedded together and searched with one FAISS call.
+    """
+    queries = list(queries)
+    results = [None] * len(queries)
+    keys = [None] * len(queries)
+    if QUERY_CACHE_ENABLED:
+        generation = _check_generation()
+        for i, query in enumerate(queries):
+            keys[i] = _context_key(query, k, mode, generation, token_budget)
+            results[i] = result_cache.get(keys[i])
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing and (get_index() is not None or get_sparse_index() is not None):
+        fetch = max(k, RERANK_CANDIDATES) if RERANK_ENABLED else k
+        searched = search_chunks_batch([queries[i] for i in missing], fetch, mode)
+        for i, (rows, distances) in zip(missing, searched):
+            scores = None
+            if RERANK_ENABLED:
+                rows, distances, scores = rerank_rows(queries[i], rows, distances, k, aligned=mode == "dense")
+            results[i] = build_context(rows, distances, queries[i], token_budget, scores)
+            if keys[i] is not None:
+                result_cache.set(keys[i], results[i])
+    for i in missing:
+        if results[i] is None:
+            results[i] = ("", [], [])
+    return [(context, list(sources), list(chunk_ids)) for context, sources, chunk_ids in results]
+
+def _context_key(query: str, k: int, mode: str, generation, token_budget: int = None):
+    return make_key("context", normalize_query(query), k, mode, generation, token_budget,
+                    RERANK_MODEL if RERANK_ENABLED else None)
+
+def _session_context(query: str, k: int, session_id: str, token_budget: int = None):
+    """Best-matching uploaded-document chunks (up to k // 2) as (context, sources, chunk_ids, tokens)."""
+    session = get_session(session_id)
+    if session is None:
+        return "", [], [], 0
+    query_vector = embed_query(query)
+    hits = session.search(query_vector, max(1, k // 2))
+    if not hits:
+        return "", [], [], 0
+
+    blocks = [
+        {
+            "header": f"[Uploaded: {chunk['filename']}]",
+            "text": chunk["text"].strip().replace("\n", " "),
+            "sources": [chunk["filename"]],
+            # Session chunks are keyed by session so cached answers never cross sessions
+            "row": f"{session_id}:{position}",
+            "vector": session.index.reconstruct(position)
+        }
+        for position, chunk, _ in hits
+    ]
+    used = 0
+    if CONTEXT_BUILDER_ENABLED and token_budget:
+        blocks, used = assemble(blocks, token_budget, query_vector)
+    sources = list(dict.fromkeys(src for b in blocks for src in b["sources"]))
+    return join_blocks(blocks), sources, [b["row"] for b in blocks], used
+
+def _check_generation():
+    """Clear the result cache when the index files change; returns the current generation."""
+    global _cached_generation
+    generation = index_generation()
+    if _cached_generation is not None and generation != _cached_generation:
+        result_cache.clear()
+    _cached_generation = generation
+    return generation
+
+def _cached_context(query: str, k: int, mode: str, token_budget: int = None):
+    if not QUERY_CACHE_ENABLED:
+        return _get_relevant_context(query, k, mode, token_budget)
+
+    generation = _check_generation()
+    key = _context_key(query, k, mode, generation, token_budget)
+    result = result_cache.get(key)
+    if result is None:
+        result = _get_relevant_context(query, k, mode, token_budget)
+        result_cache.set(key, result)
+    return result
+
+def _get_relevant_context(query: str, k: int, mode: str, token_budget: int = None):
+    """Uncached retrieval. Returns (context, sources, chunk_ids); context is empty when weak."""
+    if get_index() is None and get_sparse_index() is None:
+        return "", [], []
+
+    # Retrieve top-k chunk rows (dense, sparse or fused, optionally reranked)
+    rows, distances, scores = retrieve_rows(query, k, mode)
+    return build_context(rows, distances, query, token_budget, scores)
+
+def build_context(rows, distances, query: str = None, token_budget: int = None, scores=None):
+    """
+    Turn retrieved rows into (context, sources, chunk_ids); context is empty when weak.
+    With rerank scores, weakness is judged by the best score instead of distances.
+    With token_budget, strong contexts are assembled by utils.context_builder.
+    """
+    blocks = []
+    with span("chunk_load", rows=len(rows)):
+        chunks = chunk_store()
+        for idx in rows:
+            if idx >= len(chunks):
+                continue
+            obj = chunks.get(int(idx))
+            topic = obj.get("topic_title", "General")
+            section = obj.get("section", "Unknown Section")
+            blocks.append({
+                "row": int(idx),
+                "header": f"[{topic} - {section}]",
+                "text": obj.get("text", "").strip().replace("\n", " "),
+                "sources": obj.get("sources", ["Unknown"])
+            })
+
+    sources = list(dict.fromkeys(src for b in blocks for src in b["sources"]))
+    selected_chunks = [render(b) for b in blocks]
+
+    # Reranked candidates: the cross-encoder score replaces the distance cutoff
+    if scores is not None:
+        if not selected_chunks or max(scores) < RERANK_MIN_SCORE:
+            print(f"RAG context weak (rerank score {max(scores, default=0.0):.3f}) — fallback to web search.")
+            weak_contexts.inc()
+            return "", sources, []
+        return _pack(blocks, query, token_budget)
+
+    # Sparse-only retrieval has no distance signal; keyword hits count as relevant
+    if distances is None:
+        if not selected_chunks:
+            return "", sources, []
+        return _pack(blocks, query, token_budget)
 
     # Calculate average similarity (lower distance = better match)
-    avg_distance = total_distance / max(len(selected_chunks), 1)
+    avg_distance = sum(distances) / max(len(distances), 1)
     print(f"RAG average similarity distance: {avg_distance:.3f}")
 
     # Relevance threshold check
@@ -87,7 +468,8 @@ def get_relevant_context(query: str, k: int = TOP_K, report_text: str = None):
     # - > 0.55: Weak, trigger web search
     if avg_distance > 0.5 or not selected_chunks:
         print(f"RAG context weak (distance {avg_distance:.3f}) — fallback to web search.")
-        return "", list(sources)
+        weak_contexts.inc()
+        return "", sources, []
 
     # Basic filter to ensure medical relevance
     medical_keywords = [
@@ -97,8 +479,23 @@ def get_relevant_context(query: str, k: int = TOP_K, report_text: str = None):
     context_preview = " ".join(selected_chunks[:3]).lower()
     if not any(word in context_preview for word in medical_keywords) and avg_distance > 0.55:
         print("Context not medically relevant — switching to web search.")
-        return "", list(sources)
+        weak_contexts.inc()
+        return "", sources, []
+
+    return _pack(blocks, query, token_budget)
+
+def _pack(blocks, query: str = None, token_budget: int = None):
+    """Combine selected chunks, budgeted and de-duplicated when a token budget is given."""
+    if CONTEXT_BUILDER_ENABLED and token_budget and blocks:
+        index = get_index()
+        vectors = reconstruct_rows(index, [b["row"] for b in blocks]) if index is not None else None
+        query_vector = None
+        if vectors is not None:
+            for block, vector in zip(blocks, vectors):
+                block["vector"] = vector
+            query_vector = embed_query(query) if query else None
+        with span("context_assembly", budget=token_budget):
+            blocks, _ = assemble(blocks, token_budget, query_vector)
 
-    # Combine selected chunks
-    combined_context = "\n\n".join(selected_chunks)
-    return combined_context, list(sources)
+    sources = list(dict.fromkeys(src for b in blocks for src in b["sources"]))
+    return join_blocks(blocks), sources, [b["row"] for b in blocks]
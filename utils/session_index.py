@@ -0,0 +1,102 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import faiss
+from models.embedding_service import encode_texts
+from utils.chunking import chunk_text
+from config.config import (
+    EMBED_DIM,
+    SESSION_IDLE_TTL,
+    SESSION_MAX,
+    SESSION_MAX_DISTANCE
+)
+
+# Per-session, in-memory vector indexes for documents uploaded in the app.
+# Each document is chunked and embedded once when it is added; every chat
+# turn then only searches the (small) session index with the user's query.
+# Sessions idle for SESSION_IDLE_TTL seconds, or beyond the SESSION_MAX most
+# recently used, are evicted.
+
+
+class SessionIndex:
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.index = faiss.IndexFlatL2(EMBED_DIM)
+        self.chunks = []
+        self.documents = {}      # sha256 -> filename
+        self.last_used = time.time()
+        self._lock = threading.Lock()
+
+    def add_document(self, filename: str, text: str) -> int:
+        """Chunk and embed a document once. Returns the number of chunks added (0 if already present)."""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            if digest in self.documents:
+                return 0
+        chunks = [c for c in chunk_text(text, filename) if c["text"]]
+        if not chunks:
+            return 0
+        vectors = encode_texts([c["text"] for c in chunks])
+        with self._lock:
+            # A concurrent upload of the same document may have finished while this one was embedding
+            if digest in self.documents:
+                return 0
+            self.index.add(vectors)
+            self.chunks.extend(chunks)
+            self.documents[digest] = filename
+            self.last_used = time.time()
+        return len(chunks)
+
+    def search(self, query_vector: np.ndarray, k: int, max_distance: float = SESSION_MAX_DISTANCE):
+        """Return [(position, chunk, L2 distance)] best first, keeping hits within max_distance."""
+        with self._lock:
+            self.last_used = time.time()
+            if not self.chunks:
+                return []
+            distances, indices = self.index.search(query_vector.reshape(1, -1), min(k, len(self.chunks)))
+            return [(int(i), self.chunks[i], float(d)) for i, d in zip(indices[0], distances[0])
+                    if i != -1 and d <= max_distance]
+
+
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def _evict_idle():
+    now = time.time()
+    for session_id in [sid for sid, s in _sessions.items() if now - s.last_used > SESSION_IDLE_TTL]:
+        del _sessions[session_id]
+    while len(_sessions) > SESSION_MAX:
+        _sessions.popitem(last=False)
+
+
+def get_session(session_id: str, create: bool = False):
+    """Return the session's index (creating it if asked), or None."""
+    with _sessions_lock:
+        _evict_idle()
+        session = _sessions.get(session_id)
+        if session is None and create:
+            session = _sessions[session_id] = SessionIndex(session_id)
+        if session is not None:
+            session.last_used = time.time()
+            _sessions.move_to_end(session_id)
+        return session
+
+
+def add_to_session(session_id: str, filename: str, text: str) -> int:
+    return get_session(session_id, create=True).add_document(filename, text)
+
+
+def drop_session(session_id: str):
+    with _sessions_lock:
+        _sessions.pop(session_id, None)
+
+
+def session_stats() -> dict:
+    with _sessions_lock:
+        return {
+            "sessions": len(_sessions),
+            "chunks": sum(len(s.chunks) for s in _sessions.values())
+        }
@@ -0,0 +1,607 @@
+import os
+import json
+import zlib
+import time
+import shutil
+import socket
+import secrets
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Listener, Connection, answer_challenge, deliver_challenge
+import numpy as np
+import faiss
+from utils.chunk_store import ChunkStore, get_chunk_store, file_generation
+from utils.vector_store import VectorStore, write_vectors
+from utils.metrics import counter
+from models.ann_index import build_ann_index, apply_search_params, reconstruct_rows, is_compressed, describe_storage
+from config.config import (
+    CHUNKS_PATH,
+    FAISS_INDEX_PATH,
+    FULL_VECTORS_PATH,
+    FAISS_INDEX_TYPE,
+    FAISS_MMAP,
+    RESCORE_CANDIDATES,
+    SHARD_COUNT,
+    SHARD_BY,
+    SHARD_WORKERS,
+    SHARD_ENDPOINTS,
+    SHARD_AUTHKEY,
+    SHARD_TIMEOUT,
+    SHARD_DIR
+)
+
+# Sharded dense retrieval. The builder partitions the live rows of the chunk
+# store into SHARD_COUNT shards, by chunk hash or by whole file, each in its
+# own directory under SHARD_DIR:
+#   index.faiss   FAISS index whose IDs are global chunk-store rows
+#   chunks.jsonl  the shard's chunk records, in row order
+#   rows.npy      global row of each local record (ascending)
+#   vectors.f32   full-precision rows for rescoring, when the index is compressed
+#   shard.json    build ID and row count, checked against the manifest on load
+# plus manifest.json and shard_of.npy (shard of every global row, -1 if dead).
+# ShardedIndex searches all shards at once from a thread pool (FAISS releases
+# the GIL) and merges the top-k by distance; it quacks like a FAISS index, so
+# rag_search uses it unchanged. ShardedChunkStore serves records from the
+# shard that holds them. With SHARD_ENDPOINTS, shards live in separate
+# processes (`python -m utils.shards serve`) and are called over a small
+# authenticated RPC (multiprocessing.connection); results are the same.
+# That RPC unpickles every message, so anyone holding SHARD_AUTHKEY can run
+# code on a shard server: the key has no default, and servers belong on a
+# trusted network only. A server that does not answer within SHARD_TIMEOUT
+# is skipped with a warning and the other shards' results are merged.
+
+MANIFEST_FILE = "manifest.json"
+SHARD_OF_FILE = "shard_of.npy"
+SHARD_INFO_FILE = "shard.json"
+
+shard_errors = counter("shard_errors_total", "Shard searches that failed or timed out and were skipped")
+
+
+def _require_authkey(authkey: str) -> bytes:
+    if not authkey:
+        raise ValueError("SHARD_AUTHKEY is not set. Shard servers unpickle what clients send, so set the same "
+                         "long random secret on every server and the app before using them.")
+    return authkey.encode()
+
+
+def shard_path(root: str, shard: int) -> str:
+    return os.path.join(root, f"shard_{shard:03d}")
+
+
+def assign_shards(records, n_shards: int, by: str = SHARD_BY) -> tuple:
+    """
+    (rows, shards) arrays for (row, record) pairs. `hash` spreads chunks by a
+    stable hash of filename and chunk_id; `file` keeps every document on one
+    shard, placing the largest documents first on the least-loaded shard.
+    """
+    rows, shards = [], []
+    if by == "hash":
+        for row, record in records:
+            rows.append(row)
+            shards.append(zlib.crc32(f"{record.get('filename', '')}:{record.get('chunk_id', row)}".encode())
+                          % n_shards)
+        return np.asarray(rows, dtype="int64"), np.asarray(shards, dtype="int32")
+    if by != "file":
+        raise ValueError(f"Unknown SHARD_BY '{by}'. Choose from: hash, file")
+
+    files = []
+    for row, record in records:
+        rows.append(row)
+        files.append(record.get("filename", ""))
+    sizes = {}
+    for filename in files:
+        sizes[filename] = sizes.get(filename, 0) + 1
+    load, placed = [0] * n_shards, {}
+    for filename in sorted(sizes, key=lambda f: (-sizes[f], f)):
+        target = load.index(min(load))
+        placed[filename] = target
+        load[target] += sizes[filename]
+    return np.asarray(rows, dtype="int64"), np.asarray([placed[f] for f in files], dtype="int32")
+
+
+def _live_vectors(index, rows: np.ndarray, vectors_path: str) -> np.ndarray:
+    """Full-precision vectors for `rows`: from the rescoring file when it covers them, else the index."""
+    if os.path.exists(vectors_path):
+        store = VectorStore(vectors_path)
+        if len(rows) and len(store) > rows.max():
+            return store.get_many(rows)
+    vectors = reconstruct_rows(index, rows)
+    if vectors is None:
+        raise RuntimeError("The index cannot return its vectors; rebuild it so full-precision vectors are kept.")
+    return vectors
+
+
+def save_shard(path: str, index, rows: np.ndarray, records=None, vectors: np.ndarray = None, build: str = None):
+    """Write one shard directory (records and vectors are optional)."""
+    os.makedirs(path, exist_ok=True)
+    faiss.write_index(index, os.path.join(path, "index.faiss"))
+    np.save(os.path.join(path, "rows.npy"), np.asarray(rows, dtype="int64"))
+    with open(os.path.join(path, SHARD_INFO_FILE), "w", encoding="utf-8") as f:
+        json.dump({"build": build, "rows": len(rows)}, f)
+    if records is not None:
+        with open(os.path.join(path, "chunks.jsonl"), "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+    if vectors is not None:
+        write_vectors(vectors, os.path.join(path, "vectors.f32"))
+
+
+def build_shards(n_shards: int = SHARD_COUNT, by: str = SHARD_BY, chunks_path: str = CHUNKS_PATH,
+                 index_path: str = FAISS_INDEX_PATH, vectors_path: str = FULL_VECTORS_PATH,
+                 index_type: str = FAISS_INDEX_TYPE, root: str = SHARD_DIR) -> dict:
+    """
+    Split the live rows of the built index into `n_shards` shards and publish
+    them under `root`. Vectors are taken from the index (or the rescoring
+    file), so nothing is re-embedded.
+    """
+    if n_shards < 1:
+        raise ValueError("Sharding needs at least one shard (set SHARD_COUNT or --shards).")
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"FAISS index not found at {index_path}; build it before sharding.")
+    start = time.perf_counter()
+    index = faiss.read_index(index_path)
+    store = get_chunk_store(chunks_path)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        live = np.sort(faiss.vector_to_array(index.id_map))
+    else:
+        live = np.arange(index.ntotal, dtype="int64")
+    rows, shards = assign_shards(((int(row), store.get(int(row))) for row in live), n_shards, by)
+    counts = np.bincount(shards, minlength=n_shards)
+    if not counts.all():
+        raise ValueError(f"{int((counts == 0).sum())} of {n_shards} shards would be empty; "
+                         f"use fewer shards or SHARD_BY=hash.")
+
+    build = f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(4)}"
+    tmp_root = root + ".tmp"
+    shutil.rmtree(tmp_root, ignore_errors=True)
+    for shard in range(n_shards):
+        mine = rows[shards == shard]
+        vectors = _live_vectors(index, mine, vectors_path)
+        save_shard(shard_path(tmp_root, shard), build_ann_index(vectors, index_type, ids=mine), mine,
+                   [store.get(int(row)) for row in mine], vectors if is_compressed(index_type) else None, build)
+
+    shard_of = np.full(len(store), -1, dtype="int32")
+    shard_of[rows] = shards
+    np.save(os.path.join(tmp_root, SHARD_OF_FILE), shard_of)
+    manifest = {
+        "build": build,
+        "shards": n_shards,
+        "by": by,
+        "index_type": index_type,
+        "storage": describe_storage(index_type),
+        "rows": len(store),
+        "shard_rows": counts.tolist(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    with open(os.path.join(tmp_root, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap the whole directory in; open mmaps of the old shards stay valid on POSIX
+    old_root = root + ".old"
+    shutil.rmtree(old_root, ignore_errors=True)
+    if os.path.exists(root):
+        os.replace(root, old_root)
+    os.replace(tmp_root, root)
+    shutil.rmtree(old_root, ignore_errors=True)
+
+    print(f"Built {n_shards} shards by {by} in {time.perf_counter() - start:.1f}s: {counts.tolist()} rows")
+    return {"path": root, **manifest}
+
+
+# Re-splits requested by incremental ingestion run on one background thread;
+# requests that arrive during a build coalesce into a single follow-up build
+_rebuild_requested = threading.Event()
+_rebuild_thread = None
+_rebuild_thread_lock = threading.Lock()
+
+
+def _rebuild_loop():
+    while True:
+        _rebuild_requested.wait()
+        _rebuild_requested.clear()
+        try:
+            build_shards()
+        except Exception as e:
+            print(f"[Error] Background shard rebuild failed: {e}")
+
+
+def request_rebuild():
+    """Schedule build_shards() on the background rebuild thread and return at once."""
+    global _rebuild_thread
+    _rebuild_requested.set()
+    with _rebuild_thread_lock:
+        if _rebuild_thread is None:
+            _rebuild_thread = threading.Thread(target=_rebuild_loop, name="shard-rebuild", daemon=True)
+            _rebuild_thread.start()
+
+
+class LocalShard:
+    """One shard in this process: its index (IDs are global rows) and, when loaded from disk, records and vectors."""
+
+    def __init__(self, index, rows: np.ndarray, chunks: ChunkStore = None, vectors: VectorStore = None,
+                 build: str = None):
+        self.index = index
+        self.rows = np.asarray(rows, dtype="int64")
+        self.chunks = chunks
+        self.vectors = vectors
+        self.build = build
+        apply_search_params(self.index)
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.index.ntotal)
+
+    def info(self) -> dict:
+        return {"build": self.build, "rows": self.ntotal}
+
+    def _local(self, rows) -> np.ndarray:
+        """Local positions of global rows; IndexError for any row this shard does not hold."""
+        rows = np.asarray(rows, dtype="int64")
+        pos = np.searchsorted(self.rows, rows)
+        held = pos < len(self.rows)
+        held[held] = self.rows[pos[held]] == rows[held]
+        if not held.all():
+            raise IndexError(f"Rows {rows[~held][:5].tolist()} are not in this shard (build {self.build})")
+        return pos
+
+    def search(self, queries: np.ndarray, k: int):
+        """(distances, global rows) like faiss; compressed shards re-score a RESCORE_CANDIDATES shortlist in fp32."""
+        fetch = max(k, RESCORE_CANDIDATES) if self.vectors is not None and RESCORE_CANDIDATES > 0 else k
+        distances, ids = self.index.search(queries, fetch)
+        if fetch == k:
+            return distances, ids
+        out_distances = np.full((len(queries), k), np.finfo("float32").max, dtype="float32")
+        out_ids = np.full((len(queries), k), -1, dtype="int64")
+        for i, (query, found) in enumerate(zip(queries, ids)):
+            found = found[found != -1]
+            exact = self.vectors.distances(query, self._local(found))
+            order = np.argsort(exact, kind="stable")[:k]
+            out_distances[i, :len(order)] = exact[order]
+            out_ids[i, :len(order)] = found[order]
+        return out_distances, out_ids
+
+    def get_many(self, rows) -> list:
+        return [self.chunks.get(int(local)) for local in self._local(rows)]
+
+    def reconstruct(self, rows) -> np.ndarray:
+        if self.vectors is not None:
+            return self.vectors.get_many(self._local(rows))
+        vectors = reconstruct_rows(self.index, rows)
+        if vectors is None:
+            raise RuntimeError("This shard's index cannot reconstruct vectors.")
+        return vectors
+
+
+def load_shard(path: str) -> LocalShard:
+    """Open a shard directory, memory-mapping the index with FAISS_MMAP."""
+    index_file = os.path.join(path, "index.faiss")
+    index = None
+    if FAISS_MMAP:
+        try:
+            index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            print(f"[Error] Could not memory-map {index_file} ({e}); loading it into memory instead.")
+    if index is None:
+        index = faiss.read_index(index_file)
+    vectors_file = os.path.join(path, "vectors.f32")
+    info_file = os.path.join(path, SHARD_INFO_FILE)
+    build = None
+    if os.path.exists(info_file):
+        with open(info_file, "r", encoding="utf-8") as f:
+            build = json.load(f).get("build")
+    return LocalShard(index, np.load(os.path.join(path, "rows.npy")), ChunkStore(os.path.join(path, "chunks.jsonl")),
+                      VectorStore(vectors_file) if os.path.exists(vectors_file) else None, build)
+
+
+class RemoteShard:
+    """
+    A shard served by `python -m utils.shards serve`; one connection per
+    calling thread. With `build`, the server refuses calls while it holds a
+    different build, so a stale server errors instead of answering for rows
+    it no longer owns.
+    """
+
+    def __init__(self, endpoint: str, authkey: str = SHARD_AUTHKEY, build: str = None,
+                 timeout: float = SHARD_TIMEOUT):
+        host, port = endpoint.rsplit(":", 1)
+        self.address = (host, int(port))
+        self.name = endpoint
+        self.authkey = _require_authkey(authkey)
+        self.build = build
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> Connection:
+        """multiprocessing.connection.Client with the connect and the handshake bounded by the timeout."""
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        sock.settimeout(None)
+        conn = Connection(sock.detach())
+        try:
+            # The server speaks first; a server that accepted but hangs never does
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"Shard {self.name} did not answer the handshake within {self.timeout}s")
+            answer_challenge(conn, self.authkey)
+            deliver_challenge(conn, self.authkey)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _call(self, method: str, *args):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        try:
+            conn.send((method, args, None if method == "info" else self.build))
+            if not conn.poll(self.timeout):
+                # Drop the connection so a late reply is never read as the answer to the next call
+                raise TimeoutError(f"Shard {self.name} did not answer '{method}' within {self.timeout}s")
+            ok, result = conn.recv()
+        except (EOFError, OSError):
+            # Reconnect on the next call (e.g. after the shard server restarts)
+            self._local.conn = None
+            conn.close()
+            raise
+        if not ok:
+            raise RuntimeError(f"Shard {self.name} failed: {result}")
+        return result
+
+    @property
+    def ntotal(self) -> int:
+        return self._call("ntotal")
+
+    def info(self) -> dict:
+        return self._call("info")
+
+    def search(self, queries: np.ndarray, k: int):
+        return self._call("search", queries, k)
+
+    def get_many(self, rows) -> list:
+        return self._call("get_many", [int(r) for r in rows])
+
+    def reconstruct(self, rows) -> np.ndarray:
+        return self._call("reconstruct", [int(r) for r in rows])
+
+
+class _ServedShard:
+    """The shard a server answers for, reloaded when a rebuild replaces its directory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._generation = file_generation(os.path.join(path, SHARD_INFO_FILE))
+        self.shard = load_shard(path)
+
+    def current(self) -> LocalShard:
+        generation = file_generation(os.path.join(self.path, SHARD_INFO_FILE))
+        # None while a rebuild swaps the directory; keep answering from the old shard
+        if generation is not None and generation != self._generation:
+            with self._lock:
+                if generation != self._generation:
+                    self.shard = load_shard(self.path)
+                    self._generation = generation
+                    print(f"Shard {self.path} reloaded: build {self.shard.build}, {self.shard.ntotal} vectors",
+                          flush=True)
+        return self.shard
+
+
+def _handle(served: _ServedShard, conn):
+    with conn:
+        while True:
+            try:
+                method, args, build = conn.recv()
+            except (EOFError, OSError):
+                return
+            shard = served.current()
+            methods = {"search": shard.search, "get_many": shard.get_many, "reconstruct": shard.reconstruct,
+                       "ntotal": lambda: shard.ntotal, "info": shard.info}
+            try:
+                if build is not None and shard.build != build:
+                    raise RuntimeError(f"stale shard: serving build {shard.build}, caller expects {build}")
+                conn.send((True, methods[method](*args)))
+            except Exception as e:
+                conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+def serve(path: str, host: str = "127.0.0.1", port: int = 7100, authkey: str = SHARD_AUTHKEY):
+    """
+    Serve one shard directory until interrupted, picking up rebuilds of that
+    directory as they land. Only bind it to a trusted network: any client
+    with the authkey can run code here.
+    """
+    key = _require_authkey(authkey)
+    served = _ServedShard(path)
+    # The default backlog of 1 stalls clients that connect from several threads at once
+    with Listener((host, port), backlog=128, authkey=key) as listener:
+        print(f"Shard {path} serving {served.shard.ntotal} vectors (build {served.shard.build}) "
+              f"on {host}:{port}", flush=True)
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # A client with the wrong authkey, or one that hung up mid-handshake
+                print(f"[Error] Shard connection rejected: {e}")
+                continue
+            threading.Thread(target=_handle, args=(served, conn), daemon=True).start()
+
+
+class ShardedIndex:
+    """
+    Searches every shard in parallel and merges their top-k by distance.
+    Offers the parts of the FAISS index API that retrieval uses: search,
+    reconstruct and ntotal.
+    """
+
+    def __init__(self, shards, shard_of: np.ndarray = None, workers: int = SHARD_WORKERS):
+        self.shards = list(shards)
+        self.shard_of = shard_of
+        self._pool = ThreadPoolExecutor(max_workers=workers or len(self.shards), thread_name_prefix="shard")
+
+    @property
+    def ntotal(self) -> int:
+        return sum(self._pool.map(lambda shard: shard.ntotal, self.shards))
+
+    def _search_shard(self, i: int, queries: np.ndarray, k: int):
+        """One shard's (distances, ids), or None with a warning when it fails or times out."""
+        try:
+            return self.shards[i].search(queries, k)
+        except (EOFError, OSError, RuntimeError) as e:
+            shard_errors.inc()
+            print(f"[Error] Shard {i} skipped: {type(e).__name__}: {e}")
+            return None
+
+    def search(self, queries: np.ndarray, k: int):
+        """
+        Top-k over all shards. A shard that fails or times out is left out
+        (its rows just go missing from this result); only when every shard
+        fails is an error raised.
+        """
+        queries = np.ascontiguousarray(queries, dtype="float32")
+        if len(self.shards) == 1:
+            results = [self._search_shard(0, queries, k)]
+        else:
+            results = list(self._pool.map(lambda i: self._search_shard(i, queries, k), range(len(self.shards))))
+        results = [r for r in results if r is not None]
+        if not results:
+            raise RuntimeError(f"All {len(self.shards)} shards failed; see the errors above.")
+        if len(results) == 1:
+            return results[0]
+        distances = np.hstack([d for d, _ in results])
+        ids = np.hstack([i for _, i in results])
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distances, order, 1), np.take_along_axis(ids, order, 1)
+
+    def reconstruct(self, row: int) -> np.ndarray:
+        shard = int(self.shard_of[row]) if self.shard_of is not None and 0 <= row < len(self.shard_of) else -1
+        if shard < 0:
+            raise RuntimeError(f"Row {row} is not in any shard")
+        return np.asarray(self.shards[shard].reconstruct([row])[0], dtype="float32")
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+class ShardedChunkStore:
+    """Chunk records by global row, fetched from the shard that holds them."""
+
+    def __init__(self, shards, shard_of: np.ndarray):
+        self.shards = shards
+        self.shard_of = shard_of
+
+    def __len__(self):
+        return len(self.shard_of)
+
+    def get(self, row: int) -> dict:
+        if row < 0 or row >= len(self.shard_of) or self.shard_of[row] < 0:
+            raise IndexError(f"Chunk row {row} is not in any shard ({len(self.shard_of)} rows)")
+        return self.shards[int(self.shard_of[row])].get_many([row])[0]
+
+    def get_many(self, rows) -> list:
+        """Records for several rows in order, with one call per shard, skipping rows no shard holds."""
+        rows = [int(r) for r in rows if 0 <= int(r) < len(self.shard_of) and self.shard_of[int(r)] >= 0]
+        by_shard = {}
+        for row in rows:
+            by_shard.setdefault(int(self.shard_of[row]), []).append(row)
+        found = {}
+        for shard, shard_rows in by_shard.items():
+            found.update(zip(shard_rows, self.shards[shard].get_many(shard_rows)))
+        return [found[row] for row in rows]
+
+    def metadata(self, row: int) -> dict:
+        obj = self.get(row)
+        return {
+            "topic": obj.get("topic_title", ""),
+            "section": obj.get("section", ""),
+            "filename": obj.get("filename", "")
+        }
+
+
+# Shards of SHARD_DIR, loaded on first use and reloaded when a rebuild swaps the manifest
+_sharded = None
+_sharded_generation = None
+_sharded_lock = threading.Lock()
+
+
+def shard_generation(root: str = SHARD_DIR):
+    return file_generation(os.path.join(root, MANIFEST_FILE))
+
+
+def check_shards(shards, manifest: dict) -> bool:
+    """Compare each shard's build and row count with the manifest, printing every mismatch."""
+    ok = True
+    for i, shard in enumerate(shards):
+        try:
+            info = shard.info()
+        except (EOFError, OSError, RuntimeError) as e:
+            print(f"[Error] Shard {i} did not report its build: {e}")
+            ok = False
+            continue
+        expected = manifest["shard_rows"][i] if i < len(manifest["shard_rows"]) else None
+        if info["build"] != manifest.get("build") or info["rows"] != expected:
+            print(f"[Error] Shard {i} holds build {info['build']} with {info['rows']} rows, but the manifest "
+                  f"expects build {manifest.get('build')} with {expected}.")
+            ok = False
+    return ok
+
+
+def get_sharded(root: str = SHARD_DIR, endpoints: str = SHARD_ENDPOINTS):
+    """(ShardedIndex, ShardedChunkStore) for the current shards, or None before a sharded build."""
+    global _sharded, _sharded_generation
+    generation = shard_generation(root)
+    if generation != _sharded_generation:
+        with _sharded_lock:
+            if generation != _sharded_generation:
+                if _sharded is not None:
+                    _sharded[0].close()
+                _sharded = None
+                if generation is None:
+                    print(f"No shards found at {root}. Run `python -m utils.shards build` first.")
+                else:
+                    with open(os.path.join(root, MANIFEST_FILE), "r", encoding="utf-8") as f:
+                        manifest = json.load(f)
+                    shard_of = np.load(os.path.join(root, SHARD_OF_FILE), mmap_mode="r")
+                    if endpoints:
+                        shards = [RemoteShard(e.strip(), build=manifest.get("build"))
+                                  for e in endpoints.split(",") if e.strip()]
+                        if len(shards) != manifest["shards"]:
+                            print(f"[Error] SHARD_ENDPOINTS lists {len(shards)} servers for "
+                                  f"{manifest['shards']} shards.")
+                    else:
+                        shards = [load_shard(shard_path(root, i)) for i in range(manifest["shards"])]
+                    ok = check_shards(shards, manifest)
+                    if not ok and not endpoints:
+                        # Rows of a mismatched local shard would map to the wrong records
+                        print(f"[Error] The shards under {root} do not match their manifest; sharded retrieval "
+                              f"is off until `python -m utils.shards build` rewrites them.")
+                    else:
+                        if not ok:
+                            print("[Error] Stale shard servers refuse every call (and are skipped) until they "
+                                  "serve the current build.")
+                        print(f"Loaded {len(shards)} shards ({'remote' if endpoints else 'in-process'}) "
+                              f"from: {root}")
+                        _sharded = (ShardedIndex(shards, shard_of), ShardedChunkStore(shards, shard_of))
+                _sharded_generation = generation
+    return _sharded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the sharded index, or serve one shard over RPC.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="split the built index into shards")
+    build_parser.add_argument("--shards", type=int, default=SHARD_COUNT or 4)
+    build_parser.add_argument("--by", choices=["hash", "file"], default=SHARD_BY)
+    build_parser.add_argument("--root", default=SHARD_DIR)
+    serve_parser = commands.add_parser("serve", help="serve one shard to a remote ShardedIndex")
+    serve_parser.add_argument("--shard", type=int, help=f"shard number under {SHARD_DIR}")
+    serve_parser.add_argument("--path", help="shard directory (instead of --shard)")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=7100)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(json.dumps(build_shards(args.shards, args.by, root=args.root), indent=2))
+    else:
+        if args.path is None and args.shard is None:
+            parser.error("serve needs --shard or --path")
+        serve(args.path or shard_path(SHARD_DIR, args.shard), args.host, args.port)
@@ -0,0 +1,197 @@
+import os
+import re
+import math
+import threading
+import numpy as np
+from utils.chunk_store import file_generation
+from config.config import SPARSE_INDEX_PATH, BM25_K1, BM25_B
+
+# Compact BM25 inverted index stored as CSR arrays in one .npz:
+#   terms   — newline-joined vocabulary (sorted), bytes
+#   indptr  — postings offsets per term (len V+1)
+#   doc_ids — chunk-store rows, grouped per term
+#   tfs     — term frequency per posting
+#   doc_len — token count per row; live marks rows that are still indexed
+# Queries touch only the postings of their own terms.
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word tokens; keeps clinical terms like 'hba1c', 'vitamin-d', '2.5'."""
+    return TOKEN_RE.findall(text.lower())
+
+
+class SparseIndexBuilder:
+    """Accumulates postings one document at a time, then merges them in one pass."""
+
+    def __init__(self):
+        self.postings = {}
+        self.lengths = {}
+
+    def add(self, row: int, text: str):
+        counts = {}
+        tokens = tokenize(text)
+        for tok in tokens:
+            counts[tok] = counts.get(tok, 0) + 1
+        self.lengths[int(row)] = len(tokens)
+        for tok, tf in counts.items():
+            entry = self.postings.setdefault(tok, ([], []))
+            entry[0].append(int(row))
+            entry[1].append(tf)
+
+    def build(self):
+        index = SparseIndex()
+        index._merge(self.postings, self.lengths)
+        return index
+
+
+class SparseIndex:
+    """BM25 over chunk-store rows, backed by CSR postings arrays."""
+
+    def __init__(self, terms=None, indptr=None, doc_ids=None, tfs=None, doc_len=None, live=None):
+        self.terms = list(terms or [])
+        self.term_ids = {t: i for i, t in enumerate(self.terms)}
+        self.indptr = indptr if indptr is not None else np.zeros(1, dtype=np.int64)
+        self.doc_ids = doc_ids if doc_ids is not None else np.zeros(0, dtype=np.int64)
+        self.tfs = tfs if tfs is not None else np.zeros(0, dtype=np.float32)
+        self.doc_len = doc_len if doc_len is not None else np.zeros(0, dtype=np.float32)
+        self.live = live if live is not None else np.zeros(0, dtype=bool)
+
+    @property
+    def n_docs(self) -> int:
+        return int(self.live.sum())
+
+    def add_documents(self, rows, texts):
+        """Add (row, text) pairs, merging their postings into the CSR arrays."""
+        builder = SparseIndexBuilder()
+        for row, text in zip(rows, texts):
+            builder.add(row, text)
+        self._merge(builder.postings, builder.lengths)
+
+    def _merge(self, postings: dict, lengths: dict):
+        if not lengths:
+            return
+
+        max_row = max(lengths) + 1
+        if max_row > len(self.doc_len):
+            grow = max_row - len(self.doc_len)
+            self.doc_len = np.concatenate([self.doc_len, np.zeros(grow, dtype=np.float32)])
+            self.live = np.concatenate([self.live, np.zeros(grow, dtype=bool)])
+        for row, length in lengths.items():
+            self.doc_len[row] = length
+            self.live[row] = True
+
+        # Merge old and new postings term by term into fresh CSR arrays
+        terms = sorted(set(self.terms) | set(postings))
+        new_indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        ids_parts, tf_parts = [], []
+        for i, term in enumerate(terms):
+            count = 0
+            old = self.term_ids.get(term)
+            if old is not None:
+                lo, hi = self.indptr[old], self.indptr[old + 1]
+                ids_parts.append(self.doc_ids[lo:hi])
+                tf_parts.append(self.tfs[lo:hi])
+                count += hi - lo
+            if term in postings:
+                ids_parts.append(np.asarray(postings[term][0], dtype=np.int64))
+                tf_parts.append(np.asarray(postings[term][1], dtype=np.float32))
+                count += len(postings[term][0])
+            new_indptr[i + 1] = new_indptr[i] + count
+
+        self.terms = terms
+        self.term_ids = {t: i for i, t in enumerate(terms)}
+        self.indptr = new_indptr
+        self.doc_ids = np.concatenate(ids_parts) if ids_parts else np.zeros(0, dtype=np.int64)
+        self.tfs = np.concatenate(tf_parts) if tf_parts else np.zeros(0, dtype=np.float32)
+
+    def remove_rows(self, rows):
+        """Drop rows from scoring; their postings are skipped until the next full rebuild."""
+        rows = np.asarray([r for r in rows if 0 <= r < len(self.live)], dtype=np.int64)
+        self.live[rows] = False
+
+    def search(self, query: str, k: int) -> list:
+        """Return up to k (row, bm25 score) pairs, best first."""
+        n_docs = self.n_docs
+        if not n_docs:
+            return []
+        avgdl = float(self.doc_len[self.live].mean()) or 1.0
+
+        ids_parts, score_parts = [], []
+        for term in set(tokenize(query)):
+            t = self.term_ids.get(term)
+            if t is None:
+                continue
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            ids = self.doc_ids[lo:hi]
+            mask = self.live[ids]
+            ids, tf = ids[mask], self.tfs[lo:hi][mask]
+            if not len(ids):
+                continue
+            df = len(ids)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[ids] / avgdl)
+            ids_parts.append(ids)
+            score_parts.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+
+        if not ids_parts:
+            return []
+        unique, inverse = np.unique(np.concatenate(ids_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(unique[i]), float(scores[i])) for i in top]
+
+    def save(self, path: str = SPARSE_INDEX_PATH):
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            terms=np.frombuffer("\n".join(self.terms).encode("utf-8"), dtype=np.uint8),
+            indptr=self.indptr,
+            doc_ids=self.doc_ids,
+            tfs=self.tfs,
+            doc_len=self.doc_len,
+            live=self.live
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = SPARSE_INDEX_PATH):
+        with np.load(path) as data:
+            raw = data["terms"].tobytes().decode("utf-8")
+            return cls(
+                terms=raw.split("\n") if raw else [],
+                indptr=data["indptr"],
+                doc_ids=data["doc_ids"],
+                tfs=data["tfs"],
+                doc_len=data["doc_len"],
+                live=data["live"]
+            )
+
+
+def build_sparse_index(rows, texts, path: str = SPARSE_INDEX_PATH) -> SparseIndex:
+    """Build and save a sparse index from scratch."""
+    builder = SparseIndexBuilder()
+    for row, text in zip(rows, texts):
+        builder.add(row, text)
+    index = builder.build()
+    index.save(path)
+    return index
+
+
+_sparse = None
+_sparse_generation = None
+_sparse_lock = threading.Lock()
+
+
+def get_sparse_index(path: str = SPARSE_INDEX_PATH):
+    """Return the persisted sparse index, reloading it when the file changes."""
+    global _sparse, _sparse_generation
+    generation = file_generation(path)
+    if generation != _sparse_generation:
+        with _sparse_lock:
+            if generation != _sparse_generation:
+                _sparse = SparseIndex.load(path) if generation is not None else None
+                _sparse_generation = generation
+    return _sparse
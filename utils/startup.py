@@ -0,0 +1,107 @@
+import time
+import threading
+import importlib
+from config.config import RETRIEVAL_MODE, RERANK_ENABLED
+
+# Deferred initialization for the Streamlit app. The app renders its first
+# page with only streamlit and config imported; the retrieval and LLM stack
+# is imported where it is first used. warm_up() does that work ahead of time
+# on a background thread: import the stack, load the embedding model (and
+# run one forward pass), the FAISS index, the chunk store, the full-precision
+# vectors of a compressed index and, when used, the sparse index and the
+# cross-encoder. Loaders are process-wide and guarded
+# by locks, so a query that arrives mid-warm-up waits for the same load
+# instead of starting a second one.
+
+# Modules the request path needs, in the order they are imported
+STACK_MODULES = ("numpy", "faiss", "httpx", "utils.rag_search", "models.llm", "utils.orchestrator",
+                 "utils.web_search")
+
+_status = {"state": "idle", "steps": {}, "errors": {}, "seconds": 0.0}
+_status_lock = threading.Lock()
+_thread = None
+
+
+def _step(name: str, fn):
+    start = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        print(f"[Error] Warm-up step '{name}' failed: {e}")
+        with _status_lock:
+            _status["errors"][name] = str(e)
+    with _status_lock:
+        _status["steps"][name] = round(time.perf_counter() - start, 4)
+
+
+def _load_stack():
+    for module in STACK_MODULES:
+        importlib.import_module(module)
+
+
+def _load_model():
+    from models.embedding_service import get_embedding_model, encode_texts
+    get_embedding_model()
+    encode_texts(["warm up"])     # the first forward pass allocates buffers and is much slower
+
+
+def _load_index():
+    from utils.rag_search import get_index
+    get_index()
+
+
+def _load_chunks():
+    from utils.rag_search import chunk_store
+    len(chunk_store())
+
+
+def _load_vectors():
+    from utils.rag_search import full_vectors
+    full_vectors()
+
+
+def _load_sparse():
+    from utils.sparse_index import get_sparse_index
+    get_sparse_index()
+
+
+def _load_reranker():
+    from models.reranker import get_reranker
+    get_reranker()
+
+
+def warm_up() -> dict:
+    """Import the request path and load every shared resource it needs. Returns per-step seconds."""
+    with _status_lock:
+        _status["state"] = "running"
+    start = time.perf_counter()
+    _step("imports", _load_stack)
+    _step("embedding_model", _load_model)
+    _step("faiss_index", _load_index)
+    _step("chunk_store", _load_chunks)
+    _step("full_vectors", _load_vectors)
+    if RETRIEVAL_MODE != "dense":
+        _step("sparse_index", _load_sparse)
+    if RERANK_ENABLED:
+        _step("reranker", _load_reranker)
+    with _status_lock:
+        _status["seconds"] = round(time.perf_counter() - start, 4)
+        _status["state"] = "failed" if _status["errors"] else "done"
+    print(f"Warm-up finished in {_status['seconds']:.2f}s: {_status['steps']}")
+    return warmup_status()
+
+
+def start_warmup() -> threading.Thread:
+    """Run warm_up() once per process on a daemon thread."""
+    global _thread
+    with _status_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+            _thread.start()
+        return _thread
+
+
+def warmup_status() -> dict:
+    with _status_lock:
+        return {"state": _status["state"], "seconds": _status["seconds"], "steps": dict(_status["steps"]),
+                "errors": dict(_status["errors"])}
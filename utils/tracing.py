@@ -0,0 +1,162 @@
+import time
+import contextvars
+from utils.metrics import histogram
+from config.config import TRACING_ENABLED, TRACE_LOG, OTEL_EXPORTER, OTEL_SERVICE_NAME
+
+# Stage tracing for the request path. `with span("faiss_search"):` times the
+# block into the `faiss_search_seconds` histogram and, inside a `trace()`,
+# adds it to that turn's stage breakdown. With OTEL_EXPORTER set, every span
+# is also exported as an OpenTelemetry span. With TRACING_ENABLED=false,
+# span() returns a shared no-op, so instrumented code pays one function call.
+#
+# The current turn lives in a contextvar, so spans are collected across
+# asyncio.to_thread and the http_client background loop, which both run
+# work in a copy of the caller's context.
+
+_turn = contextvars.ContextVar("trace_turn", default=None)
+_parent = contextvars.ContextVar("trace_parent", default=None)
+_histograms = {}
+
+
+def _otel_tracer():
+    """An OpenTelemetry tracer for OTEL_EXPORTER, or None when export is off or unavailable."""
+    if not OTEL_EXPORTER:
+        return None
+    try:
+        from opentelemetry import trace as otel_trace
+    except ImportError:
+        print("[Error] OTEL_EXPORTER is set but opentelemetry-api is not installed; OpenTelemetry export is off.")
+        return None
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+        if OTEL_EXPORTER == "otlp":
+            # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            exporter = OTLPSpanExporter()
+        else:
+            exporter = ConsoleSpanExporter()
+        provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        otel_trace.set_tracer_provider(provider)
+    except ImportError as e:
+        print(f"[Error] OpenTelemetry SDK or exporter not installed ({e}); using the global tracer provider.")
+    return otel_trace.get_tracer(OTEL_SERVICE_NAME)
+
+
+_tracer = _otel_tracer() if TRACING_ENABLED else None
+
+
+def _stage_histogram(name: str):
+    metric = _histograms.get(name)
+    if metric is None:
+        metric = _histograms[name] = histogram(f"{name}_seconds", f"Time spent in {name}")
+    return metric
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """One timed stage. Attributes are only kept for OpenTelemetry export."""
+
+    __slots__ = ("name", "attributes", "start", "depth", "_previous", "_otel")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self._otel = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        if self._otel is not None:
+            self._otel.set_attributes(attributes)
+
+    def __enter__(self):
+        self._previous = _parent.get()
+        self.depth = self._previous.depth + 1 if self._previous is not None else 0
+        if _tracer is not None:
+            from opentelemetry import trace as otel_trace
+            parent = self._previous._otel if self._previous is not None else None
+            context = otel_trace.set_span_in_context(parent) if parent is not None else None
+            self._otel = _tracer.start_span(self.name, context=context, attributes=self.attributes)
+        # Set, never reset: streamed spans can close in a different context than they opened in
+        _parent.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        _stage_histogram(self.name).observe(elapsed)
+        _parent.set(self._previous)
+        turn = _turn.get()
+        if turn is not None:
+            turn.spans.append((self.name, self.start - turn.start, elapsed, self.depth))
+        if self._otel is not None:
+            if exc is not None:
+                self._otel.record_exception(exc)
+            self._otel.end()
+        return False
+
+
+def span(name: str, **attributes):
+    """Time a stage: `with span("web_search"): ...`."""
+    return Span(name, attributes) if TRACING_ENABLED else _NOOP
+
+
+class Trace:
+    """Stage breakdown of one turn: (stage, offset, seconds, depth) per span, in completion order."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []
+        self.seconds = 0.0
+
+    def stages(self) -> dict:
+        """Total seconds per stage."""
+        totals = {}
+        for name, _, elapsed, _ in self.spans:
+            totals[name] = round(totals.get(name, 0.0) + elapsed, 6)
+        return totals
+
+    def summary(self) -> str:
+        ordered = sorted(self.spans, key=lambda s: s[1])
+        parts = [f"{'  ' * depth}{name} +{offset * 1000:.0f}ms {elapsed * 1000:.1f}ms"
+                 for name, offset, elapsed, depth in ordered if name != self.name]
+        return f"[Trace] {self.name} {self.seconds * 1000:.1f}ms\n" + "\n".join(parts)
+
+
+class trace:
+    """Collect the spans of one turn: `with trace("turn") as t: ...`, then t.stages()."""
+
+    def __init__(self, name: str):
+        self.turn = Trace(name)
+        self._span = span(name)
+
+    def __enter__(self) -> Trace:
+        self._token = _turn.set(self.turn)
+        self._span.__enter__()
+        return self.turn
+
+    def __exit__(self, exc_type, exc, tb):
+        self._span.__exit__(exc_type, exc, tb)
+        _turn.reset(self._token)
+        self.turn.seconds = time.perf_counter() - self.turn.start
+        if TRACE_LOG and TRACING_ENABLED:
+            print(self.turn.summary())
+        return False
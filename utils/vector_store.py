@@ -0,0 +1,101 @@
+import os
+import threading
+import numpy as np
+from utils.chunk_store import file_generation
+from config.config import FULL_VECTORS_PATH, EMBED_DIM
+
+# Full-precision embeddings for compressed indexes (fp16/int8 codecs, PCA or
+# truncated dimensions, IVF-PQ). Row N holds the float32 vector of chunk-store
+# row N, back to back in a raw file with no header, so the file is only ever
+# memory-mapped: rescoring a shortlist touches just those rows' pages and the
+# corpus never has to fit in RAM at full precision.
+
+
+class VectorStore:
+    """Memory-mapped float32 rows, reloaded when the file's generation changes."""
+
+    def __init__(self, path: str = FULL_VECTORS_PATH, dim: int = EMBED_DIM):
+        self.path = path
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._vectors = np.zeros((0, dim), dtype="float32")
+        self._generation = None
+
+    def refresh(self) -> bool:
+        """Reload if the underlying file changed. Returns True when a reload happened."""
+        generation = file_generation(self.path)
+        with self._lock:
+            if generation == self._generation:
+                return False
+            self._generation = generation
+            rows = generation[2] // (4 * self.dim) if generation is not None else 0
+            if generation is not None and generation[2] % (4 * self.dim):
+                print(f"[Error] {self.path} is not a whole number of {self.dim}-d float32 rows; "
+                      f"using the first {rows}.")
+            self._vectors = np.memmap(self.path, dtype="float32", mode="r", shape=(rows, self.dim)) \
+                if rows else np.zeros((0, self.dim), dtype="float32")
+            return True
+
+    def __len__(self):
+        self.refresh()
+        return len(self._vectors)
+
+    def get_many(self, rows) -> np.ndarray:
+        """Vectors for the given rows, as an in-memory (len(rows), dim) array."""
+        self.refresh()
+        with self._lock:
+            return np.asarray(self._vectors[np.asarray(rows, dtype="int64")], dtype="float32")
+
+    def distances(self, query: np.ndarray, rows) -> np.ndarray:
+        """Exact squared L2 distances from `query` to the given rows (same scale as IndexFlatL2)."""
+        diff = self.get_many(rows) - np.asarray(query, dtype="float32").reshape(1, -1)
+        return np.einsum("ij,ij->i", diff, diff)
+
+    def append(self, rows, vectors) -> bool:
+        """
+        Append vectors for chunk-store rows that were just appended. Refuses
+        (returns False) when the file is not exactly rows[0] long, since
+        rows would then no longer line up with the chunk store.
+        """
+        with self._lock:
+            if len(self) != rows[0]:
+                print(f"[Error] {self.path} holds {len(self)} rows but new chunks start at row {rows[0]}; "
+                      f"rebuild the index to re-enable rescoring.")
+                return False
+            with open(self.path, "ab") as f:
+                np.ascontiguousarray(vectors, dtype="float32").tofile(f)
+            self.refresh()
+            return True
+
+    def close(self):
+        with self._lock:
+            self._vectors = np.zeros((0, self.dim), dtype="float32")
+            self._generation = None
+
+
+def write_vectors(vectors, path: str = FULL_VECTORS_PATH):
+    """Replace the file with `vectors` (row i = chunk row i), atomically."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.ascontiguousarray(vectors, dtype="float32").tofile(f)
+    os.replace(tmp_path, path)
+
+
+def discard_vectors(path: str = FULL_VECTORS_PATH):
+    """Remove a full-precision file left by an earlier compressed build; its rows no longer line up."""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_vector_store(path: str = FULL_VECTORS_PATH) -> VectorStore:
+    """Return the process-wide store for `path`, creating it on first use."""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = VectorStore(path)
+            _stores[path] = store
+        return store
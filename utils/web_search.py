@@ -1,7 +1,12 @@
-import requests
-from config.config import GOOGLE_API_KEY, GOOGLE_CX_ID, GOOGLE_SEARCH_URL
+from utils.http_client import request, run_sync
+from utils.tracing import span
+from utils.metrics import counter
+from config.config import GOOGLE_API_KEY, GOOGLE_CX_ID, GOOGLE_SEARCH_URL, SEARCH_TIMEOUT
 
-def google_search(query, num_results=3):
+searches = counter("web_searches_total", "Google Custom Search calls")
+search_errors = counter("web_search_errors_total", "Google Custom Search calls that failed")
+
+async def google_search_async(query, num_results=3):
     """
     Perform a Google Custom Search and return short snippets of web results.
     Used as a fallback when the RAG system lacks relevant context.
@@ -14,9 +19,11 @@ def google_search(query, num_results=3):
             "num": num_results
         }
 
-        response = requests.get(GOOGLE_SEARCH_URL, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        searches.inc()
+        with span("web_search"):
+            response = await request("GET", GOOGLE_SEARCH_URL, timeout=SEARCH_TIMEOUT, params=params)
+            response.raise_for_status()
+            data = response.json()
 
         results = []
         for item in data.get("items", []):
@@ -30,4 +37,9 @@ def google_search(query, num_results=3):
     except Exception as e:
         # Keep logs for debugging but don’t show errors to the user
         print(f"[Web Search Error] {e}")
+        search_errors.inc()
         return ""
+
+def google_search(query, num_results=3):
+    """Blocking wrapper around google_search_async."""
+    return run_sync(google_search_async(query, num_results))